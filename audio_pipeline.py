@@ -0,0 +1,712 @@
+"""
+Streaming Audio Preprocessing Pipeline
+
+Module này tiền xử lý file WAV theo từng block thay vì đọc toàn bộ file vào bộ nhớ:
+- Đọc file WAV tăng dần (PCM 8/16/24/32-bit, float 32/64-bit)
+- Chuyển đổi nhiều kênh sang mono theo từng block
+- Resampling polyphase có trạng thái (stateful) giữa các block; bộ lọc được
+  thiết kế một lần cho mỗi cặp tần số và dùng lại cho mọi file / resampler
+- Loại bỏ khoảng lặng ở đầu và cuối stream theo năng lượng từng frame (có
+  hangover), tùy chọn rút ngắn các khoảng dừng dài ở giữa, và báo thời lượng
+  audio đã bỏ (SilenceTrimmer); không có trimmer thì chỉ bỏ các mẫu 0 ở đầu
+- Gom kết quả thành các chunk PCM16 có kích thước cố định
+
+Bộ nhớ sử dụng chỉ phụ thuộc vào kích thước block, không phụ thuộc độ dài file,
+và chunk đầu tiên sẵn sàng ngay sau khi đọc block đầu tiên.
+
+Khi file đã là PCM16 mono đúng tần số mục tiêu, chunk 'data' được memory-map và
+các chunk trả về là memoryview trỏ thẳng vào vùng map (không sao chép). scipy
+chỉ được import khi thực sự cần resample, nên đường dẫn này không tốn thời
+gian import scipy.
+
+Cách sử dụng:
+    for chunk in iter_pcm16_chunks("path/to/audio.wav", 16000, 3200):
+        ...  # chunk là mảng int16 có 3200 mẫu (chunk cuối có thể ngắn hơn)
+"""
+
+import functools
+import logging
+import mmap
+import struct
+import sys
+from math import gcd
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+DEFAULT_BLOCK_FRAMES = 16384
+# Bump whenever a change alters the PCM this module produces (invalidates pcm_cache entries)
+PIPELINE_VERSION = 3
+
+# Defaults for SilenceTrimmer: dBFS below which a frame is silence, and how much
+# silence to keep next to speech so onsets and decays are not clipped
+DEFAULT_TRIM_THRESHOLD_DB = -50.0
+DEFAULT_TRIM_FRAME_MS = 20
+DEFAULT_TRIM_HANGOVER_MS = 200
+# Most silence SilenceTrimmer holds back while deciding whether it is a pause
+# (kept) or trailing silence (dropped); older silence is passed on as it arrives
+DEFAULT_TRIM_MAX_HELD_MS = 30000
+
+
+class WavStreamReader:
+    """
+    Đọc file WAV theo từng block frame.
+
+    Chỉ phân tích header RIFF (chunk 'fmt ' và vị trí chunk 'data'), sau đó
+    đọc dữ liệu tăng dần và trả về từng block dạng float32 trong [-1, 1].
+    """
+
+    def __init__(self, audio_path: str):
+        """
+        Mở file và phân tích header.
+
+        Args:
+            audio_path (str): Đường dẫn tới file WAV
+
+        Raises:
+            ValueError: Khi file không phải WAV hoặc định dạng không được hỗ trợ
+        """
+        self.audio_path = audio_path
+        self._file = open(audio_path, 'rb')
+        try:
+            self._parse_header()
+        except Exception:
+            self._file.close()
+            raise
+
+    def _parse_header(self):
+        riff, _, wave = struct.unpack('<4sI4s', self._file.read(12))
+        if riff not in (b'RIFF', b'RF64') or wave != b'WAVE':
+            raise ValueError(f"Not a WAV file: {self.audio_path}")
+
+        fmt = None
+        while True:
+            header = self._file.read(8)
+            if len(header) < 8:
+                raise ValueError(f"No data chunk found in {self.audio_path}")
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+            if chunk_id == b'fmt ':
+                fmt = self._file.read(chunk_size)
+                if chunk_size % 2:
+                    self._file.read(1)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError(f"Data chunk before fmt chunk in {self.audio_path}")
+                self.data_offset = self._file.tell()
+                self.data_size = chunk_size
+                break
+            else:
+                self._file.seek(chunk_size + (chunk_size % 2), 1)
+
+        format_tag, self.channels, self.sample_rate, _, self.block_align, self.bits_per_sample = \
+            struct.unpack('<HHIIHH', fmt[:16])
+        if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+            format_tag = struct.unpack('<H', fmt[24:26])[0]
+        self.format_tag = format_tag
+
+        bits = self.bits_per_sample
+        if format_tag == WAVE_FORMAT_PCM and bits not in (8, 16, 24, 32):
+            raise ValueError(f"Unsupported PCM bit depth: {bits}")
+        if format_tag == WAVE_FORMAT_IEEE_FLOAT and bits not in (32, 64):
+            raise ValueError(f"Unsupported float bit depth: {bits}")
+        if format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+            raise ValueError(f"Unsupported WAV format tag: {format_tag:#x}")
+
+        # Some writers leave the size at 0/0xFFFFFFFF for streamed files
+        if self.data_size in (0, 0xFFFFFFFF):
+            self._file.seek(0, 2)
+            self.data_size = self._file.tell() - self.data_offset
+            self._file.seek(self.data_offset)
+
+        self.num_frames = self.data_size // self.block_align
+
+    @property
+    def is_pcm16(self) -> bool:
+        """File có phải PCM 16-bit (signed) hay không."""
+        return self.format_tag == WAVE_FORMAT_PCM and self.bits_per_sample == 16
+
+    def can_map_as(self, sample_rate: int) -> bool:
+        """
+        Dữ liệu có thể được gửi nguyên trạng (PCM16 mono, đúng tần số mẫu) hay không.
+
+        Args:
+            sample_rate (int): Tần số mẫu mục tiêu
+        """
+        return (self.is_pcm16 and self.channels == 1 and self.sample_rate == sample_rate
+                and sys.byteorder == 'little')
+
+    def map_samples(self) -> memoryview:
+        """
+        Memory-map chunk 'data' và trả về memoryview các mẫu int16.
+
+        File được map ở chế độ chỉ đọc; vùng map được giải phóng khi không còn
+        memoryview nào tham chiếu tới nó.
+
+        Returns:
+            memoryview: View định dạng 'h' trên toàn bộ các mẫu
+        """
+        size = self.num_frames * self.block_align
+        if size == 0:
+            return memoryview(b'').cast('h')
+        mapped = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mapped)[self.data_offset:self.data_offset + size].cast('h')
+
+    def _to_float(self, raw: bytes) -> np.ndarray:
+        bits = self.bits_per_sample
+        if self.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+            return np.frombuffer(raw, dtype='<f4' if bits == 32 else '<f8').astype(np.float32)
+        if bits == 8:
+            return (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+        if bits == 16:
+            return np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+        if bits == 24:
+            b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+            samples = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+            samples = np.where(samples & 0x800000, samples - 0x1000000, samples)
+            return samples.astype(np.float32) / 8388608.0
+        return np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2147483648.0
+
+    def blocks(self, block_frames: int = DEFAULT_BLOCK_FRAMES):
+        """
+        Đọc dữ liệu theo từng block.
+
+        Args:
+            block_frames (int): Số frame tối đa mỗi block
+
+        Yields:
+            np.ndarray: Mảng float32 shape (frames, channels)
+        """
+        self._file.seek(self.data_offset)
+        remaining = self.num_frames * self.block_align
+        block_bytes = block_frames * self.block_align
+        while remaining > 0:
+            raw = self._file.read(min(block_bytes, remaining))
+            if not raw:
+                break
+            usable = len(raw) - len(raw) % self.block_align
+            remaining -= len(raw)
+            yield self._to_float(raw[:usable]).reshape(-1, self.channels)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@functools.lru_cache(maxsize=None)
+def design_polyphase_filter(up: int, down: int):
+    """
+    Thiết kế bộ lọc polyphase cho tỉ lệ up/down (đã rút gọn), có cache.
+
+    Dùng cùng bộ lọc FIR với scipy.signal.resample_poly (cửa sổ Kaiser, beta 5).
+    Kết quả được dùng chung giữa mọi StreamingResampler cùng tỉ lệ nên mảng
+    trả về là read-only.
+
+    Returns:
+        tuple: (hệ số h, trễ nhóm tính theo mẫu đã upsample, phase) với phase là
+            số dư (mod down) của chỉ số mẫu vào đầu tiên mà upfirdn cần để đầu
+            ra rơi đúng lưới mẫu của resample_poly
+    """
+    from scipy.signal import firwin
+
+    max_rate = max(up, down)
+    h = firwin(2 * 10 * max_rate + 1, 1.0 / max_rate, window=('kaiser', 5.0)) * up
+    h.setflags(write=False)
+    delay = (len(h) - 1) // 2
+    # Input index s aligns when s * up == delay (mod down); up is invertible mod down
+    phase = delay * pow(up, -1, down) % down if down > 1 else 0
+    return h, delay, phase
+
+
+class StreamingResampler:
+    """
+    Resampler polyphase có trạng thái cho xử lý theo block.
+
+    Dùng cùng bộ lọc FIR với scipy.signal.resample_poly (cửa sổ Kaiser, beta 5)
+    và bù trễ nhóm của bộ lọc, nên kết quả ghép lại của nhiều block giống với
+    việc resample toàn bộ tín hiệu một lần. Bộ lọc lấy từ
+    design_polyphase_filter() nên chỉ được thiết kế một lần cho mỗi cặp tần
+    số; reset() cho phép dùng lại cùng đối tượng cho stream kế tiếp.
+    """
+
+    def __init__(self, orig_sr: int, target_sr: int):
+        """
+        Args:
+            orig_sr (int): Tần số mẫu đầu vào
+            target_sr (int): Tần số mẫu đầu ra
+        """
+        g = gcd(orig_sr, target_sr)
+        self.orig_sr = orig_sr
+        self.target_sr = target_sr
+        self.up = target_sr // g
+        self.down = orig_sr // g
+        if self.up != self.down:
+            from scipy.signal import upfirdn
+            self._upfirdn = upfirdn
+            self._h, self._delay, self._phase = design_polyphase_filter(self.up, self.down)
+        self.reset()
+
+    def reset(self):
+        """Xóa trạng thái để resample một stream mới (giữ nguyên bộ lọc)."""
+        self._consumed = 0
+        self._produced = 0
+        if self.up == self.down:
+            return
+        # Zero history before the stream start covers the first output's window
+        self._buffer_start = self._window_start(0)
+        self._buffer = np.zeros(-self._buffer_start, dtype=np.float32)
+
+    def _window_start(self, m: int) -> int:
+        """Chỉ số mẫu vào đầu tiên (đã căn phase) cần để tính mẫu ra m."""
+        n = m * self.down + self._delay
+        first = -((len(self._h) - 1 - n) // self.up)  # ceil((n - len(h) + 1) / up)
+        return first - (first - self._phase) % self.down
+
+    def _emit(self, last: int) -> np.ndarray:
+        """Tính các mẫu đầu ra từ self._produced tới last (bao gồm)."""
+        if last < self._produced:
+            return np.zeros(0, dtype=np.float32)
+        start = self._window_start(self._produced)
+        end = (last * self.down + self._delay) // self.up + 1
+        segment = self._buffer[start - self._buffer_start:end - self._buffer_start]
+        # upfirdn evaluates upsampled positions start * up + k * down, which the
+        # phase alignment puts exactly on output samples
+        first = (self._produced * self.down + self._delay - start * self.up) // self.down
+        count = last + 1 - self._produced
+        out = self._upfirdn(self._h, segment, self.up, self.down)[first:first + count].astype(np.float32)
+        self._produced = last + 1
+
+        # Drop input samples no later output can reference
+        keep_from = self._window_start(self._produced)
+        drop = keep_from - self._buffer_start
+        if drop > 0:
+            self._buffer = self._buffer[drop:]
+            self._buffer_start = keep_from
+        return out
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """
+        Resample một block mono float32.
+
+        Args:
+            block (np.ndarray): Block mẫu đầu vào
+
+        Returns:
+            np.ndarray: Các mẫu đầu ra đã đủ dữ liệu để tính
+        """
+        if self.up == self.down:
+            return block
+        self._buffer = np.concatenate((self._buffer, block.astype(np.float32, copy=False)))
+        self._consumed += len(block)
+        last = (self._consumed * self.up - 1 - self._delay) // self.down
+        return self._emit(last)
+
+    def flush(self) -> np.ndarray:
+        """
+        Trả về các mẫu đầu ra còn lại ở cuối stream (phần đuôi của bộ lọc).
+
+        Returns:
+            np.ndarray: Các mẫu đầu ra cuối cùng
+        """
+        if self.up == self.down:
+            return np.zeros(0, dtype=np.float32)
+        total = -(-self._consumed * self.up // self.down)
+        if total <= self._produced:
+            return np.zeros(0, dtype=np.float32)
+        needed = ((total - 1) * self.down + self._delay) // self.up + 1
+        pad = needed - (self._buffer_start + len(self._buffer))
+        if pad > 0:
+            self._buffer = np.concatenate((self._buffer, np.zeros(pad, dtype=np.float32)))
+        return self._emit(total - 1)
+
+
+def resample(signal: np.ndarray, orig_sr: int, target_sr: int) -> np.ndarray:
+    """
+    Resample toàn bộ một tín hiệu mono bằng bộ lọc đã cache.
+
+    Args:
+        signal (np.ndarray): Tín hiệu đầu vào
+        orig_sr (int): Tần số mẫu đầu vào
+        target_sr (int): Tần số mẫu đầu ra
+
+    Returns:
+        np.ndarray: Tín hiệu float32 ở target_sr
+    """
+    resampler = StreamingResampler(orig_sr, target_sr)
+    return np.concatenate((resampler.process(signal), resampler.flush()))
+
+
+def _float_to_pcm16(samples: np.ndarray) -> np.ndarray:
+    return np.clip(np.rint(samples * 32768.0), -32768, 32767).astype(np.int16)
+
+
+def _concat(arrays) -> np.ndarray:
+    if not arrays:
+        return np.zeros(0, dtype=np.int16)
+    return arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+
+
+class SilenceTrimmer:
+    """
+    Cắt khoảng lặng theo năng lượng từng frame trên stream PCM16 mono.
+
+    Frame có năng lượng (dBFS) không vượt threshold_db là im lặng. Khoảng lặng
+    ở đầu và cuối stream bị bỏ, chỉ giữ hangover_ms sát với tiếng nói; nếu có
+    max_pause_ms thì mỗi khoảng dừng ở giữa dài hơn được rút còn max_pause_ms
+    (nửa đầu và nửa cuối của khoảng dừng). Bộ nhớ dùng cho một khoảng lặng
+    luôn bị giới hạn: khi giữ nguyên các khoảng dừng ở giữa (max_pause_ms=None)
+    chỉ max_held_ms khoảng lặng mới nhất được giữ lại chờ xem có tiếng nói tiếp
+    hay không, phần cũ hơn được trả ra ngay (khoảng lặng cuối stream dài hơn
+    max_held_ms vì vậy chỉ bị cắt max_held_ms).
+    """
+
+    def __init__(self, sample_rate: int, threshold_db: float = DEFAULT_TRIM_THRESHOLD_DB,
+                 frame_ms: int = DEFAULT_TRIM_FRAME_MS, hangover_ms: int = DEFAULT_TRIM_HANGOVER_MS,
+                 max_pause_ms: int = None, max_held_ms: int = DEFAULT_TRIM_MAX_HELD_MS):
+        """
+        Args:
+            sample_rate (int): Tần số mẫu
+            threshold_db (float): Ngưỡng năng lượng của tiếng nói (dBFS)
+            frame_ms (int): Độ dài frame phân tích
+            hangover_ms (int): Khoảng lặng giữ lại trước tiếng nói đầu tiên và
+                sau tiếng nói cuối cùng
+            max_pause_ms (int): Độ dài tối đa của khoảng dừng ở giữa, None để giữ nguyên
+            max_held_ms (int): Khoảng lặng tối đa được giữ lại khi max_pause_ms=None
+                (ít nhất hangover_ms)
+        """
+        self.sample_rate = sample_rate
+        self.threshold_db = threshold_db
+        self.frame_len = max(1, sample_rate * frame_ms // 1000)
+        self.hangover = sample_rate * hangover_ms // 1000
+        self.max_pause = sample_rate * max_pause_ms // 1000 if max_pause_ms is not None else None
+        self.max_held = max(self.hangover, sample_rate * max_held_ms // 1000)
+        self._pending = np.zeros(0, dtype=np.int16)
+        self._pending_payload = self._pending
+        self._run = []
+        self._run_len = 0
+        self._run_dropped = 0
+        self._run_emitted = 0
+        self._started = False
+        self.input_samples = 0
+        self.output_samples = 0
+        self.leading_samples = 0
+        self.trailing_samples = 0
+        self.pause_samples = 0
+
+    def _keep_limits(self):
+        """Số mẫu đầu / cuối của khoảng lặng hiện tại cần giữ lại."""
+        if not self._started:
+            return 0, self.hangover
+        if self.max_pause is None:
+            return None, None
+        return max(self.hangover, self.max_pause // 2), max(self.hangover, self.max_pause - self.max_pause // 2)
+
+    def _silence(self, samples: np.ndarray, out: list):
+        self._run.append(samples)
+        self._run_len += len(samples)
+        head, tail = self._keep_limits()
+        if head is not None:
+            if self._run_len > head + tail:
+                joined = _concat(self._run)
+                self._run = [joined[:head], joined[len(joined) - tail:]]
+                self._run_dropped += self._run_len - head - tail
+                self._run_len = head + tail
+            return
+        # Whole pauses are kept: pass on the oldest silence rather than holding it all
+        while self._run_len - len(self._run[0]) >= self.max_held:
+            oldest = self._run.pop(0)
+            out.append(oldest)
+            self._run_len -= len(oldest)
+            self._run_emitted += len(oldest)
+
+    def _end_silence(self, out: list):
+        """Khoảng lặng hiện tại kết thúc vì có tiếng nói: giữ lại phần cần thiết."""
+        joined = _concat(self._run)
+        total = self._run_len + self._run_dropped
+        if not self._started:
+            keep = joined[max(0, len(joined) - self.hangover):]
+            self.leading_samples += total - len(keep)
+        elif self.max_pause is not None and total > self.max_pause:
+            first = self.max_pause // 2
+            keep = np.concatenate((joined[:first], joined[len(joined) - (self.max_pause - first):]))
+            self.pause_samples += total - len(keep)
+        else:
+            keep = joined
+        out.append(keep)
+        self._run = []
+        self._run_len = 0
+        self._run_dropped = 0
+        self._run_emitted = 0
+
+    def _voiced(self, samples: np.ndarray, out: list):
+        if self._run_len or self._run_dropped:
+            self._end_silence(out)
+        self._started = True
+        out.append(samples)
+
+    def _feed(self, data: np.ndarray, payload: np.ndarray, out: list):
+        frames = len(data) // self.frame_len
+        if not frames:
+            return
+        usable = frames * self.frame_len
+        blocks = data[:usable].reshape(frames, self.frame_len).astype(np.float32)
+        energy_db = 10 * np.log10(np.mean(blocks * blocks, axis=1) / (32768.0 ** 2) + 1e-12)
+        voiced = energy_db > self.threshold_db
+        # Walk runs of equal frames rather than single frames
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(voiced)) + 1, [frames]))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            samples = payload[start * self.frame_len:end * self.frame_len]
+            if voiced[start]:
+                self._voiced(samples, out)
+            else:
+                self._silence(samples, out)
+
+    def process(self, samples: np.ndarray, payload: np.ndarray = None) -> np.ndarray:
+        """
+        Cắt khoảng lặng trong một block.
+
+        Trimmer chỉ cắt và ghép những gì nó trả ra, nên với payload là vị trí
+        của các mẫu (ví dụ trong file memory-map) kết quả là vị trí các mẫu
+        được giữ lại thay vì bản sao của chúng.
+
+        Args:
+            samples (np.ndarray): Block int16 mono, dùng để phân loại tiếng nói
+            payload (np.ndarray): Mảng cùng độ dài với samples được trả ra thay
+                cho samples, mặc định chính samples
+
+        Returns:
+            np.ndarray: Các phần tử của payload giữ lại đã xác định được (có thể rỗng)
+        """
+        self.input_samples += len(samples)
+        data = np.concatenate((self._pending, samples)) if len(self._pending) else samples
+        if payload is None:
+            values = data
+        else:
+            values = np.concatenate((self._pending_payload, payload)) if len(self._pending) else payload
+        usable = len(data) - len(data) % self.frame_len
+        out = []
+        self._feed(data[:usable], values[:usable], out)
+        self._pending = data[usable:].copy()
+        self._pending_payload = self._pending if payload is None else values[usable:].copy()
+        result = _concat(out)
+        self.output_samples += len(result)
+        return result
+
+    def flush(self) -> np.ndarray:
+        """
+        Kết thúc stream: xử lý frame cuối chưa đủ độ dài và cắt khoảng lặng cuối.
+
+        Returns:
+            np.ndarray: Các mẫu giữ lại cuối cùng
+        """
+        out = []
+        if len(self._pending):
+            # Classify the short final frame on its own energy
+            tail = self._pending.astype(np.float32)
+            if 10 * np.log10(np.mean(tail * tail) / (32768.0 ** 2) + 1e-12) > self.threshold_db:
+                self._voiced(self._pending_payload, out)
+            else:
+                self._silence(self._pending_payload, out)
+            self._pending = np.zeros(0, dtype=np.int16)
+            self._pending_payload = self._pending
+        total = self._run_len + self._run_dropped
+        if self._started:
+            # Silence already passed on counts towards the hangover
+            keep = _concat(self._run)[:max(0, self.hangover - self._run_emitted)]
+            self.trailing_samples += total - len(keep)
+            out.append(keep)
+        else:
+            self.leading_samples += total
+        self._run = []
+        self._run_len = 0
+        self._run_dropped = 0
+        self._run_emitted = 0
+        result = _concat(out)
+        self.output_samples += len(result)
+        return result
+
+    def stats(self) -> dict:
+        """
+        Thời lượng audio (giây) trước/sau khi cắt và phần đã bỏ theo vị trí.
+
+        Returns:
+            dict: input, output, leading, trailing, pauses và saved (tổng đã bỏ)
+        """
+        seconds = lambda n: n / self.sample_rate  # noqa: E731
+        return {
+            'input_seconds': seconds(self.input_samples),
+            'output_seconds': seconds(self.output_samples),
+            'leading_seconds': seconds(self.leading_samples),
+            'trailing_seconds': seconds(self.trailing_samples),
+            'pause_seconds': seconds(self.pause_samples),
+            'saved_seconds': seconds(self.leading_samples + self.trailing_samples + self.pause_samples),
+        }
+
+    def log_report(self):
+        """Log thời lượng khoảng lặng đã bỏ."""
+        stats = self.stats()
+        logger.info(f"Trimmed {stats['saved_seconds']:.2f}s of silence from {stats['input_seconds']:.2f}s "
+                    f"(leading {stats['leading_seconds']:.2f}s, trailing {stats['trailing_seconds']:.2f}s, "
+                    f"pauses {stats['pause_seconds']:.2f}s)")
+
+
+def iter_pcm16_chunks(audio_path: str, target_sample_rate: int, chunk_samples: int,
+                      block_frames: int = DEFAULT_BLOCK_FRAMES, require_mapped: bool = False,
+                      trimmer: SilenceTrimmer = None):
+    """
+    Tiền xử lý file WAV theo kiểu streaming và trả về các chunk PCM16 mono.
+
+    Header được đọc ngay khi gọi hàm (lỗi định dạng được báo sớm), phần dữ
+    liệu chỉ được đọc khi generator được tiêu thụ.
+
+    Args:
+        audio_path (str): Đường dẫn tới file WAV
+        target_sample_rate (int): Tần số mẫu mục tiêu
+        chunk_samples (int): Số mẫu mỗi chunk đầu ra
+        block_frames (int): Số frame đọc từ file mỗi lần
+        require_mapped (bool): Chỉ chấp nhận file dùng được đường dẫn memory-map
+            (PCM16 mono little-endian đúng target_sample_rate)
+        trimmer (SilenceTrimmer): Cắt khoảng lặng theo năng lượng; None thì chỉ
+            bỏ các mẫu 0 ở đầu. Báo cáo thời lượng đã bỏ được log khi hết file
+
+    Returns:
+        generator: Sinh ra các chunk int16 có chunk_samples mẫu (chunk cuối
+            cùng, và với file memory-map cả chunk ngay trước một khoảng dừng đã
+            rút ngắn, có thể ngắn hơn): memoryview trỏ thẳng vào file nếu file
+            được memory-map (kể cả khi cắt khoảng lặng), ngược lại np.ndarray
+
+    Raises:
+        ValueError: Khi require_mapped và file cần chuyển đổi
+    """
+    reader = WavStreamReader(audio_path)
+    if require_mapped and not reader.can_map_as(target_sample_rate):
+        raise ValueError(f"{audio_path} is not PCM16 mono at {target_sample_rate}Hz "
+                         f"({reader.bits_per_sample}-bit, {reader.channels} channels, "
+                         f"{reader.sample_rate}Hz)")
+    if reader.can_map_as(target_sample_rate):
+        logger.info("Input is already PCM16 mono, using memory-mapped fast path")
+        with reader:
+            samples = reader.map_samples()
+        if trimmer is not None:
+            return _mapped_trimmed_chunks(samples, chunk_samples, block_frames, trimmer)
+        return _mapped_pcm16_chunks(samples, chunk_samples, block_frames)
+    return _pcm16_chunks(reader, target_sample_rate, chunk_samples, block_frames, trimmer)
+
+
+def _trimmed(blocks, trimmer: SilenceTrimmer):
+    for block in blocks:
+        kept = trimmer.process(block)
+        if len(kept):
+            yield kept
+    kept = trimmer.flush()
+    if len(kept):
+        yield kept
+    trimmer.log_report()
+
+
+def _without_leading_zeros(blocks):
+    leading = True
+    for pcm in blocks:
+        if leading:
+            nonzero = np.flatnonzero(pcm)
+            if len(nonzero) == 0:
+                continue
+            pcm = pcm[nonzero[0]:]
+            leading = False
+            logger.info("Removed leading silence")
+        yield pcm
+
+
+def _rechunk(blocks, chunk_samples):
+    pending = []
+    pending_len = 0
+    for pcm in blocks:
+        pending.append(pcm)
+        pending_len += len(pcm)
+        if pending_len < chunk_samples:
+            continue
+        joined = np.concatenate(pending)
+        full = len(joined) - len(joined) % chunk_samples
+        for i in range(0, full, chunk_samples):
+            yield joined[i:i + chunk_samples]
+        pending = [joined[full:]]
+        pending_len = len(joined) - full
+
+    if pending_len:
+        yield np.concatenate(pending)
+
+
+def _mapped_pcm16_chunks(samples: memoryview, chunk_samples, block_frames):
+    # Find the first non-zero sample block by block, only touching the pages scanned
+    start = len(samples)
+    for offset in range(0, len(samples), block_frames):
+        nonzero = np.flatnonzero(np.frombuffer(samples[offset:offset + block_frames], dtype=np.int16))
+        if len(nonzero):
+            start = offset + nonzero[0]
+            break
+    if start:
+        logger.info("Removed leading silence")
+
+    for i in range(start, len(samples), chunk_samples):
+        yield samples[i:i + chunk_samples]
+
+
+def _mapped_trimmed_chunks(samples: memoryview, chunk_samples, block_frames, trimmer: SilenceTrimmer):
+    # Trim sample positions rather than samples, then slice the kept ranges
+    # out of the mapping so chunks stay zero-copy views of the file
+    def kept_positions():
+        for offset in range(0, len(samples), block_frames):
+            block = np.frombuffer(samples[offset:offset + block_frames], dtype=np.int16)
+            yield trimmer.process(block, np.arange(offset, offset + len(block)))
+        yield trimmer.flush()
+        trimmer.log_report()
+
+    start = end = 0
+    for positions in kept_positions():
+        if not len(positions):
+            continue
+        breaks = np.flatnonzero(np.diff(positions) != 1) + 1
+        firsts = positions[np.concatenate(([0], breaks))]
+        lasts = positions[np.concatenate((breaks - 1, [len(positions) - 1]))]
+        for first, last in zip(firsts.tolist(), lasts.tolist()):
+            if first != end:
+                # A gap (collapsed pause): the chunk before it ends short
+                if end > start:
+                    yield samples[start:end]
+                start = first
+            end = last + 1
+            while end - start >= chunk_samples:
+                yield samples[start:start + chunk_samples]
+                start += chunk_samples
+    if end > start:
+        yield samples[start:end]
+
+
+def _pcm16_chunks(reader, target_sample_rate, chunk_samples, block_frames, trimmer=None):
+    with reader:
+        if reader.channels > 1:
+            logger.info(f"Converting {reader.channels} channels to mono")
+        resampler = None
+        if reader.sample_rate != target_sample_rate:
+            logger.info(f"Resampling audio from {reader.sample_rate}Hz to {target_sample_rate}Hz")
+            resampler = StreamingResampler(reader.sample_rate, target_sample_rate)
+
+        def processed_blocks():
+            for block in reader.blocks(block_frames):
+                mono = block[:, 0] if reader.channels == 1 else block.mean(axis=1)
+                yield resampler.process(mono) if resampler else mono
+            if resampler:
+                yield resampler.flush()
+
+        pcm = (_float_to_pcm16(samples) for samples in processed_blocks())
+        pcm = _trimmed(pcm, trimmer) if trimmer is not None else _without_leading_zeros(pcm)
+        yield from _rechunk(pcm, chunk_samples)
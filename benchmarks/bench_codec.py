@@ -0,0 +1,111 @@
+"""
+Benchmark các codec audio uplink (xem codec.py) so với PCM16 thô.
+
+Với mỗi codec và mỗi độ dài frame của STREAM_PROFILES, mã hóa audio tổng hợp
+giống tiếng nói theo từng chunk như client rồi giải mã như server, và in:
+- kbps trên dây: binary frame (header + payload) và JSON + base64
+- CPU mã hóa / giải mã cho mỗi giây audio (kể cả bản IMA-ADPCM Python thuần
+  dùng khi không có audioop)
+- SNR của audio giải mã so với PCM gốc
+- độ trễ thêm vào mỗi chunk: thời gian mã hóa + giải mã trừ đi thời gian
+  truyền tiết kiệm được trên uplink --uplink-kbps (âm = codec làm chunk tới
+  server sớm hơn)
+
+Cách sử dụng:
+    python benchmarks/bench_codec.py [--seconds 60] [--uplink-kbps 384]
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codec import (ENCODING_ADPCM, ENCODING_PCM, SUPPORTED_ENCODINGS, AdpcmEncoder,  # noqa: E402
+                   _adpcm2lin, _lin2adpcm, audioop, create_encoder, decode)
+from main import STREAM_PROFILES  # noqa: E402
+from protocol import encode_audio_frame  # noqa: E402
+
+SAMPLE_RATE = 16000
+
+
+def speech_like(seconds):
+    """Nhiễu lọc thông thấp theo bao hình âm tiết ~3Hz, có khoảng lặng giữa các câu."""
+    rng = np.random.default_rng(0)
+    n = int(seconds * SAMPLE_RATE)
+    t = np.arange(n) / SAMPLE_RATE
+    envelope = np.abs(np.sin(2 * np.pi * 3 * t)) * (np.sin(2 * np.pi * 0.2 * t) > -0.5)
+    noise = np.convolve(rng.standard_normal(n), np.ones(8) / 8, mode='same')
+    voiced = np.sin(2 * np.pi * 140 * t) * 0.5
+    return ((noise * 3 + voiced) * 4000 * envelope).clip(-32768, 32767).astype(np.int16)
+
+
+def snr_db(reference, decoded):
+    reference = reference.astype(np.float64)
+    error = reference - decoded.astype(np.float64)
+    return 10 * np.log10(np.sum(reference ** 2) / max(np.sum(error ** 2), 1e-9))
+
+
+def run(name, encoding, encoder, adpcm_decode, chunks, seconds):
+    start = time.process_time()
+    frames = [encoder.encode(chunk) for chunk in chunks]
+    encode_cpu = time.process_time() - start
+    start = time.process_time()
+    decoded = [decode(encoding, frame, adpcm_decode) for frame in frames]
+    decode_cpu = time.process_time() - start
+
+    binary = sum(len(encode_audio_frame(frame, seq)) for seq, frame in enumerate(frames))
+    text = sum(len(json.dumps({"type": "audio", "seq": seq, "timestamp": 1792275013779952,
+                               "data": base64.b64encode(frame).decode('utf-8')}))
+               for seq, frame in enumerate(frames))
+    return {
+        'name': name,
+        'binary_kbps': binary * 8 / seconds / 1000,
+        'json_kbps': text * 8 / seconds / 1000,
+        'encode_ms': encode_cpu * 1000 / seconds,
+        'decode_ms': decode_cpu * 1000 / seconds,
+        'snr': snr_db(np.concatenate(chunks), np.concatenate(decoded)),
+        'chunks': len(chunks),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Uplink codec benchmark")
+    parser.add_argument('--seconds', type=float, default=60.0, help='Độ dài audio tổng hợp (giây)')
+    parser.add_argument('--uplink-kbps', type=float, default=384.0,
+                        help='Băng thông uplink giả định để tính độ trễ truyền')
+    args = parser.parse_args()
+
+    audio = speech_like(args.seconds)
+    print(f"{args.seconds:.0f}s speech-like PCM16 mono {SAMPLE_RATE}Hz, uplink {args.uplink_kbps:.0f} kbps, "
+          f"audioop {'available' if audioop is not None else 'missing'}")
+    print(f"{'frame':>6} {'codec':>16} {'bin kbps':>9} {'json kbps':>10} {'enc ms/s':>9} "
+          f"{'dec ms/s':>9} {'SNR dB':>7} {'+ms/chunk':>10}")
+
+    for frame_ms in sorted({profile['frame_ms'] for profile in STREAM_PROFILES.values()}):
+        step = SAMPLE_RATE * frame_ms // 1000
+        chunks = [audio[i:i + step] for i in range(0, len(audio), step)]
+        variants = [(encoding, encoding, create_encoder(encoding), None) for encoding in SUPPORTED_ENCODINGS]
+        if audioop is not None:
+            variants.append((f"{ENCODING_ADPCM}/py", ENCODING_ADPCM, AdpcmEncoder(_lin2adpcm), _adpcm2lin))
+        results = [run(name, encoding, encoder, adpcm_decode, chunks, args.seconds)
+                   for name, encoding, encoder, adpcm_decode in variants]
+        pcm = next(result for result in results if result['name'] == ENCODING_PCM)
+
+        for result in results:
+            # Per chunk: codec CPU on both ends minus the transmission time it saves
+            codec_ms = (result['encode_ms'] + result['decode_ms']) * args.seconds / result['chunks']
+            saved_ms = ((pcm['binary_kbps'] - result['binary_kbps']) * args.seconds
+                        / args.uplink_kbps / result['chunks'] * 1000)
+            print(f"{frame_ms:>6} {result['name']:>16} {result['binary_kbps']:>9.1f} {result['json_kbps']:>10.1f} "
+                  f"{result['encode_ms']:>9.2f} {result['decode_ms']:>9.2f} "
+                  f"{min(result['snr'], 99.0):>7.1f} {codec_ms - saved_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
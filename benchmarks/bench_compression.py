@@ -0,0 +1,173 @@
+"""
+Benchmark chính sách nén cho kênh audio và kênh broadcast.
+
+Đo trực tiếp các bước nén mà server / client thực hiện, không qua mạng:
+- audio: chunk PCM16 200ms dạng binary frame và JSON + base64, không nén so
+  với permessage-deflate mặc định của websockets (đường dẫn cũ)
+- broadcast: tin nhắn broadcast-translation gửi tới nhiều listener, nén sẵn
+  một lần ở tầng ứng dụng (zlib/gzip các mức) so với JSON text và
+  permessage-deflate theo từng profile trong DEFLATE_PROFILES (mỗi listener
+  một bộ nén riêng, như trên server)
+
+Với mỗi cấu hình in CPU phía gửi và phía nhận, số bytes trên dây và bộ nhớ
+zlib giữ lại cho mỗi kết nối (context takeover).
+
+Cách sử dụng:
+    python benchmarks/bench_compression.py [--seconds 60] [--messages 500] [--listeners 50]
+"""
+
+import argparse
+import base64
+import gzip
+import json
+import os
+import sys
+import time
+import zlib
+
+import numpy as np
+from websockets.extensions.permessage_deflate import PerMessageDeflate
+from websockets.frames import Frame, Opcode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from broadcast import DEFLATE_OFF, DEFLATE_PROFILES  # noqa: E402
+from protocol import encode_audio_frame  # noqa: E402
+
+SAMPLE_RATE = 16000
+CHUNK_SAMPLES = 3200
+WORDS = ("the guide", "points at", "the old", "city gate", "built in", "fifteen", "ninety",
+         "walls", "river", "market", "temple", "north", "tower", "bridge", "quarter")
+
+
+def deflate_pair(settings):
+    """Bộ nén phía server và bộ giải nén phía client cho một profile (như sau khi bắt tay)."""
+    settings = dict(settings)
+    compress_settings = settings.pop('compress_settings', None)
+    server_bits = settings.get('server_max_window_bits') or 15
+    client_bits = settings.get('client_max_window_bits') or 15
+    server_takeover = settings.get('server_no_context_takeover', False)
+    client_takeover = settings.get('client_no_context_takeover', False)
+    server = PerMessageDeflate(client_takeover, server_takeover, client_bits, server_bits, compress_settings)
+    client = PerMessageDeflate(server_takeover, client_takeover, server_bits, client_bits)
+    return server, client
+
+
+def retained_bytes(settings):
+    """Bộ nhớ zlib giữ giữa các tin nhắn mỗi kết nối (deflate + inflate), 0 nếu không giữ context."""
+    if settings is None or settings.get('server_no_context_takeover'):
+        return 0
+    bits = settings.get('server_max_window_bits') or 15
+    mem_level = (settings.get('compress_settings') or {}).get('memLevel', 8)
+    return (1 << (bits + 2)) + (1 << (mem_level + 9)) + (1 << bits)
+
+
+def audio_messages(seconds):
+    rng = np.random.default_rng(0)
+    n = int(seconds * SAMPLE_RATE)
+    # Speech-like: noise shaped by a slow syllable envelope
+    envelope = np.abs(np.sin(np.arange(n) * 2 * np.pi * 3 / SAMPLE_RATE))
+    audio = (rng.standard_normal(n) * 4000 * envelope).astype(np.int16)
+    chunks = [audio[i:i + CHUNK_SAMPLES] for i in range(0, n, CHUNK_SAMPLES)]
+    binary = [Frame(Opcode.BINARY, encode_audio_frame(chunk, seq)) for seq, chunk in enumerate(chunks)]
+    text = [Frame(Opcode.TEXT, json.dumps({"type": "audio", "seq": seq, "timestamp": 0,
+                                           "data": base64.b64encode(chunk).decode('utf-8')}).encode('utf-8'))
+            for seq, chunk in enumerate(chunks)]
+    return audio.nbytes, {'binary': binary, 'json': text}
+
+
+def broadcast_messages(count):
+    rng = np.random.default_rng(1)
+    messages = []
+    for seq in range(count):
+        words = " ".join(WORDS[i] for i in rng.integers(0, len(WORDS), 12))
+        messages.append({
+            "type": "broadcast-translation",
+            "language": ("en", "ja", "fr")[seq % 3],
+            "seq": seq,
+            "timestamp": 1792275013779952 + seq * 200000,
+            "startMs": seq * 2000,
+            "endMs": seq * 2000 + 1800,
+            "text": f"[{('en', 'ja', 'fr')[seq % 3]}] {words}",
+            "audioUrl": f"https://api.example.com/audio/1234.tourguide/{seq:06d}.mp3",
+        })
+    return messages
+
+
+def run_deflate(frames, settings, connections):
+    """Nén frames cho từng kết nối bằng bộ nén riêng; trả về (CPU gửi, CPU nhận, bytes / kết nối)."""
+    send_cpu = receive_cpu = 0.0
+    wire = 0
+    for _ in range(connections):
+        server, client = deflate_pair(settings)
+        for frame in frames:
+            start = time.process_time()
+            encoded = server.encode(frame)
+            middle = time.process_time()
+            client.decode(encoded)
+            send_cpu += middle - start
+            receive_cpu += time.process_time() - middle
+            wire += len(encoded.data)
+    return send_cpu, receive_cpu, wire // connections
+
+
+def bench_audio(args):
+    audio_bytes, variants = audio_messages(args.seconds)
+    print(f"Audio channel: {args.seconds:.0f}s PCM16 ({audio_bytes / 2**20:.1f} MiB), "
+          f"{len(variants['binary'])} chunks of {CHUNK_SAMPLES * 1000 // SAMPLE_RATE}ms")
+    print(f"{'transport':>10} {'deflate':>11} {'send ms':>9} {'recv ms':>9} {'wire MiB':>9} {'ratio':>6}")
+    for transport, frames in variants.items():
+        raw = sum(len(frame.data) for frame in frames)
+        print(f"{transport:>10} {'off':>11} {0.0:>9.1f} {0.0:>9.1f} {raw / 2**20:>9.2f} {1.0:>6.2f}")
+        send, receive, wire = run_deflate(frames, DEFLATE_PROFILES['default'], 1)
+        print(f"{transport:>10} {'default':>11} {send * 1000:>9.1f} {receive * 1000:>9.1f} "
+              f"{wire / 2**20:>9.2f} {raw / wire:>6.2f}")
+
+
+def bench_broadcast(args):
+    messages = broadcast_messages(args.messages)
+    texts = [json.dumps(message) for message in messages]
+    raw = sum(len(text) for text in texts)
+    print(f"\nBroadcast channel: {args.messages} messages ({raw / len(texts):.0f} B avg) "
+          f"to {args.listeners} listeners")
+    print(f"{'app':>8} {'deflate':>11} {'send ms':>9} {'recv ms':>9} {'KiB/listener':>13} "
+          f"{'ratio':>6} {'state KiB':>10}")
+
+    for name, compress in (('zlib-1', lambda d: zlib.compress(d, 1)),
+                           ('zlib-6', lambda d: zlib.compress(d, 6)),
+                           ('zlib-9', lambda d: zlib.compress(d, 9)),
+                           ('gzip-6', lambda d: gzip.compress(d, 6, mtime=0))):
+        start = time.process_time()
+        frames = [compress(text.encode('utf-8')) for text in texts]
+        send = time.process_time() - start
+        start = time.process_time()
+        for frame in frames:
+            json.loads(zlib.decompress(frame, wbits=15 + 32))
+        receive = (time.process_time() - start) * args.listeners
+        wire = sum(len(frame) for frame in frames)
+        # Precompressed once, whatever the number of listeners; each listener inflates its copy
+        print(f"{name:>8} {DEFLATE_OFF:>11} {send * 1000:>9.1f} {receive * 1000:>9.1f} "
+              f"{wire / 1024:>13.1f} {raw / wire:>6.2f} {0:>10.0f}")
+
+    frames = [Frame(Opcode.TEXT, text.encode('utf-8')) for text in texts]
+    for profile, settings in DEFLATE_PROFILES.items():
+        if settings is None:
+            print(f"{'none':>8} {profile:>11} {0.0:>9.1f} {0.0:>9.1f} {raw / 1024:>13.1f} {1.0:>6.2f} {0:>10.0f}")
+            continue
+        send, receive, wire = run_deflate(frames, settings, args.listeners)
+        print(f"{'none':>8} {profile:>11} {send * 1000:>9.1f} {receive * 1000:>9.1f} "
+              f"{wire / 1024:>13.1f} {raw / wire:>6.2f} {retained_bytes(settings) / 1024:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audio / broadcast compression benchmark")
+    parser.add_argument('--seconds', type=float, default=60.0, help='Độ dài audio tổng hợp (giây)')
+    parser.add_argument('--messages', type=int, default=500, help='Số tin nhắn broadcast')
+    parser.add_argument('--listeners', type=int, default=50, help='Số listener mỗi phiên')
+    args = parser.parse_args()
+    bench_audio(args)
+    bench_broadcast(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark serialize / parse JSON của các tin nhắn trong giao thức (xem serialization.py).
+
+Với mỗi backend JSON có sẵn (orjson, msgspec, stdlib), chạy trong một process
+riêng với AUDIO_JSON_BACKEND, đo cho từng loại tin nhắn:
+- encode: json.dumps của stdlib (đường dẫn cũ), dumps() của backend (kể cả
+  dựng dict tin nhắn như ở call site) và MessageTemplate.render() với các
+  tin nhắn gửi theo từng chunk
+- decode: json.loads(str) (đường dẫn cũ), loads(str) và loads(bytes) - frame
+  nhận bằng recv(decode=False), không qua str trung gian
+
+Các tin nhắn lấy từ giao thức hiện có: format, format-ack, audio JSON + base64
+(chunk 200ms), ack từng chunk, ack tích lũy, broadcast-translation, end,
+end-ack; tất cả gắn streamId như trên PersistentConnection.
+
+Cách sử dụng:
+    python benchmarks/bench_json.py [--number 20000] [--backend stdlib]
+"""
+
+import argparse
+import base64
+import json
+import os
+import subprocess
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codec import ENCODING_ADPCM, ENCODING_PCM  # noqa: E402
+from protocol import TRANSPORT_BINARY, TRANSPORT_JSON, now_us, tag_stream  # noqa: E402
+
+BACKENDS = ('orjson', 'msgspec', 'stdlib')
+STREAM_ID = 7
+CHUNK_BYTES = 6400
+
+
+def message_shapes():
+    """(tên, dict tin nhắn, template, giá trị của template) cho từng loại tin nhắn."""
+    from main import AUDIO_MESSAGE
+    from server import ACK, CUMULATIVE_ACK, END_ACK
+    from connection import END
+
+    timestamp = now_us()
+    chunk = np.random.default_rng(0).integers(-4000, 4000, CHUNK_BYTES // 2).astype('<i2').tobytes()
+    data = base64.b64encode(chunk).decode('ascii')
+    shapes = [
+        ('format', {
+            'type': 'format', 'sampleRate': 16000, 'bitsPerSample': 16, 'channels': 1, 'encoding': ENCODING_PCM,
+            'frameDurationMs': 200, 'fromLang': 'vi', 'toLangs': ['en', 'ja', 'fr'],
+            'transports': [TRANSPORT_BINARY, TRANSPORT_JSON], 'encodings': [ENCODING_ADPCM, ENCODING_PCM],
+            'ackEvery': 8, 'ackIntervalMs': 200,
+        }, None, None),
+        ('format-ack', {'type': 'format-ack', 'transport': TRANSPORT_BINARY, 'encoding': ENCODING_PCM,
+                        'ackEvery': 8, 'ackIntervalMs': 200}, None, None),
+        ('audio', {'type': 'audio', 'data': data, 'seq': 1234, 'timestamp': timestamp},
+         AUDIO_MESSAGE, (data, 1234, timestamp)),
+        ('ack', {'type': 'ack', 'status': 'received', 'bytes': CHUNK_BYTES, 'audioMs': 200, 'seq': 1234},
+         ACK, (CHUNK_BYTES, 200, 1234)),
+        ('cumulative-ack', {'type': 'ack', 'status': 'received', 'bytes': CHUNK_BYTES * 8, 'audioMs': 1600,
+                            'seq': 1234, 'chunks': 8, 'totalBytes': CHUNK_BYTES * 1235},
+         CUMULATIVE_ACK, (CHUNK_BYTES * 8, 1600, 1234, 8, CHUNK_BYTES * 1235)),
+        ('broadcast', {'type': 'broadcast-translation', 'language': 'ja', 'seq': 1234, 'timestamp': timestamp,
+                       'startMs': 246800, 'endMs': 248600, 'text': '[ja] 城門は十五世紀に建てられました'},
+         None, None),
+        ('end', {'type': 'end'}, END, ()),
+        ('end-ack', {'type': 'end-ack'}, END_ACK, ()),
+    ]
+    return [(name, tag_stream(message, STREAM_ID), template, values)
+            for name, message, template, values in shapes]
+
+
+def ns(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e9
+
+
+def run_backend(number):
+    """Chạy trong process con: in một dòng JSON kết quả mỗi loại tin nhắn."""
+    import serialization as S
+
+    for name, message, template, values in message_shapes():
+        text = S.dumps(message)
+        assert S.loads(text) == message
+        if template is not None:
+            assert template.render(*values, stream_id=STREAM_ID) == text
+        frame = text.encode('utf-8')
+        result = {
+            'backend': S.BACKEND,
+            'message': name,
+            'size': len(frame),
+            # Call sites build a fresh dict per message: copying it stands in for that
+            'json.dumps': ns(lambda: json.dumps(dict(message)), number),
+            'dumps': ns(lambda: S.dumps(dict(message)), number),
+            'template': (ns(lambda: template.render(*values, stream_id=STREAM_ID), number)
+                         if template is not None else None),
+            'json.loads': ns(lambda: json.loads(text), number),
+            'loads(str)': ns(lambda: S.loads(text), number),
+            'loads(bytes)': ns(lambda: S.loads(frame), number),
+        }
+        print(json.dumps(result), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Protocol message JSON benchmark")
+    parser.add_argument('--number', type=int, default=20000, help='Số lần lặp mỗi phép đo')
+    parser.add_argument('--backend', choices=BACKENDS, action='append',
+                        help='Chỉ đo backend này (lặp lại được), mặc định mọi backend có sẵn')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_backend(args.number)
+        return
+
+    print(f"{'backend':>8} {'message':>15} {'bytes':>6} | {'encode ns':>9}: {'json':>7} {'dumps':>7} "
+          f"{'tmpl':>7} | {'decode ns':>9}: {'json':>7} {'str':>7} {'bytes':>7}")
+    for backend in args.backend or BACKENDS:
+        env = dict(os.environ, AUDIO_JSON_BACKEND=backend)
+        child = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', '--number', str(args.number)],
+                               env=env, capture_output=True, text=True)
+        if child.returncode != 0:
+            print(f"{backend:>8} unavailable: {child.stderr.strip().splitlines()[-1]}")
+            continue
+        for line in child.stdout.splitlines():
+            r = json.loads(line)
+            template = f"{r['template']:>7.0f}" if r['template'] is not None else f"{'-':>7}"
+            print(f"{r['backend']:>8} {r['message']:>15} {r['size']:>6} | {'':>9}  {r['json.dumps']:>7.0f} "
+                  f"{r['dumps']:>7.0f} {template} | {'':>9}  {r['json.loads']:>7.0f} {r['loads(str)']:>7.0f} "
+                  f"{r['loads(bytes)']:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark chi phí mỗi frame của các streaming profile.
+
+Chạy AudioServer cục bộ và stream một đoạn audio tổng hợp ở chế độ không giới
+hạn tốc độ (speed=0) với từng profile và từng transport, sau đó in ra số tin
+nhắn, số bytes ở tầng ứng dụng và thời gian CPU của process cho mỗi tin nhắn
+và mỗi giây audio (client và server chạy trong cùng process).
+
+Cách sử dụng:
+    python benchmarks/bench_profiles.py [--seconds 60]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import STREAM_PROFILES, AudioTranslationClient  # noqa: E402
+from protocol import AUDIO_COMPRESSION  # noqa: E402
+from server import AudioServer  # noqa: E402
+
+
+class CountingWebSocket:
+    """Bọc websocket để đếm số tin nhắn và bytes được gửi."""
+
+    def __init__(self, websocket):
+        self._websocket = websocket
+        self.messages = 0
+        self.bytes = 0
+
+    async def send(self, message):
+        self.messages += 1
+        self.bytes += len(message)
+        await self._websocket.send(message)
+
+
+async def run_profile(profile, binary, audio, port):
+    server = AudioServer()
+    async with websockets.serve(server.handle_connection, 'localhost', port):
+        client = AudioTranslationClient(f"ws://localhost:{port}", speed=0,
+                                        profile=profile, binary_transport=binary)
+        async with websockets.connect(client.websocket_endpoint, compression=AUDIO_COMPRESSION) as websocket:
+            transport = await client.negotiate_format(websocket)
+            receive_task = asyncio.create_task(client.receive_messages(websocket))
+            counter = CountingWebSocket(websocket)
+            cpu_start = time.process_time()
+            wall_start = time.perf_counter()
+            await client.stream_audio(counter, audio, transport)
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            receive_task.cancel()
+    return transport, counter.messages, counter.bytes, wall, cpu
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--seconds', type=float, default=60.0, help='Độ dài audio tổng hợp (giây)')
+    parser.add_argument('--port', type=int, default=8799)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    rng = np.random.default_rng(0)
+    audio = (rng.standard_normal(int(args.seconds * 16000)) * 3000).astype(np.int16)
+    raw_bytes = audio.nbytes
+
+    print(f"{'profile':<12} {'transport':<9} {'frame':>6} {'msgs':>6} {'overhead':>9} "
+          f"{'cpu/msg':>9} {'cpu/s audio':>11} {'speed':>7}")
+    for profile, settings in STREAM_PROFILES.items():
+        for binary in (True, False):
+            transport, messages, sent, wall, cpu = await run_profile(profile, binary, audio, args.port)
+            print(f"{profile:<12} {transport:<9} {settings['frame_ms']:>4}ms {messages:>6} "
+                  f"{(sent - raw_bytes) / raw_bytes:>8.1%} {cpu / messages * 1e6:>7.0f}us "
+                  f"{cpu / args.seconds * 1e3:>9.2f}ms {args.seconds / wall:>6.0f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
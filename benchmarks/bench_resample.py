@@ -0,0 +1,95 @@
+"""
+Benchmark resampling cho tiền xử lý hàng loạt.
+
+Resample nhiều clip tổng hợp ở các tần số nguồn thường gặp (44.1k, 48k) về
+16 kHz và in thời gian trung bình mỗi clip, tốc độ so với thời gian thực và
+sai lệch tối đa so với scipy.signal.resample_poly cho từng cách:
+- cached: StreamingResampler dùng bộ lọc đã cache (đường dẫn hiện tại)
+- uncached: thiết kế lại bộ lọc cho mỗi clip (như khi chưa có cache)
+- streaming: StreamingResampler theo block DEFAULT_BLOCK_FRAMES mẫu
+- resample_poly: scipy.signal.resample_poly trên toàn bộ clip
+- librosa: librosa.resample (đường dẫn cũ của preprocess_audio), nếu đã cài
+
+Cách sử dụng:
+    python benchmarks/bench_resample.py [--clips 20] [--seconds 10]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.signal import resample_poly
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_pipeline import (DEFAULT_BLOCK_FRAMES, StreamingResampler,  # noqa: E402
+                            design_polyphase_filter, resample)
+
+TARGET_SR = 16000
+
+
+def resample_uncached(signal, orig_sr, target_sr):
+    design_polyphase_filter.cache_clear()
+    return resample(signal, orig_sr, target_sr)
+
+
+def resample_streaming(signal, orig_sr, target_sr):
+    resampler = StreamingResampler(orig_sr, target_sr)
+    blocks = [resampler.process(signal[i:i + DEFAULT_BLOCK_FRAMES])
+              for i in range(0, len(signal), DEFAULT_BLOCK_FRAMES)]
+    return np.concatenate(blocks + [resampler.flush()])
+
+
+def resample_scipy(signal, orig_sr, target_sr):
+    g = np.gcd(orig_sr, target_sr)
+    return resample_poly(signal, target_sr // g, orig_sr // g)
+
+
+def load_methods():
+    methods = {
+        'cached': resample,
+        'uncached': resample_uncached,
+        'streaming': resample_streaming,
+        'resample_poly': resample_scipy,
+    }
+    try:
+        import librosa
+    except ImportError:
+        print("librosa not installed, skipping the librosa baseline")
+    else:
+        methods['librosa'] = lambda signal, orig_sr, target_sr: librosa.resample(
+            signal, orig_sr=orig_sr, target_sr=target_sr)
+    return methods
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resampling benchmark")
+    parser.add_argument('--clips', type=int, default=20, help='Số clip mỗi tần số nguồn')
+    parser.add_argument('--seconds', type=float, default=10.0, help='Độ dài mỗi clip')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    methods = load_methods()
+    print(f"{'source':>8} {'method':>14} {'ms/clip':>10} {'x realtime':>11} {'max err':>10}")
+    for orig_sr in (44100, 48000):
+        clips = [(rng.standard_normal(int(orig_sr * args.seconds)) * 0.1).astype(np.float32)
+                 for _ in range(args.clips)]
+        reference = resample_scipy(clips[0], orig_sr, TARGET_SR)
+        for name, method in methods.items():
+            method(clips[0], orig_sr, TARGET_SR)  # warm up (and fill the filter cache)
+            start = time.perf_counter()
+            for clip in clips:
+                out = method(clip, orig_sr, TARGET_SR)
+            per_clip = (time.perf_counter() - start) / len(clips)
+            first = method(clips[0], orig_sr, TARGET_SR)
+            n = min(len(first), len(reference))
+            error = float(np.max(np.abs(first[:n] - reference[:n])))
+            print(f"{orig_sr:>8} {name:>14} {per_clip * 1000:>10.1f} "
+                  f"{args.seconds / per_clip:>11.0f} {error:>10.2e}")
+            del out
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Kiểm tra ngân sách thời gian import của các entry point.
+
+Mỗi module được import trong một interpreter mới (lấy thời gian tốt nhất của
+nhiều lần chạy), so với ngân sách tính bằng mili giây và kiểm tra rằng các
+dependency nặng không bị import khi load module. Ngoài ra chạy thử chế độ
+nhanh của client (file PCM16 mono 16kHz) và kiểm tra scipy không được import.
+
+Thoát với mã 1 nếu có module vượt ngân sách hoặc import dependency bị cấm, kèm
+danh sách các module con tốn thời gian nhất (từ python -X importtime).
+
+Cách sử dụng:
+    python benchmarks/check_import_time.py [--repeat 5] [--scale 2.0]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ('scipy', 'librosa', 'pydub')
+
+# module -> (budget in ms, modules that must not be loaded by the import)
+IMPORT_BUDGETS = {
+    'main': (300, HEAVY),
+    'replay': (350, HEAVY),
+    'client_site_ws': (500, HEAVY),
+    'server': (300, HEAVY),
+}
+
+MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{'ms': elapsed, 'forbidden': sorted(m for m in {forbidden!r} if m in sys.modules)}}))
+"""
+
+FAST_MODE = """
+import json, os, sys, tempfile, wave
+import numpy as np
+from main import AudioTranslationClient
+path = os.path.join(tempfile.mkdtemp(), 'fast.wav')
+with wave.open(path, 'wb') as f:
+    f.setnchannels(1)
+    f.setsampwidth(2)
+    f.setframerate(16000)
+    f.writeframes((np.sin(np.arange(16000)) * 1000).astype('<i2').tobytes())
+client = AudioTranslationClient(fast_mode=True, metrics_interval=None)
+chunks = list(client.iter_audio_chunks(path))
+print(json.dumps({'chunks': len(chunks), 'forbidden': sorted(m for m in {heavy!r} if m in sys.modules)}))
+"""
+
+
+def run_python(code, importtime=False):
+    args = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    result = subprocess.run(args, cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(stderr, count=5):
+    """Các module có thời gian import tích lũy lớn nhất từ output -X importtime."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), name.strip()))
+    return [f"{name} {us / 1000:.0f}ms" for us, name in sorted(rows, reverse=True)[:count]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time budget check")
+    parser.add_argument('--repeat', type=int, default=5, help='Số lần đo mỗi module (lấy nhanh nhất)')
+    parser.add_argument('--scale', type=float, default=1.0, help='Nhân ngân sách (máy chậm / CI)')
+    args = parser.parse_args()
+
+    failures = []
+    for module, (budget, forbidden) in IMPORT_BUDGETS.items():
+        code = MEASURE.format(module=module, forbidden=forbidden)
+        runs = [run_python(code)[0] for _ in range(args.repeat)]
+        best = min(run['ms'] for run in runs)
+        loaded = runs[0]['forbidden']
+        limit = budget * args.scale
+        ok = best <= limit and not loaded
+        print(f"{module:>16} {best:>8.0f}ms / {limit:.0f}ms  {'ok' if ok else 'FAIL'}"
+              + (f"  loads {', '.join(loaded)}" if loaded else ""))
+        if not ok:
+            _, stderr = run_python(code, importtime=True)
+            print(f"{'':>16} slowest: {'; '.join(slowest_imports(stderr))}")
+            failures.append(module)
+
+    fast, _ = run_python(FAST_MODE.replace('{heavy!r}', repr(HEAVY)))
+    ok = fast['chunks'] > 0 and not fast['forbidden']
+    print(f"{'fast mode':>16} {fast['chunks']} chunks  {'ok' if ok else 'FAIL'}"
+          + (f"  loads {', '.join(fast['forbidden'])}" if fast['forbidden'] else ""))
+    if not ok:
+        failures.append('fast mode')
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
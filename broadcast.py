@@ -0,0 +1,271 @@
+"""
+Session Broadcast Hub
+
+Module này phát (fan-out) các tin nhắn broadcast-* của một phiên dịch tới mọi
+listener của phiên, theo cách client_site_ws.py mong đợi:
+- Registry các subscriber theo session ID và username, lấy từ route
+  input-stream-translation/{SESSION_ID}/{USERNAME}
+- Mỗi tin nhắn được serialize JSON và nén (zlib hoặc gzip) đúng một lần, cùng
+  một chuỗi bytes được gửi cho mọi subscriber
+- Mỗi subscriber có hàng đợi giới hạn và task gửi riêng, nên các lần gửi chạy
+  song song và một listener chậm không làm chậm các listener khác
+- Khi hàng đợi của subscriber đầy: bỏ frame cũ nhất (drop) hoặc ngắt kết nối
+  (disconnect) tùy policy
+- Chính sách nén của kênh broadcast: nén sẵn ở tầng ứng dụng (zlib/gzip, một
+  lần cho mọi listener) hoặc gửi JSON text và để permessage-deflate của
+  WebSocket nén cho từng kết nối theo một profile trong DEFLATE_PROFILES (cửa
+  sổ, memLevel, context takeover). Kênh audio không bao giờ dùng deflate (xem
+  AUDIO_COMPRESSION trong protocol.py); so sánh CPU / bytes của từng cấu hình:
+  benchmarks/bench_compression.py
+
+Cách sử dụng:
+    hub = BroadcastHub(queue_size=256, slow_policy=SLOW_POLICY_DROP)
+    subscriber = hub.subscribe("1234.tourguide", "client", websocket)
+    hub.publish("1234.tourguide", {"type": "broadcast-translation", ...})
+    hub.unsubscribe(subscriber)
+"""
+
+import asyncio
+import gzip
+import logging
+import zlib
+
+import websockets
+
+from serialization import dumpb, dumps
+
+logger = logging.getLogger(__name__)
+
+SESSION_ROUTE = "/server/audio/input-stream-translation/"
+
+COMPRESSION_ZLIB = "zlib"
+COMPRESSION_GZIP = "gzip"
+# Plain JSON text frames, leaving compression to permessage-deflate (if negotiated)
+COMPRESSION_NONE = "none"
+COMPRESSION_MODES = (COMPRESSION_ZLIB, COMPRESSION_GZIP, COMPRESSION_NONE)
+
+# permessage-deflate settings offered by the server to clients that ask for it.
+# Precompressed broadcasts gain nothing from it, so it is off by default.
+DEFLATE_OFF = "off"
+DEFLATE_PROFILES = {
+    DEFLATE_OFF: None,
+    # What websockets enables by default: 4 KiB window, context takeover
+    "default": {"server_max_window_bits": 12, "client_max_window_bits": 12,
+                "compress_settings": {"memLevel": 5}},
+    # Least memory per listener: 1 KiB window, fastest level
+    "low-memory": {"server_max_window_bits": 10, "client_max_window_bits": 10,
+                   "compress_settings": {"level": 1, "memLevel": 4}},
+    # No state kept between messages: less memory per listener, worse ratio
+    "stateless": {"server_no_context_takeover": True, "client_no_context_takeover": True,
+                  "server_max_window_bits": 12, "client_max_window_bits": 12,
+                  "compress_settings": {"memLevel": 5}},
+    # Best ratio for repetitive JSON, most memory per listener
+    "max": {"server_max_window_bits": 15, "client_max_window_bits": 15,
+            "compress_settings": {"level": 9, "memLevel": 8}},
+}
+
+# What to do when a subscriber's queue is full
+SLOW_POLICY_DROP = "drop"
+SLOW_POLICY_DISCONNECT = "disconnect"
+SLOW_POLICIES = (SLOW_POLICY_DROP, SLOW_POLICY_DISCONNECT)
+
+DEFAULT_SUBSCRIBER_QUEUE = 256
+# Close code for listeners disconnected for not keeping up (try again later)
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+def deflate_extensions(profile: str) -> list:
+    """
+    Extension permessage-deflate cho websockets.serve(extensions=...) theo profile.
+
+    Args:
+        profile (str): Tên trong DEFLATE_PROFILES
+
+    Returns:
+        list: Các extension factory (rỗng khi tắt deflate)
+
+    Raises:
+        ValueError: Khi profile không tồn tại
+    """
+    if profile not in DEFLATE_PROFILES:
+        raise ValueError(f"Unknown deflate profile: {profile}")
+    settings = DEFLATE_PROFILES[profile]
+    if settings is None:
+        return []
+    from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+    return [ServerPerMessageDeflateFactory(**settings)]
+
+
+def parse_session_path(path: str):
+    """
+    Tách session ID và username từ đường dẫn kết nối.
+
+    Args:
+        path (str): Đường dẫn của request, ví dụ
+            /server/audio/input-stream-translation/1234.tourguide/client
+
+    Returns:
+        tuple: (session_id, username), hoặc None nếu không đúng route
+    """
+    if not path or not path.startswith(SESSION_ROUTE):
+        return None
+    parts = path[len(SESSION_ROUTE):].split('?', 1)[0].strip('/').split('/')
+    if len(parts) != 2 or not all(parts):
+        return None
+    return parts[0], parts[1]
+
+
+class Subscriber:
+    """Một listener của phiên: hàng đợi frame đã nén và task gửi riêng."""
+
+    def __init__(self, session_id: str, username: str, websocket, queue_size: int):
+        self.session_id = session_id
+        self.username = username
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.sent = 0
+        self.dropped = 0
+        self.task = None
+
+    async def run(self):
+        """Gửi lần lượt các frame trong hàng đợi tới tới khi kết nối đóng."""
+        try:
+            while True:
+                frame = await self.queue.get()
+                await self.websocket.send(frame)
+                self.sent += 1
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+
+class BroadcastHub:
+    """
+    Registry subscriber theo phiên và phát tin nhắn đã nén tới mọi subscriber.
+
+    publish() không chờ việc gửi: frame được đưa vào hàng đợi của từng
+    subscriber và task gửi của subscriber đó đẩy nó ra websocket.
+    """
+
+    def __init__(self, queue_size: int = DEFAULT_SUBSCRIBER_QUEUE, slow_policy: str = SLOW_POLICY_DROP,
+                 compression: str = COMPRESSION_ZLIB, level: int = 6):
+        """
+        Args:
+            queue_size (int): Số frame tối đa chờ gửi mỗi subscriber
+            slow_policy (str): SLOW_POLICY_DROP hoặc SLOW_POLICY_DISCONNECT
+            compression (str): COMPRESSION_ZLIB, COMPRESSION_GZIP hoặc COMPRESSION_NONE
+            level (int): Mức nén
+
+        Raises:
+            ValueError: Khi slow_policy hoặc compression không hợp lệ
+        """
+        if slow_policy not in SLOW_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {slow_policy}")
+        if compression not in COMPRESSION_MODES:
+            raise ValueError(f"Unknown compression: {compression}")
+        self.queue_size = queue_size
+        self.slow_policy = slow_policy
+        self.compression = compression
+        self.level = level
+        self.sessions = {}
+        self.published = 0
+        self.frames_queued = 0
+        self.dropped = 0
+        self.disconnected = 0
+        self.bytes_encoded = 0
+        # Slow-consumer closes in progress (kept referenced until done)
+        self._closing = set()
+
+    def subscribe(self, session_id: str, username: str, websocket) -> Subscriber:
+        """
+        Đăng ký một listener và khởi động task gửi của nó.
+
+        Returns:
+            Subscriber: Dùng để unsubscribe() khi kết nối đóng
+        """
+        subscriber = Subscriber(session_id, username, websocket, self.queue_size)
+        users = self.sessions.setdefault(session_id, {})
+        users.setdefault(username, set()).add(subscriber)
+        subscriber.task = asyncio.create_task(subscriber.run())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        """Hủy đăng ký và dừng task gửi; phiên rỗng bị xóa khỏi registry."""
+        subscriber.task.cancel()
+        users = self.sessions.get(subscriber.session_id, {})
+        group = users.get(subscriber.username)
+        if group is not None:
+            group.discard(subscriber)
+            if not group:
+                del users[subscriber.username]
+        if not users:
+            self.sessions.pop(subscriber.session_id, None)
+
+    def subscribers(self, session_id: str) -> list:
+        """Mọi subscriber của phiên, không phân biệt username."""
+        return [s for group in self.sessions.get(session_id, {}).values() for s in group]
+
+    def encode(self, message: dict):
+        """Serialize JSON và nén một tin nhắn (str nếu không nén, gửi dạng text frame)."""
+        if self.compression == COMPRESSION_NONE:
+            frame = dumps(message)
+            self.bytes_encoded += len(frame)
+            return frame
+        data = dumpb(message)
+        if self.compression == COMPRESSION_GZIP:
+            frame = gzip.compress(data, compresslevel=self.level, mtime=0)
+        else:
+            frame = zlib.compress(data, self.level)
+        self.bytes_encoded += len(frame)
+        return frame
+
+    def _offer(self, subscriber: Subscriber, frame: bytes):
+        if not subscriber.queue.full():
+            subscriber.queue.put_nowait(frame)
+            self.frames_queued += 1
+            return
+        if self.slow_policy == SLOW_POLICY_DISCONNECT:
+            logger.warning(f"Disconnecting slow subscriber {subscriber.username} "
+                           f"of session {subscriber.session_id}")
+            self.disconnected += 1
+            self.unsubscribe(subscriber)
+            task = asyncio.create_task(subscriber.websocket.close(SLOW_CONSUMER_CLOSE_CODE, "slow consumer"))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+            return
+        # Drop the oldest frame so the listener catches up on recent messages
+        subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(frame)
+        subscriber.dropped += 1
+        self.dropped += 1
+
+    def publish(self, session_id: str, message: dict) -> int:
+        """
+        Nén tin nhắn một lần và đưa vào hàng đợi của mọi subscriber của phiên.
+
+        Args:
+            session_id (str): Phiên nhận tin nhắn
+            message (dict): Tin nhắn broadcast-*
+
+        Returns:
+            int: Số subscriber nhận frame
+        """
+        subscribers = self.subscribers(session_id)
+        if not subscribers:
+            return 0
+        frame = self.encode(message)
+        self.published += 1
+        for subscriber in subscribers:
+            self._offer(subscriber, frame)
+        return len(subscribers)
+
+    def counters(self) -> dict:
+        """Bộ đếm của hub: số phiên, subscriber, tin nhắn và frame đã phát / bỏ."""
+        return {
+            'sessions': len(self.sessions),
+            'subscribers': sum(len(self.subscribers(session)) for session in self.sessions),
+            'broadcasts_published': self.published,
+            'broadcast_frames_queued': self.frames_queued,
+            'broadcast_frames_dropped': self.dropped,
+            'slow_disconnects': self.disconnected,
+            'broadcast_bytes_encoded': self.bytes_encoded,
+        }
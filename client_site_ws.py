@@ -4,23 +4,45 @@ WebSocket Audio Client for Translation Service
 Module này triển khai một client WebSocket để kết nối với dịch vụ dịch audio.
 Có khả năng:
 - Tạo nhiều kết nối client song song
-- Nhận và giải nén dữ liệu audio được nén bằng zlib
-- Tải và phát audio từ URL
+- Nhận và giải nén dữ liệu audio được nén bằng zlib (hoặc JSON text khi
+  server không nén sẵn); mặc định không đề nghị permessage-deflate vì frame
+  đã nén sẵn không nhỏ đi thêm, --deflate để bật khi server gửi JSON text
+- Tải và phát audio từ URL qua một connection pool dùng chung trong process,
+  gộp các request trùng nhau và cache nội dung audio (LRU) - việc tải chạy
+  ở background nên không chặn vòng nhận tin nhắn
 - Xử lý các thông báo broadcast từ server
+- Chia các client cho nhiều worker process (mỗi process một event loop) và
+  tổng hợp thống kê về process cha
+- Tùy chọn giải nén/parse JSON theo batch trong thread hoặc process pool thay
+  vì chạy trực tiếp trên event loop, thời gian decode được thống kê riêng
+- Đo độ trễ broadcast end-to-end theo ngôn ngữ khi broadcast mang timestamp
+  của chunk audio gốc (xem metrics.py)
+- Số liệu của từng client được đếm trong bộ nhớ và in tổng hợp định kỳ; các
+  dòng in theo từng tin nhắn / kết nối chỉ được in theo mẫu
 
 Cách sử dụng:
     asyncio.run(main())  # Sẽ tạo NUM_CLIENTS kết nối song song
+    python client_site_ws.py --clients 2000 --workers 8 --duration 300
+    python client_site_ws.py --clients 500 --decode thread --decode-batch 32
 """
 
+import argparse
 import asyncio
+import os
 import websockets
 import aiohttp
 import json
 import zlib
 import random
-from pydub import AudioSegment
-from pydub.playback import play
-from io import BytesIO
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from metrics import (LatencyHistogram, SampledLog, merge_histograms, message_language,
+                     write_latency_csv, write_latency_json)
+from protocol import now_us
+from serialization import loads
 
 # Cấu hình kết nối API và WebSocket
 AUDIO_API_BASE = "https://api.travist.ai"
@@ -33,95 +55,522 @@ WS_BASE_URL = f"wss://api.travist.ai/server/audio/input-stream-translation/{SESS
 
 NUM_CLIENTS = 40
 
-async def fetch_and_play_audio(session, audio_url, client_id):
+# Chế độ giải nén/parse tin nhắn: trên event loop, thread pool hoặc process pool
+DECODE_INLINE = "inline"
+DECODE_THREAD = "thread"
+DECODE_PROCESS = "process"
+DECODE_MODES = (DECODE_INLINE, DECODE_THREAD, DECODE_PROCESS)
+DECODE_BATCH_SIZE = 32
+
+_decode_pools = {}
+
+# Giới hạn connection pool HTTP và dung lượng cache audio (mỗi process)
+FETCH_LIMIT = 100
+FETCH_LIMIT_PER_HOST = 20
+AUDIO_CACHE_BYTES = 64 * 1024 * 1024
+
+# Dòng in theo từng tin nhắn: tối đa một dòng mỗi loại mỗi LOG_INTERVAL giây;
+# thống kê tổng hợp được in mỗi REPORT_INTERVAL giây
+LOG_INTERVAL = 2.0
+REPORT_INTERVAL = 10.0
+sampled_print = SampledLog(print, LOG_INTERVAL)
+
+def get_decode_pool(decode_mode):
+    """Trả về executor dùng chung trong process cho chế độ decode (tạo khi cần)."""
+    # Keyed by pid: pools inherited through fork by shard workers are unusable
+    key = (decode_mode, os.getpid())
+    if key not in _decode_pools:
+        if decode_mode == DECODE_THREAD:
+            # zlib releases the GIL while inflating, so threads scale for decompression
+            _decode_pools[key] = ThreadPoolExecutor(thread_name_prefix="decode")
+        else:
+            _decode_pools[key] = ProcessPoolExecutor()
+    return _decode_pools[key]
+
+def decode_frame(compressed_data):
+    """
+    Giải nén (zlib/gzip) và parse JSON một frame; JSON không nén được parse trực tiếp.
+
+    Frame được nhận dưới dạng bytes (recv(decode=False)) nên text frame không
+    bị giải mã UTF-8 sang str trước khi parse. JSON bắt đầu bằng '{', còn
+    frame zlib bắt đầu bằng 0x78 và gzip bằng 0x1f.
+    
+    Returns:
+        tuple: (message, thời gian decode tính bằng giây)
+    """
+    start = time.perf_counter()
+    if isinstance(compressed_data, str) or compressed_data[:1] == b'{':
+        message = loads(compressed_data)
+        return message, time.perf_counter() - start
+    decompressed = zlib.decompress(compressed_data, wbits=15 + 32)
+    message = loads(decompressed)
+    return message, time.perf_counter() - start
+
+def decode_batch(frames):
+    """Decode một batch frame; chạy được trong thread hoặc process pool."""
+    return [decode_frame(frame) for frame in frames]
+
+class AudioFetcher:
+    """
+    Tải audio qua một aiohttp.ClientSession dùng chung cho mọi client trong process.
+    
+    - Connection pool giới hạn tổng số kết nối và số kết nối mỗi host
+    - Các request đồng thời tới cùng URL dùng chung một request đang chạy
+    - Nội dung audio được cache theo LRU, giới hạn theo tổng số bytes
+    - schedule() chạy việc tải ở background để vòng nhận tin nhắn không phải chờ
+    """
+
+    def __init__(self, limit=FETCH_LIMIT, limit_per_host=FETCH_LIMIT_PER_HOST,
+                 cache_bytes=AUDIO_CACHE_BYTES):
+        """
+        Args:
+            limit (int): Số kết nối HTTP tối đa
+            limit_per_host (int): Số kết nối HTTP tối đa tới mỗi host
+            cache_bytes (int): Dung lượng tối đa của cache audio
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.cache_bytes = cache_bytes
+        self._session = None
+        self._inflight = {}
+        self._cache = OrderedDict()
+        self._cache_size = 0
+        self._tasks = set()
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host)
+        self._session = aiohttp.ClientSession(connector=connector)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        """Hủy các lượt tải còn chạy ở background và đóng session."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+
+    def _store(self, url, body):
+        if len(body) > self.cache_bytes:
+            return
+        self._cache[url] = body
+        self._cache_size += len(body)
+        while self._cache_size > self.cache_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_size -= len(evicted)
+
+    async def _download(self, url):
+        async with self._session.get(url) as response:
+            response.raise_for_status()
+            body = await response.read()
+        self._store(url, body)
+        return body
+
+    async def fetch(self, url):
+        """
+        Lấy nội dung audio từ cache, request đang chạy hoặc tải mới.
+        
+        Args:
+            url (str): URL của file audio
+            
+        Returns:
+            tuple: (body, nguồn) với nguồn là "cache", "shared" hoặc "fetched"
+            
+        Raises:
+            aiohttp.ClientError: Khi tải thất bại
+        """
+        if url in self._cache:
+            self._cache.move_to_end(url)
+            return self._cache[url], "cache"
+        task = self._inflight.get(url)
+        source = "shared"
+        if task is None:
+            task = asyncio.create_task(self._download(url))
+            self._inflight[url] = task
+            task.add_done_callback(lambda _: self._inflight.pop(url, None))
+            source = "fetched"
+        # Shield so one cancelled waiter does not abort the download for the others
+        return await asyncio.shield(task), source
+
+    def schedule(self, coro):
+        """Chạy coroutine ở background, giữ tham chiếu tới khi hoàn tất."""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+async def fetch_and_play_audio(fetcher, audio_url, client_id, stats=None):
     """
     Tải và phát audio từ URL được chỉ định.
     
     Args:
-        session (aiohttp.ClientSession): Session HTTP để tải audio
+        fetcher (AudioFetcher): Bộ tải audio dùng chung
         audio_url (str): URL của file audio cần tải
         client_id (int): ID của client đang thực hiện request
+        stats (dict): Dict thống kê của client, đếm số lần tải theo nguồn
         
     Note:
         Hiện tại phần phát audio đang bị comment out để tránh
         việc phát nhiều audio cùng lúc khi chạy nhiều client
     """
     try:
-        async with session.get(audio_url) as response:
-            if response.status == 200:
-                print(f"[{client_id}] Fetch audio done: {audio_url}")
-                # audio_data = await response.read()
-                # audio = AudioSegment.from_file(BytesIO(audio_data), format="mp3")
-                # play(audio)  # Chạy async nếu cần song song
-            else:
-                print(f"[AUDIO] Failed to fetch audio: {response.status}")
+        audio_data, source = await fetcher.fetch(audio_url)
+        sampled_print("fetch", "[%s] Fetch audio done (%s): %s", client_id, source, audio_url)
+        if stats is not None:
+            stats[f"audio_{source}"] += 1
+        # pydub is imported here, not at module load: playback is off during load tests
+        # from io import BytesIO
+        # from pydub import AudioSegment
+        # from pydub.playback import play
+        # audio = AudioSegment.from_file(BytesIO(audio_data), format="mp3")
+        # play(audio)  # Chạy async nếu cần song song
+    except aiohttp.ClientResponseError as e:
+        sampled_print("fetch-failed", "[AUDIO] Failed to fetch audio: %s", e.status)
+        if stats is not None:
+            stats["audio_failed"] += 1
     except Exception as e:
         print("*"*20)
         print(f"[AUDIO ERROR] {e}")
         print("*"*20)
+        if stats is not None:
+            stats["audio_failed"] += 1
+
+def new_client_stats(client_id):
+    """Tạo dict thống kê rỗng cho một client."""
+    return {
+        "client_id": client_id,
+        "connected": False,
+        "messages": 0,
+        "types": {},
+        "decode_seconds": 0.0,
+        "decode_max": 0.0,
+        "queue_delay_seconds": 0.0,
+        "queue_delay_max": 0.0,
+        "audio_fetched": 0,
+        "audio_shared": 0,
+        "audio_cache": 0,
+        "audio_failed": 0,
+        "latency": {},
+        "error": None,
+    }
+
+def record_decode(stats, decode_seconds, queue_delay):
+    """Ghi nhận thời gian decode và thời gian chờ trong hàng đợi của một frame."""
+    stats["decode_seconds"] += decode_seconds
+    stats["decode_max"] = max(stats["decode_max"], decode_seconds)
+    stats["queue_delay_seconds"] += queue_delay
+    stats["queue_delay_max"] = max(stats["queue_delay_max"], queue_delay)
 
-async def websocket_client(client_id):
+def record_broadcast_latency(stats, message, received_us):
+    """
+    Ghi nhận độ trễ từ lúc chunk audio gốc được gửi tới lúc broadcast tới nơi.
+    
+    Chỉ áp dụng cho broadcast mang `timestamp` (micro giây, wall clock) của chunk
+    gốc; client và speaker cần dùng chung đồng hồ (cùng máy hoặc đã đồng bộ NTP).
+    """
+    sent_us = message.get("timestamp")
+    if sent_us is None:
+        return
+    language = message_language(message, LANGUAGE)
+    if language not in stats["latency"]:
+        stats["latency"][language] = LatencyHistogram()
+    stats["latency"][language].record(received_us - sent_us)
+
+async def handle_message(fetcher, message, client_id, stats, received_us=None):
+    """
+    Xử lý một tin nhắn đã được decode.
+    
+    Args:
+        fetcher (AudioFetcher): Bộ tải audio dùng chung
+        message (dict): Tin nhắn JSON từ server
+        client_id (int): ID của client
+        stats (dict): Dict thống kê của client
+        received_us (int): Thời điểm frame tới nơi (trước khi decode)
+    """
+    msg_type = message.get("type", "")
+    stats["messages"] += 1
+    stats["types"][msg_type] = stats["types"].get(msg_type, 0) + 1
+    if msg_type.startswith("broadcast-") and received_us is not None:
+        record_broadcast_latency(stats, message, received_us)
+    # print(f"[{client_id}] Received message: {message}")
+    if msg_type.startswith("broadcast-"):
+        if "translating" in msg_type:
+            return
+        sampled_print(msg_type, "[%s] Received message: %s", client_id, msg_type)
+
+    if msg_type == "broadcast-audio-noti":
+        audio_url = f"{AUDIO_API_BASE}/{message['http-url-route']}"
+        # print(f"[{client_id}] Audio URL: {audio_url}")
+        fetcher.schedule(fetch_and_play_audio(fetcher, audio_url, client_id, stats))
+
+async def decode_loop(queue, fetcher, client_id, stats, decode_mode, batch_size):
+    """
+    Lấy frame từ hàng đợi theo batch, decode trong executor và xử lý kết quả.
+    
+    Args:
+        queue (asyncio.Queue): Hàng đợi (frame, thời điểm nhận theo perf_counter, theo now_us)
+        fetcher (AudioFetcher): Bộ tải audio dùng chung
+        client_id (int): ID của client
+        stats (dict): Dict thống kê của client
+        decode_mode (str): DECODE_THREAD hoặc DECODE_PROCESS
+        batch_size (int): Số frame tối đa mỗi batch
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_decode_pool(decode_mode)
+    while True:
+        batch = [await queue.get()]
+        while len(batch) < batch_size and not queue.empty():
+            batch.append(queue.get_nowait())
+        dispatched = time.perf_counter()
+        results = await loop.run_in_executor(pool, decode_batch, [frame for frame, _, _ in batch])
+        for (_, received, received_us), (message, decode_seconds) in zip(batch, results):
+            record_decode(stats, decode_seconds, dispatched - received)
+            await handle_message(fetcher, message, client_id, stats, received_us)
+            queue.task_done()
+
+async def websocket_client(client_id, stats=None, decode_mode=DECODE_INLINE,
+                           decode_batch_size=DECODE_BATCH_SIZE, fetcher=None, compression=None):
     """
     Tạo và duy trì một kết nối WebSocket client.
     
     Quy trình hoạt động:
     1. Thiết lập kết nối WebSocket với server
     2. Liên tục lắng nghe và xử lý các tin nhắn
-    3. Giải nén dữ liệu nhận được bằng zlib
+    3. Giải nén dữ liệu nhận được bằng zlib (trên event loop hoặc theo batch
+       trong thread/process pool tùy decode_mode)
     4. Xử lý các tin nhắn broadcast khác nhau
-    5. Tải và phát audio khi nhận được thông báo
+    5. Tải và phát audio ở background khi nhận được thông báo
     
     Args:
         client_id (int): ID để định danh client trong hệ thống
+        stats (dict): Dict thống kê được cập nhật trong lúc chạy, tạo mới nếu None
+        decode_mode (str): Nơi giải nén/parse tin nhắn (DECODE_MODES)
+        decode_batch_size (int): Số frame tối đa mỗi batch khi decode trong pool
+        fetcher (AudioFetcher): Bộ tải audio dùng chung, tạo riêng nếu None
+        compression (str): "deflate" để đề nghị permessage-deflate, None để tắt
+        
+    Returns:
+        dict: Thống kê của client (số tin nhắn theo loại, lỗi nếu có)
         
     Raises:
         websockets.exceptions.ConnectionClosed: Khi kết nối bị đóng
         Exception: Các lỗi khác trong quá trình xử lý
     """
+    if stats is None:
+        stats = new_client_stats(client_id)
     ws_url = f"{WS_BASE_URL}"
-    print(f"[{client_id}] Connecting to {ws_url}")
+    sampled_print("connecting", "[%s] Connecting to %s", client_id, ws_url)
 
-    async with aiohttp.ClientSession() as session:
+    async with (AudioFetcher() if fetcher is None else nullcontext(fetcher)) as fetcher:
         try:
-            async with websockets.connect(ws_url, open_timeout=20, max_size=None) as ws:
-                print(f"[{client_id}] Connected.")
+            async with websockets.connect(ws_url, open_timeout=20, max_size=None,
+                                          compression=compression) as ws:
+                sampled_print("connected", "[%s] Connected.", client_id)
+                stats["connected"] = True
 
-                while True:
-                    compressed_data = await ws.recv()
-
-                    decompressed = zlib.decompress(compressed_data, wbits=15 + 32)
-                    message = json.loads(decompressed)
-                    # print(f"[{client_id}] Received message: {message}")
-                    if message.get("type", "").startswith("broadcast-"):
-                        if "translating" in message.get("type", ""):
-                            continue
-                        print(f"[{client_id}] Received message: {message['type']}")
-
-                    if message.get("type") == "broadcast-audio-noti":
-                        audio_url = f"{AUDIO_API_BASE}/{message['http-url-route']}"
-                        # print(f"[{client_id}] Audio URL: {audio_url}")
-                        await fetch_and_play_audio(session, audio_url, client_id)
+                if decode_mode == DECODE_INLINE:
+                    while True:
+                        compressed_data = await ws.recv(decode=False)
+                        received_us = now_us()
+                        message, decode_seconds = decode_frame(compressed_data)
+                        record_decode(stats, decode_seconds, 0.0)
+                        await handle_message(fetcher, message, client_id, stats, received_us)
 
+                queue = asyncio.Queue()
+                decoder = asyncio.create_task(
+                    decode_loop(queue, fetcher, client_id, stats, decode_mode, decode_batch_size))
+                try:
+                    while True:
+                        compressed_data = await ws.recv(decode=False)
+                        if decoder.done():
+                            decoder.result()  # surface decode errors
+                        queue.put_nowait((compressed_data, time.perf_counter(), now_us()))
+                except websockets.exceptions.ConnectionClosed:
+                    # Finish decoding frames that arrived before the close
+                    drained = asyncio.create_task(queue.join())
+                    await asyncio.wait({drained, decoder}, return_when=asyncio.FIRST_COMPLETED)
+                    drained.cancel()
+                    raise
+                finally:
+                    decoder.cancel()
 
         except websockets.exceptions.ConnectionClosed as e:
-            print("*"*20)
-            print(f"[{client_id}] WebSocket closed: {e}")
-            print("*"*20)
+            sampled_print("closed", "[%s] WebSocket closed: %s", client_id, e)
         except Exception as e:
             print("*"*20)
             print(f"[{client_id}] Error: {e}")
             print("*"*20)
+            stats["error"] = str(e)
+    return stats
+
+async def report_stats(stats, interval):
+    """In thống kê tổng hợp của nhóm client mỗi interval giây."""
+    while True:
+        await asyncio.sleep(interval)
+        print(f"[STATS {os.getpid()}] {json.dumps(aggregate_stats(stats))}")
+
+async def run_clients(client_ids, duration=None, client_options=None, fetcher_options=None,
+                      report_interval=REPORT_INTERVAL):
+    """
+    Chạy một nhóm client trên event loop hiện tại.
+    
+    Args:
+        client_ids (iterable): ID của các client cần chạy
+        duration (float): Dừng sau số giây này, None để chạy tới khi mọi kết nối đóng
+        client_options (dict): Tham số bổ sung cho websocket_client (ví dụ decode_mode)
+        fetcher_options (dict): Tham số cho AudioFetcher dùng chung của nhóm client
+        report_interval (float): Chu kỳ in thống kê tổng hợp (giây), None để tắt
+        
+    Returns:
+        list: Thống kê của từng client
+    """
+    client_options = client_options or {}
+    stats = [new_client_stats(client_id) for client_id in client_ids]
+    reporter = asyncio.create_task(report_stats(stats, report_interval)) if report_interval else None
+    async with AudioFetcher(**(fetcher_options or {})) as fetcher:
+        tasks = [asyncio.create_task(
+                     websocket_client(s["client_id"], s, fetcher=fetcher, **client_options))
+                 for s in stats]
+        _, pending = await asyncio.wait(tasks, timeout=duration)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    if reporter:
+        reporter.cancel()
+    return stats
+
+def run_shard(client_ids, duration=None, client_options=None, fetcher_options=None,
+              report_interval=REPORT_INTERVAL):
+    """
+    Entry point của worker process: chạy một shard client trên event loop riêng.
+    
+    Args:
+        client_ids (list): ID của các client thuộc shard
+        duration (float): Thời gian chạy tối đa (giây)
+        client_options (dict): Tham số bổ sung cho websocket_client
+        fetcher_options (dict): Tham số cho AudioFetcher của shard
+        report_interval (float): Chu kỳ in thống kê của shard (giây), None để tắt
+        
+    Returns:
+        list: Thống kê của từng client trong shard
+    """
+    return asyncio.run(run_clients(client_ids, duration, client_options, fetcher_options, report_interval))
+
+def aggregate_stats(all_stats):
+    """
+    Tổng hợp thống kê của nhiều client.
+    
+    Args:
+        all_stats (list): Danh sách dict thống kê từ các client
+        
+    Returns:
+        dict: Số client, số kết nối thành công, lỗi, số tin nhắn theo loại và
+            thời gian decode / chờ hàng đợi (trung bình, lớn nhất) mỗi frame,
+            số lần tải audio theo nguồn (tải mới, dùng chung, cache, lỗi) và
+            độ trễ broadcast theo ngôn ngữ
+    """
+    messages = sum(s["messages"] for s in all_stats)
+    summary = {
+        "clients": len(all_stats),
+        "connected": sum(1 for s in all_stats if s["connected"]),
+        "errors": sum(1 for s in all_stats if s["error"]),
+        "messages": messages,
+        "decode_mean_ms": sum(s["decode_seconds"] for s in all_stats) / messages * 1000 if messages else 0.0,
+        "decode_max_ms": max((s["decode_max"] for s in all_stats), default=0.0) * 1000,
+        "queue_delay_mean_ms": sum(s["queue_delay_seconds"] for s in all_stats) / messages * 1000 if messages else 0.0,
+        "queue_delay_max_ms": max((s["queue_delay_max"] for s in all_stats), default=0.0) * 1000,
+        "audio_fetched": sum(s["audio_fetched"] for s in all_stats),
+        "audio_shared": sum(s["audio_shared"] for s in all_stats),
+        "audio_cache": sum(s["audio_cache"] for s in all_stats),
+        "audio_failed": sum(s["audio_failed"] for s in all_stats),
+        "latency": {language: hist.to_dict() for language, hist in
+                    sorted(merge_histograms(s["latency"] for s in all_stats).items())},
+        "types": {},
+    }
+    for s in all_stats:
+        for msg_type, count in s["types"].items():
+            summary["types"][msg_type] = summary["types"].get(msg_type, 0) + count
+    return summary
+
+def run_sharded(num_clients, workers, duration=None, client_options=None, fetcher_options=None,
+                report_interval=REPORT_INTERVAL):
+    """
+    Chia num_clients client cho nhiều worker process và thu kết quả về process cha.
+    
+    Mỗi worker chạy một event loop riêng, nên việc giải nén và parse JSON
+    của các client được phân bổ trên nhiều core thay vì dồn vào một loop.
+    
+    Args:
+        num_clients (int): Tổng số client
+        workers (int): Số worker process
+        duration (float): Thời gian chạy tối đa (giây)
+        client_options (dict): Tham số bổ sung cho websocket_client
+        fetcher_options (dict): Tham số cho AudioFetcher của mỗi worker
+        report_interval (float): Chu kỳ mỗi worker in thống kê shard (giây)
+        
+    Returns:
+        list: Thống kê của từng client từ mọi worker (tổng hợp bằng aggregate_stats)
+    """
+    shards = [list(range(w, num_clients, workers)) for w in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(run_shard, shards, [duration] * workers,
+                           [client_options] * workers, [fetcher_options] * workers,
+                           [report_interval] * workers)
+        return [s for shard in results for s in shard]
 
 async def main():
     """
     Hàm main để khởi chạy nhiều client WebSocket song song.
     
     Tạo NUM_CLIENTS kết nối WebSocket và chạy chúng đồng thời
-    sử dụng asyncio.gather(). Mỗi client sẽ hoạt động độc lập
-    và có thể xử lý các tin nhắn riêng biệt.
+    trên một event loop thông qua run_clients(). Mỗi client sẽ hoạt động
+    độc lập và có thể xử lý các tin nhắn riêng biệt. Dùng run_sharded()
+    (hoặc --workers khi chạy từ dòng lệnh) để chia client cho nhiều process.
     """
-    clients = [websocket_client(i) for i in range(NUM_CLIENTS)]
-    await asyncio.gather(*clients)
+    stats = await run_clients(range(NUM_CLIENTS))
+    print(f"[SUMMARY] {json.dumps(aggregate_stats(stats))}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="WebSocket listener swarm")
+    parser.add_argument("--clients", type=int, default=NUM_CLIENTS, help="Tổng số client")
+    parser.add_argument("--workers", type=int, default=1,
+                        help=f"Số worker process (0 = số core, hiện tại {os.cpu_count()})")
+    parser.add_argument("--duration", type=float, default=None, help="Thời gian chạy tối đa (giây)")
+    parser.add_argument("--decode", choices=DECODE_MODES, default=DECODE_INLINE,
+                        help="Nơi giải nén/parse tin nhắn")
+    parser.add_argument("--decode-batch", type=int, default=DECODE_BATCH_SIZE,
+                        help="Số frame tối đa mỗi batch decode")
+    parser.add_argument("--fetch-limit-per-host", type=int, default=FETCH_LIMIT_PER_HOST,
+                        help="Số kết nối HTTP tối đa tới mỗi host (mỗi process)")
+    parser.add_argument("--audio-cache-mb", type=float, default=AUDIO_CACHE_BYTES / 2**20,
+                        help="Dung lượng cache audio (MB, mỗi process)")
+    parser.add_argument("--deflate", action="store_true",
+                        help="Đề nghị permessage-deflate (khi server gửi broadcast dạng JSON text)")
+    parser.add_argument("--latency-json", help="Ghi histogram độ trễ broadcast theo ngôn ngữ ra JSON")
+    parser.add_argument("--latency-csv", help="Ghi histogram độ trễ broadcast theo ngôn ngữ ra CSV")
+    parser.add_argument("--report-interval", type=float, default=REPORT_INTERVAL,
+                        help="Chu kỳ in thống kê tổng hợp (giây), 0 để tắt")
+    args = parser.parse_args()
+
+    client_options = {"decode_mode": args.decode, "decode_batch_size": args.decode_batch,
+                      "compression": "deflate" if args.deflate else None}
+    fetcher_options = {"limit_per_host": args.fetch_limit_per_host,
+                       "cache_bytes": int(args.audio_cache_mb * 2**20)}
+    workers = args.workers or os.cpu_count()
+    if workers > 1:
+        all_stats = run_sharded(args.clients, workers, args.duration, client_options, fetcher_options,
+                                args.report_interval or None)
+    else:
+        all_stats = asyncio.run(
+            run_clients(range(args.clients), args.duration, client_options, fetcher_options,
+                        args.report_interval or None))
+    print(f"[SUMMARY] {json.dumps(aggregate_stats(all_stats))}")
+
+    latency = {SESSION_ID: merge_histograms(s["latency"] for s in all_stats)}
+    if args.latency_json:
+        write_latency_json(args.latency_json, latency)
+    if args.latency_csv:
+        write_latency_csv(args.latency_csv, latency)
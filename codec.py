@@ -0,0 +1,290 @@
+"""
+Audio Uplink Codecs
+
+Module này định nghĩa các codec mà client có thể dùng để gửi audio lên server
+thay cho PCM16 thô (256 kbps ở 16 kHz), cho các đường uplink di động băng
+thông thấp. Mọi codec đều là phần mềm thuần, không cần thư viện ngoài:
+- PCM: PCM16 little-endian, không nén
+- MULAW: G.711 µ-law 8 bit (2:1, 128 kbps ở 16 kHz), mã hóa / giải mã vector
+  hóa bằng numpy
+- IMA-ADPCM: IMA/DVI ADPCM 4 bit (4:1, 64 kbps ở 16 kHz); dùng audioop của
+  stdlib khi có (C), ngược lại dùng bản Python tương đương bit-for-bit
+
+Mỗi chunk audio được mã hóa thành một frame tự giải mã được, nên kích thước
+frame bám theo thời lượng chunk của streaming profile và việc mất hoặc gửi lại
+một chunk không làm hỏng các chunk sau. Frame IMA-ADPCM bắt đầu bằng header 4
+bytes (little-endian):
+
+    predictor (i16) | step_index (u8) | padding (u8)
+
+theo sau là các nibble 4 bit (mẫu đầu ở nibble cao); padding = 1 khi nibble
+cuối chỉ để làm tròn byte. Bộ mã hóa giữ trạng thái giữa các chunk để chất
+lượng liên tục như một stream.
+
+Codec được thương lượng giống transport (xem protocol.py): client liệt kê các
+encoding nó hỗ trợ trong trường `encodings` của tin nhắn format, server chọn
+một encoding và trả về trong `format-ack`. Peer cũ không biết trường này thì
+dùng PCM.
+"""
+
+import struct
+import warnings
+
+import numpy as np
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import audioop
+except ImportError:  # removed from the stdlib in Python 3.13
+    audioop = None
+
+ENCODING_PCM = "PCM"
+ENCODING_MULAW = "MULAW"
+ENCODING_ADPCM = "IMA-ADPCM"
+SUPPORTED_ENCODINGS = (ENCODING_ADPCM, ENCODING_MULAW, ENCODING_PCM)
+
+ADPCM_HEADER = struct.Struct("<hBB")
+ADPCM_HEADER_SIZE = ADPCM_HEADER.size
+
+_INDEX_TABLE = (-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8)
+_STEP_TABLE = (
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+    253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+    1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+    3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442,
+    11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794,
+    32767)
+
+_MULAW_BIAS = 0x84
+# audioop encodes from 14-bit samples (sample >> 2): clip and bias on that scale
+_MULAW_CLIP_14 = 8159
+_MULAW_BIAS_14 = _MULAW_BIAS >> 2
+
+
+def choose_encoding(format_message: dict) -> str:
+    """
+    Chọn encoding cho một stream dựa trên tin nhắn `format` của client.
+
+    Args:
+        format_message (dict): Tin nhắn format đã được parse
+
+    Returns:
+        str: Encoding đầu tiên trong `encodings` mà server hỗ trợ, ngược lại
+            encoding client khai báo (mặc định ENCODING_PCM)
+    """
+    declared = format_message.get("encoding", ENCODING_PCM)
+    for encoding in format_message.get("encodings") or []:
+        if encoding in SUPPORTED_ENCODINGS:
+            return encoding
+    return declared
+
+
+def _as_samples(payload) -> np.ndarray:
+    return np.frombuffer(payload, dtype='<i2')
+
+
+def _mulaw_decode_table() -> np.ndarray:
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = (((mantissa << 3) + _MULAW_BIAS) << exponent) - _MULAW_BIAS
+    return np.where(codes & 0x80, -magnitude, magnitude).astype('<i2')
+
+
+_MULAW_TABLE = _mulaw_decode_table()
+
+
+def mulaw_encode(samples: np.ndarray) -> bytes:
+    """Mã hóa PCM16 sang G.711 µ-law (một byte mỗi mẫu), giống hệt audioop.lin2ulaw."""
+    # Arithmetic shift like audioop: negative samples round away from zero
+    x = samples.astype(np.int32) >> 2
+    sign = np.where(x < 0, 0x80, 0)
+    # Clipped samples overflow the last segment: saturate to its largest code, as audioop does
+    magnitude = np.minimum(np.minimum(np.abs(x), _MULAW_CLIP_14) + _MULAW_BIAS_14, 0x1FFF)
+    # Segment = position of the highest set bit above bit 5
+    exponent = np.clip(np.floor(np.log2(magnitude)).astype(np.int32) - 5, 0, 7)
+    mantissa = (magnitude >> (exponent + 1)) & 0x0F
+    return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8).tobytes()
+
+
+def mulaw_decode(payload) -> np.ndarray:
+    """Giải mã G.711 µ-law về PCM16."""
+    return _MULAW_TABLE[np.frombuffer(payload, dtype=np.uint8)]
+
+
+def _lin2adpcm(pcm: bytes, state):
+    """Bản Python của audioop.lin2adpcm(pcm, 2, state)."""
+    valpred, index = state or (0, 0)
+    step = _STEP_TABLE[index]
+    samples = len(pcm) // 2
+    out = bytearray((samples + 1) // 2)
+    high = True
+    position = 0
+    for (val,) in struct.iter_unpack('<h', pcm):
+        diff = val - valpred
+        sign = 8 if diff < 0 else 0
+        if sign:
+            diff = -diff
+        delta = 0
+        vpdiff = step >> 3
+        if diff >= step:
+            delta = 4
+            diff -= step
+            vpdiff += step
+        step >>= 1
+        if diff >= step:
+            delta |= 2
+            diff -= step
+            vpdiff += step
+        step >>= 1
+        if diff >= step:
+            delta |= 1
+            vpdiff += step
+        valpred = max(-32768, valpred - vpdiff) if sign else min(32767, valpred + vpdiff)
+        delta |= sign
+        index = min(88, max(0, index + _INDEX_TABLE[delta]))
+        step = _STEP_TABLE[index]
+        if high:
+            out[position] = delta << 4
+        else:
+            out[position] |= delta
+            position += 1
+        high = not high
+    # Like audioop, a trailing odd nibble is dropped
+    return bytes(out[:samples // 2]), (valpred, index)
+
+
+def _adpcm2lin(adpcm: bytes, state):
+    """Bản Python của audioop.adpcm2lin(adpcm, 2, state)."""
+    valpred, index = state or (0, 0)
+    step = _STEP_TABLE[index]
+    out = []
+    for byte in adpcm:
+        for delta in (byte >> 4, byte & 0x0F):
+            index = min(88, max(0, index + _INDEX_TABLE[delta]))
+            vpdiff = step >> 3
+            if delta & 4:
+                vpdiff += step
+            if delta & 2:
+                vpdiff += step >> 1
+            if delta & 1:
+                vpdiff += step >> 2
+            valpred = max(-32768, valpred - vpdiff) if delta & 8 else min(32767, valpred + vpdiff)
+            step = _STEP_TABLE[index]
+            out.append(valpred)
+    return struct.pack(f'<{len(out)}h', *out), (valpred, index)
+
+
+if audioop is not None:
+    def lin2adpcm(pcm, state):
+        return audioop.lin2adpcm(pcm, 2, state)
+
+    def adpcm2lin(adpcm, state):
+        return audioop.adpcm2lin(adpcm, 2, state)
+else:
+    lin2adpcm = _lin2adpcm
+    adpcm2lin = _adpcm2lin
+
+
+class PcmEncoder:
+    """Không nén: trả lại nguyên payload (kể cả memoryview, không sao chép)."""
+
+    encoding = ENCODING_PCM
+
+    def encode(self, payload):
+        return payload
+
+
+class MulawEncoder:
+    """G.711 µ-law, không có trạng thái."""
+
+    encoding = ENCODING_MULAW
+
+    def encode(self, payload) -> bytes:
+        return mulaw_encode(_as_samples(payload))
+
+
+class AdpcmEncoder:
+    """IMA-ADPCM, giữ trạng thái bộ dự đoán giữa các chunk của một stream."""
+
+    encoding = ENCODING_ADPCM
+
+    def __init__(self, encode=None):
+        """
+        Args:
+            encode (callable): Hàm kiểu lin2adpcm(pcm, state), mặc định bản
+                nhanh nhất hiện có
+        """
+        self._encode = encode or lin2adpcm
+        self.state = None
+
+    def encode(self, payload) -> bytes:
+        pcm = memoryview(payload).cast('B')
+        padding = (len(pcm) // 2) % 2
+        if padding:
+            # Repeat the last sample so the final byte holds two nibbles
+            pcm = bytes(pcm) + bytes(pcm[-2:])
+        valpred, index = self.state or (0, 0)
+        data, self.state = self._encode(pcm, self.state)
+        return ADPCM_HEADER.pack(valpred, index, padding) + data
+
+
+_ENCODERS = {
+    ENCODING_PCM: PcmEncoder,
+    ENCODING_MULAW: MulawEncoder,
+    ENCODING_ADPCM: AdpcmEncoder,
+}
+
+
+def create_encoder(encoding: str):
+    """
+    Tạo bộ mã hóa cho một stream.
+
+    Raises:
+        ValueError: Khi encoding không được hỗ trợ
+    """
+    if encoding not in _ENCODERS:
+        raise ValueError(f"Unsupported encoding: {encoding}")
+    return _ENCODERS[encoding]()
+
+
+def decode(encoding: str, payload, adpcm_decode=None) -> np.ndarray:
+    """
+    Giải mã một frame về PCM16 (int16, các kênh xen kẽ như lúc mã hóa).
+
+    Args:
+        encoding (str): Encoding của stream
+        payload: Frame nhận được (bytes hoặc memoryview)
+        adpcm_decode (callable): Hàm kiểu adpcm2lin(adpcm, state), mặc định bản
+            nhanh nhất hiện có
+
+    Raises:
+        ValueError: Khi encoding không được hỗ trợ hoặc frame hỏng
+    """
+    if encoding == ENCODING_PCM:
+        return _as_samples(payload)
+    if encoding == ENCODING_MULAW:
+        return mulaw_decode(payload)
+    if encoding == ENCODING_ADPCM:
+        if len(payload) < ADPCM_HEADER_SIZE:
+            raise ValueError(f"IMA-ADPCM frame too short: {len(payload)} bytes")
+        valpred, index, padding = ADPCM_HEADER.unpack_from(payload)
+        if index > 88:
+            raise ValueError(f"Invalid IMA-ADPCM step index: {index}")
+        pcm, _ = (adpcm_decode or adpcm2lin)(bytes(payload[ADPCM_HEADER_SIZE:]), (valpred, index))
+        samples = _as_samples(pcm)
+        return samples[:len(samples) - padding] if padding else samples
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def pcm_size(encoding: str, payload) -> int:
+    """Số bytes PCM16 mà frame giải mã ra, tính từ kích thước (không giải mã)."""
+    if encoding == ENCODING_MULAW:
+        return len(payload) * 2
+    if encoding == ENCODING_ADPCM:
+        if len(payload) < ADPCM_HEADER_SIZE:
+            return 0
+        return ((len(payload) - ADPCM_HEADER_SIZE) * 2 - payload[ADPCM_HEADER_SIZE - 1]) * 2
+    return memoryview(payload).nbytes
@@ -0,0 +1,343 @@
+"""
+Persistent Multiplexed Connection
+
+Module này giữ một kết nối WebSocket lâu dài tới server và chạy nhiều stream
+audio trên đó (xem protocol.py), để batch job chỉ trả chi phí bắt tay TCP/TLS
+và WebSocket một lần cho hàng nghìn clip:
+- Tự kết nối lại khi mất kết nối, chờ theo backoff lũy thừa có jitter (full
+  jitter) để nhiều client không cùng kết nối lại một lúc
+- Mỗi stream có streamId riêng; một task đọc duy nhất chuyển các phản hồi
+  (format-ack, ack, broadcast-*, end-ack) tới client của stream tương ứng
+- Stream đầu tiên của kết nối dùng stream 0; chỉ khi format-ack cho thấy server
+  hỗ trợ nhiều stream (streams) thì các stream mới chạy đồng thời, nếu không
+  chúng chạy lần lượt trên stream 0 như server cũ yêu cầu
+- Stream bị cắt do mất kết nối được chạy lại từ đầu trên kết nối mới, tối đa
+  max_retries lần; sau hơn max_retries lần kết nối thất bại liên tiếp, kết nối
+  dừng và các stream đang chờ nhận StreamClosed
+- Giới hạn số stream chạy đồng thời trên kết nối (max_streams); max_streams=1
+  là stream lần lượt từng clip
+
+Cách sử dụng:
+    async with PersistentConnection("ws://localhost:8765", max_streams=8) as connection:
+        stats = await connection.stream_file(AudioTranslationClient(), "a.wav")
+        results = await connection.stream_files(paths, AudioTranslationClient)
+"""
+
+import asyncio
+import logging
+import random
+
+import websockets
+
+from metrics import MetricsRegistry
+from protocol import AUDIO_COMPRESSION, DEFAULT_STREAM_ID, MAX_STREAM_ID, ProtocolError, stream_id_of
+from serialization import DECODE_ERRORS, MessageTemplate, dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Reconnect delays: uniform(0, min(cap, base * 2**attempt)) seconds
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_CAP = 30.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_MAX_STREAMS = 64
+# Seconds to wait for a stream's end-ack (its last results) after its audio is sent
+DEFAULT_END_TIMEOUT = 30.0
+
+END = MessageTemplate('end')
+
+
+def backoff_delays(base: float = DEFAULT_BACKOFF_BASE, cap: float = DEFAULT_BACKOFF_CAP, rng=random):
+    """
+    Thời gian chờ trước mỗi lần kết nối lại liên tiếp (full jitter).
+
+    Args:
+        base (float): Giới hạn trên của lần chờ đầu tiên (giây)
+        cap (float): Giới hạn trên tối đa (giây)
+        rng: Nguồn số ngẫu nhiên có uniform()
+
+    Returns:
+        generator: Sinh vô hạn các khoảng chờ (giây)
+    """
+    attempt = 0
+    while True:
+        yield rng.uniform(0, min(cap, base * 2 ** attempt))
+        attempt += 1
+
+
+class StreamClosed(ConnectionError):
+    """Kết nối bị đóng khi stream còn đang chạy."""
+
+
+class _Stream:
+    """Một stream đang chạy trên kết nối: client nhận phản hồi và các future chờ server."""
+
+    def __init__(self, stream_id: int, client):
+        loop = asyncio.get_running_loop()
+        self.id = stream_id
+        self.client = client
+        self.format_ack = loop.create_future()
+        self.ended = loop.create_future()
+
+    def fail(self, error: Exception):
+        for future in (self.format_ack, self.ended):
+            if not future.done():
+                future.set_exception(error)
+                # Not every future is awaited (e.g. format_ack without binary transport)
+                future.exception()
+
+
+class PersistentConnection:
+    """
+    Một kết nối WebSocket dùng chung cho nhiều stream audio, tự kết nối lại.
+
+    Các stream dùng AudioTranslationClient để tiền xử lý, tạo tin nhắn format,
+    stream audio theo pacing của client và cập nhật số liệu của client đó.
+    Với server không hỗ trợ streamId (xem protocol.py), các stream chạy lần
+    lượt trên stream 0.
+    """
+
+    def __init__(self,
+                 websocket_endpoint="ws://localhost:8765",
+                 max_streams=DEFAULT_MAX_STREAMS,
+                 max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_base=DEFAULT_BACKOFF_BASE,
+                 backoff_cap=DEFAULT_BACKOFF_CAP,
+                 end_timeout=DEFAULT_END_TIMEOUT,
+                 connect_options=None):
+        """
+        Args:
+            websocket_endpoint (str): WebSocket server endpoint
+            max_streams (int): Số stream chạy đồng thời tối đa trên kết nối
+            max_retries (int): Số lần chạy lại một stream bị cắt do mất kết nối,
+                cũng là số lần kết nối thất bại liên tiếp trước khi bỏ cuộc
+            backoff_base (float): Giới hạn trên của lần chờ kết nối lại đầu tiên (giây)
+            backoff_cap (float): Giới hạn trên tối đa của thời gian chờ kết nối lại (giây)
+            end_timeout (float): Thời gian chờ end-ack sau khi gửi hết audio của stream
+            connect_options (dict): Tham số thêm cho websockets.connect()
+        """
+        if not 1 <= max_streams <= MAX_STREAM_ID:
+            raise ValueError(f"max_streams must be between 1 and {MAX_STREAM_ID}")
+        self.websocket_endpoint = websocket_endpoint
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.end_timeout = end_timeout
+        self.connect_options = {'compression': AUDIO_COMPRESSION, **(connect_options or {})}
+        self.metrics = MetricsRegistry()
+        self._slots = asyncio.Semaphore(max_streams)
+        self._streams = {}
+        self._next_id = DEFAULT_STREAM_ID
+        self._multiplexing = False
+        self._streams_changed = None
+        self._websocket = None
+        self._connected = None
+        self._failure = None
+        self._task = None
+        self._closing = False
+
+    async def start(self):
+        """Khởi động task giữ kết nối (gọi nhiều lần không có tác dụng)."""
+        if self._task is None:
+            self._connected = asyncio.Event()
+            self._streams_changed = asyncio.Condition()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Đóng kết nối và dừng việc kết nối lại."""
+        self._closing = True
+        if self._websocket is not None:
+            await self._websocket.close()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _run(self):
+        delays = None
+        failures = 0
+        while not self._closing:
+            try:
+                logger.info(f"Connecting to WebSocket server at {self.websocket_endpoint}")
+                websocket = await websockets.connect(self.websocket_endpoint, **self.connect_options)
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+                self.metrics.incr('connect_failures')
+                failures += 1
+                if failures > self.max_retries:
+                    logger.error(f"Giving up on {self.websocket_endpoint} after {failures} failed connection attempts")
+                    # Wake the streams waiting for a connection so they fail instead of hanging
+                    self._failure = StreamClosed(f"Could not connect to {self.websocket_endpoint} "
+                                                 f"after {failures} attempts: {e}")
+                    self._connected.set()
+                    return
+                delays = delays or backoff_delays(self.backoff_base, self.backoff_cap)
+                delay = next(delays)
+                logger.warning(f"Connection failed ({e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            delays = None
+            failures = 0
+            self.metrics.incr('connections')
+            # Until a format-ack says otherwise the new peer may only know stream 0
+            self._multiplexing = False
+            self._websocket = websocket
+            self._connected.set()
+            try:
+                async for message in websocket:
+                    self._dispatch(message)
+            except websockets.exceptions.ConnectionClosed:
+                pass
+            finally:
+                self._connected.clear()
+                self._websocket = None
+                error = StreamClosed(f"Connection to {self.websocket_endpoint} closed")
+                for stream in list(self._streams.values()):
+                    stream.fail(error)
+
+            if not self._closing:
+                self.metrics.incr('disconnects')
+                delays = backoff_delays(self.backoff_base, self.backoff_cap)
+                delay = next(delays)
+                logger.warning(f"WebSocket connection closed, reconnecting in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def _dispatch(self, message):
+        """Chuyển một tin nhắn của server tới stream theo streamId."""
+        try:
+            response = loads(message)
+            stream = self._streams.get(stream_id_of(response))
+        except (*DECODE_ERRORS, TypeError, AttributeError, ProtocolError):
+            self.metrics.incr('invalid_messages')
+            return
+        if stream is None:
+            self.metrics.incr('unrouted_messages')
+            return
+        msg_type = response.get('type')
+        if msg_type == 'format-ack':
+            if response.get('streams'):
+                self._multiplexing = True
+            if not stream.format_ack.done():
+                stream.format_ack.set_result(response)
+        elif msg_type == 'end-ack':
+            if not stream.ended.done():
+                stream.ended.set_result(None)
+        else:
+            stream.client.handle_response(response)
+
+    async def _wait_for_turn(self):
+        """Chờ kết nối và, nếu server chưa hỗ trợ nhiều stream, chờ stream đang chạy kết thúc."""
+        while True:
+            await self._connected.wait()
+            if self._failure is not None:
+                raise self._failure
+            if self._multiplexing or not self._streams:
+                return
+            async with self._streams_changed:
+                await self._streams_changed.wait()
+
+    async def _notify_streams_changed(self):
+        async with self._streams_changed:
+            self._streams_changed.notify_all()
+
+    def _open_stream(self, client) -> _Stream:
+        # A lone stream uses stream 0, the only one older servers understand; concurrent
+        # streams cycle through 1..MAX_STREAM_ID, skipping those still in use
+        if not self._streams:
+            stream_id = DEFAULT_STREAM_ID
+        else:
+            while True:
+                self._next_id = self._next_id % MAX_STREAM_ID + 1
+                if self._next_id not in self._streams:
+                    stream_id = self._next_id
+                    break
+        stream = _Stream(stream_id, client)
+        self._streams[stream.id] = stream
+        return stream
+
+    async def _stream_once(self, client, audio_path: str) -> dict:
+        await self._wait_for_turn()
+        websocket = self._websocket
+        stream = self._open_stream(client)
+        try:
+            data = client.iter_audio_chunks(audio_path)
+            await websocket.send(dumps(client.format_message(stream.id)))
+            ack = {}
+            if client.awaits_format_ack:
+                try:
+                    ack = await asyncio.wait_for(stream.format_ack, client.negotiation_timeout)
+                except asyncio.TimeoutError:
+                    ack = None
+                    logger.info(f"No format-ack for stream {stream.id}, falling back to JSON transport and PCM")
+            transport = client.accept_format_ack(ack)
+            if ack and ack.get('streams'):
+                # Let the streams waiting for stream 0 run alongside this one
+                await self._notify_streams_changed()
+
+            stats = await client.stream_audio(websocket, data, transport, stream.id)
+            # Older servers never answer 'end': waiting for them would only add end_timeout
+            if client.server_acks_end:
+                await websocket.send(END.render(stream_id=stream.id))
+                try:
+                    await asyncio.wait_for(stream.ended, self.end_timeout)
+                except asyncio.TimeoutError:
+                    self.metrics.incr('end_timeouts')
+                    logger.warning(f"No end-ack for stream {stream.id} ({audio_path})")
+            return stats
+        finally:
+            del self._streams[stream.id]
+            await self._notify_streams_changed()
+
+    async def stream_file(self, client, audio_path: str) -> dict:
+        """
+        Stream một file trên kết nối dùng chung và chờ kết quả cuối của nó.
+
+        Args:
+            client (AudioTranslationClient): Client tiền xử lý, stream và nhận
+                phản hồi của stream
+            audio_path (str): Đường dẫn tới file audio
+
+        Returns:
+            dict: Thống kê pacing của lần stream thành công (xem StreamPacer.stats())
+
+        Raises:
+            StreamClosed: Khi stream vẫn bị cắt sau max_retries lần chạy lại, hoặc
+                khi không kết nối lại được tới server
+        """
+        await self.start()
+        async with self._slots:
+            attempt = 0
+            while True:
+                try:
+                    stats = await self._stream_once(client, audio_path)
+                    self.metrics.incr('streams_completed')
+                    return stats
+                except (StreamClosed, websockets.exceptions.ConnectionClosed) as e:
+                    attempt += 1
+                    if attempt > self.max_retries or self._failure is not None:
+                        self.metrics.incr('streams_failed')
+                        raise StreamClosed(f"Streaming {audio_path} failed after {attempt} attempts") from e
+                    self.metrics.incr('stream_retries')
+                    logger.warning(f"Stream of {audio_path} interrupted, retrying ({attempt}/{self.max_retries})")
+
+    async def stream_files(self, audio_paths, client_factory) -> list:
+        """
+        Stream nhiều file trên kết nối dùng chung, tối đa max_streams file cùng lúc.
+
+        Args:
+            audio_paths (list): Các file audio
+            client_factory (callable): Tạo AudioTranslationClient cho mỗi file
+
+        Returns:
+            list: Thống kê của từng file theo thứ tự, hoặc exception nếu file đó lỗi
+        """
+        return await asyncio.gather(*(self.stream_file(client_factory(), path) for path in audio_paths),
+                                    return_exceptions=True)
@@ -0,0 +1,252 @@
+"""
+Ack-based Flow Control
+
+Module này giới hạn lượng audio client đã gửi mà server chưa xác nhận (ack)
+bằng một cửa sổ trượt, để sender không đẩy audio vào buffer của kết nối và
+hàng đợi của server nhanh hơn server xử lý (buffer bloat):
+- Cửa sổ tính theo số chunk chưa được ack, tùy chọn giới hạn thêm theo bytes;
+  khi cửa sổ đầy sender chờ ack (stall) trước khi gửi chunk kế tiếp
+- RTT gửi → ack được đo cho từng chunk; RTT nhỏ nhất của stream xấp xỉ độ trễ
+  mạng, phần vượt quá là thời gian chunk nằm chờ trong các hàng đợi
+- Cửa sổ thích ứng theo độ trễ hàng đợi: tăng nhanh lúc đầu (slow start) rồi
+  thêm một chunk mỗi RTT khi RTT gần mức nhỏ nhất, nhân với DECREASE_FACTOR
+  khi độ trễ hàng đợi vượt queue_delay_ms (tối đa một lần mỗi RTT). Tốc độ
+  gửi vì vậy xấp xỉ window / RTT
+- Ack được coi là tích lũy: ack của seq N xác nhận mọi chunk gửi trước đó;
+  ack không có seq (server cũ) xác nhận chunk cũ nhất. Khi server gộp ack
+  (set_ack_policy), cửa sổ không nhỏ hơn số chunk mỗi ack và thời gian server
+  giữ ack không bị tính là độ trễ hàng đợi
+- Không có ack nào trong stall_timeout giây (server không ack) thì sender gửi
+  tiếp với cửa sổ nhỏ nhất thay vì chờ mãi
+
+Cửa sổ, RTT và thời gian stall được ghi vào MetricsRegistry của client
+(gauge flow_window, flow_in_flight, flow_srtt_ms, flow_min_rtt_ms; histogram
+rtt và flow_stall; counter flow_stalls, flow_window_decreases, flow_timeouts).
+
+Cách sử dụng:
+    flow = FlowController(max_window=32, metrics=registry)
+    for seq, chunk in enumerate(chunks):
+        await flow.acquire(len(chunk))
+        flow.on_send(seq, len(chunk))
+        await websocket.send(...)
+    # Trong task nhận tin nhắn:
+    flow.on_ack(response.get('seq'))
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_WINDOW = 32
+DEFAULT_MIN_WINDOW = 2
+DEFAULT_INITIAL_WINDOW = 4
+DEFAULT_QUEUE_DELAY_MS = 100.0
+DEFAULT_STALL_TIMEOUT = 5.0
+
+# Window multiplier when the queuing delay exceeds its target
+DECREASE_FACTOR = 0.7
+# Weight of a new sample in the smoothed RTT (as in TCP, RFC 6298)
+RTT_ALPHA = 0.125
+
+
+class FlowController:
+    """Cửa sổ trượt các chunk chưa được ack của một stream, thích ứng theo RTT."""
+
+    def __init__(self,
+                 max_window=DEFAULT_MAX_WINDOW,
+                 min_window=DEFAULT_MIN_WINDOW,
+                 initial_window=DEFAULT_INITIAL_WINDOW,
+                 max_bytes=None,
+                 queue_delay_ms=DEFAULT_QUEUE_DELAY_MS,
+                 stall_timeout=DEFAULT_STALL_TIMEOUT,
+                 metrics=None,
+                 clock=time.monotonic):
+        """
+        min_window và initial_window được kẹp vào [1, max_window].
+
+        Args:
+            max_window (int): Số chunk chưa ack tối đa
+            min_window (int): Cửa sổ không giảm dưới số chunk này
+            initial_window (int): Cửa sổ khi bắt đầu stream
+            max_bytes (int): Số bytes chưa ack tối đa, None để chỉ giới hạn theo chunk
+            queue_delay_ms (float): Độ trễ hàng đợi (RTT - RTT nhỏ nhất) cho phép
+                trước khi thu hẹp cửa sổ
+            stall_timeout (float): Thời gian chờ ack tối đa khi cửa sổ đầy (giây)
+            metrics (MetricsRegistry): Nơi ghi số liệu, None để không ghi
+            clock (callable): Đồng hồ monotonic trả về giây
+
+        Raises:
+            ValueError: Khi max_window < 1
+        """
+        if max_window < 1:
+            raise ValueError(f"Flow control window must be at least 1 chunk, got {max_window}")
+        self.max_window = max_window
+        self.min_window = min(max(min_window, 1), max_window)
+        self.initial_window = min(max(initial_window, self.min_window), max_window)
+        self.max_bytes = max_bytes
+        self.queue_delay = queue_delay_ms / 1000
+        self.stall_timeout = stall_timeout
+        self.metrics = metrics
+        self._clock = clock
+        self.set_ack_policy()
+        self.reset()
+
+    def reset(self):
+        """Bắt đầu stream mới: xóa các chunk đang chờ ack, RTT và cửa sổ."""
+        self.window = float(self.initial_window)
+        # seq -> (send time, bytes), in send order
+        self._in_flight = OrderedDict()
+        self.in_flight_bytes = 0
+        self.srtt = None
+        self.min_rtt = None
+        self._slow_start = True
+        self._last_decrease = None
+        self._acked = asyncio.Event()
+        self.stalls = 0
+        self.stall_time = 0.0
+        self.timeouts = 0
+        self._publish()
+
+    def set_ack_policy(self, ack_every: int = 1, ack_interval_ms: float = 0):
+        """
+        Khai báo cách server ack (xem protocol.ack_policy).
+
+        Args:
+            ack_every (int): Số chunk mỗi ack tích lũy
+            ack_interval_ms (float): Thời gian tối đa server giữ một ack
+        """
+        self.ack_every = ack_every
+        self.ack_delay = ack_interval_ms / 1000
+
+    @property
+    def in_flight(self) -> int:
+        """Số chunk đã gửi chưa được ack."""
+        return len(self._in_flight)
+
+    def has_room(self, nbytes: int = 0) -> bool:
+        """Cửa sổ còn chỗ cho một chunk nbytes bytes hay không (luôn có khi không còn chunk chờ ack)."""
+        if not self._in_flight:
+            return True
+        # Below ack_every chunks in flight the server has no reason to ack yet
+        if len(self._in_flight) >= max(int(self.window), min(self.ack_every, self.max_window)):
+            return False
+        return self.max_bytes is None or self.in_flight_bytes + nbytes <= self.max_bytes
+
+    async def acquire(self, nbytes: int = 0) -> float:
+        """
+        Chờ tới khi cửa sổ còn chỗ cho chunk kế tiếp.
+
+        Args:
+            nbytes (int): Kích thước chunk sắp gửi
+
+        Returns:
+            float: Thời gian đã chờ (giây), 0 nếu gửi được ngay
+        """
+        if self.has_room(nbytes):
+            return 0.0
+        start = self._clock()
+        deadline = start + self.stall_timeout
+        while not self.has_room(nbytes):
+            remaining = deadline - self._clock()
+            if remaining <= 0:
+                # Acks are not coming (or are lost): stop waiting for them
+                self.timeouts += 1
+                self._incr('flow_timeouts')
+                self._in_flight.clear()
+                self.in_flight_bytes = 0
+                self.window = float(self.min_window)
+                self._slow_start = False
+                break
+            self._acked.clear()
+            try:
+                await asyncio.wait_for(self._acked.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        waited = self._clock() - start
+        self.stalls += 1
+        self.stall_time += waited
+        if self.metrics is not None:
+            self.metrics.incr('flow_stalls')
+            self.metrics.observe('flow_stall', waited * 1e6)
+        self._publish()
+        return waited
+
+    def on_send(self, seq: int, nbytes: int):
+        """Ghi nhận chunk seq (nbytes bytes) vừa được gửi."""
+        self._in_flight[seq] = (self._clock(), nbytes)
+        self.in_flight_bytes += nbytes
+
+    def on_ack(self, seq: int = None):
+        """
+        Ghi nhận một ack tích lũy và điều chỉnh cửa sổ theo RTT.
+
+        Args:
+            seq (int): Chunk được ack (mọi chunk gửi trước nó cũng được coi là
+                đã ack); None để ack chunk cũ nhất
+        """
+        if not self._in_flight:
+            return
+        if seq is None:
+            seq = next(iter(self._in_flight))
+        now = self._clock()
+        sample = None
+        acked = 0
+        while self._in_flight and next(iter(self._in_flight)) <= seq:
+            first, (sent, nbytes) = self._in_flight.popitem(last=False)
+            self.in_flight_bytes -= nbytes
+            acked += 1
+            if first == seq:
+                sample = now - sent
+        if sample is not None:
+            self._on_rtt(sample, acked, now)
+        if acked:
+            self._acked.set()
+            self._publish()
+
+    def _on_rtt(self, sample: float, acked: int, now: float):
+        self.min_rtt = sample if self.min_rtt is None else min(self.min_rtt, sample)
+        self.srtt = sample if self.srtt is None else self.srtt + RTT_ALPHA * (sample - self.srtt)
+        if self.metrics is not None:
+            self.metrics.observe('rtt', sample * 1e6)
+
+        if sample - self.min_rtt > self.queue_delay + self.ack_delay:
+            # Chunks are queuing somewhere: back off, once per round trip
+            if self._last_decrease is None or now - self._last_decrease >= self.srtt:
+                self.window = max(float(self.min_window), self.window * DECREASE_FACTOR)
+                self._slow_start = False
+                self._last_decrease = now
+                self._incr('flow_window_decreases')
+        elif self._slow_start:
+            self.window = min(float(self.max_window), self.window + acked)
+        else:
+            self.window = min(float(self.max_window), self.window + acked / self.window)
+
+    def _incr(self, name: str):
+        if self.metrics is not None:
+            self.metrics.incr(name)
+
+    def _publish(self):
+        if self.metrics is None:
+            return
+        self.metrics.gauge('flow_window', int(self.window))
+        self.metrics.gauge('flow_in_flight', len(self._in_flight))
+        if self.srtt is not None:
+            self.metrics.gauge('flow_srtt_ms', round(self.srtt * 1000, 3))
+            self.metrics.gauge('flow_min_rtt_ms', round(self.min_rtt * 1000, 3))
+
+    def stats(self) -> dict:
+        """
+        Trạng thái và thống kê của stream hiện tại.
+
+        Returns:
+            dict: window, in_flight, srtt_ms, min_rtt_ms, stalls, stall_seconds, timeouts
+        """
+        return {
+            'window': int(self.window),
+            'in_flight': len(self._in_flight),
+            'srtt_ms': self.srtt * 1000 if self.srtt is not None else None,
+            'min_rtt_ms': self.min_rtt * 1000 if self.min_rtt is not None else None,
+            'stalls': self.stalls,
+            'stall_seconds': self.stall_time,
+            'timeouts': self.timeouts,
+        }
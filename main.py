@@ -3,34 +3,106 @@ Streaming Audio Translation Client
 
 Module này triển khai một client WebSocket để stream audio và xử lý dịch theo thời gian thực.
 Nó có khả năng:
-- Tiền xử lý file audio (chuyển đổi stereo sang mono, resampling)
-- Stream audio theo chunks tới server thông qua WebSocket
+- Tiền xử lý file audio theo kiểu streaming (chuyển đổi stereo sang mono,
+  resampling, cắt khoảng lặng đầu/cuối theo năng lượng) với bộ nhớ giới hạn,
+  xem audio_pipeline.py
+- Tùy chọn cache kết quả tiền xử lý trên đĩa (xem pcm_cache.py) để các lần
+  chạy sau stream ngay từ file PCM đã memory-map
+- Stream audio theo chunks tới server thông qua WebSocket (binary frame
+  hoặc JSON + base64 cho server cũ, xem protocol.py)
 - Xử lý phản hồi từ server theo thời gian thực
+- Đo độ trễ chunk gửi → ack → broadcast bản dịch (xem metrics.py)
+- Đếm chunk/ack/broadcast trong bộ nhớ và xuất định kỳ; log từng tin nhắn chỉ
+  được ghi theo mẫu
+- Stream nhiều file nối tiếp hoặc xen kẽ trên một kết nối dùng chung, tự kết
+  nối lại khi mất kết nối (xem connection.py)
+- Tùy chọn xin server gộp ack (một ack tích lũy cho mỗi K chunk / T ms, xem
+  protocol.py) để giảm số tin nhắn trên kết nối
+- Giới hạn số chunk đã gửi mà server chưa ack bằng cửa sổ trượt thích ứng
+  theo RTT của ack (xem flow_control.py), tránh đẩy audio vào hàng đợi khi
+  server xử lý không kịp
+- Tùy chọn nén audio uplink (µ-law hoặc IMA-ADPCM, xem codec.py) cho đường
+  truyền di động băng thông thấp; server chọn encoding trong format-ack
+
+Chế độ nhanh (fast_mode / --fast) chỉ nhận file đã chuẩn hóa PCM16 mono 16kHz
+và stream trực tiếp từ vùng memory-map, không import scipy.
 
 Cách sử dụng:
     client = AudioTranslationClient()
     await client.process_audio_file("path/to/audio.wav")
+    python main.py path/to/audio_16k.wav --fast --speed 0
+    python main.py path/to/audio.wav --cache-dir ~/.cache/audio-pcm
+    python main.py path/to/audio.wav --trim-db -45 --max-pause-ms 600
+    python main.py clips/*.wav --concurrency 8 --speed 0
+    python main.py path/to/audio.wav --codec IMA-ADPCM
+    python main.py clips/*.wav --speed 0 --window 16
+    python main.py clips/*.wav --speed 0 --ack-every 8 --ack-interval-ms 100
 """
 
+import argparse
 import asyncio
 import websockets
 import json
 import base64
 import numpy as np
-import librosa
-from scipy.io import wavfile
 import logging
+import time
+
+from audio_pipeline import (DEFAULT_TRIM_HANGOVER_MS, DEFAULT_TRIM_THRESHOLD_DB,
+                            SilenceTrimmer, iter_pcm16_chunks)
+from codec import ENCODING_PCM, SUPPORTED_ENCODINGS, create_encoder
+from connection import DEFAULT_END_TIMEOUT, END, PersistentConnection
+from flow_control import DEFAULT_MAX_WINDOW, FlowController
+from metrics import LatencyRecorder, MetricsRegistry, SampledLog, report_metrics
+from pacing import PACING_REALTIME, StreamPacer
+from pcm_cache import DEFAULT_CACHE_BYTES, PcmCache
+from protocol import (AUDIO_COMPRESSION, DEFAULT_STREAM_ID, TRANSPORT_BINARY, TRANSPORT_JSON, SUPPORTED_TRANSPORTS,
+                      encode_audio_frame, now_us, tag_stream)
+from serialization import DECODE_ERRORS, MessageTemplate, dumps, loads
 
 # Configure logging
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Streaming profiles: frame duration, max frames coalesced into one message when
+# the sender is behind schedule, and how much audio to stream between progress logs.
+# Measured overhead per frame: see benchmarks/bench_profiles.py
+STREAM_PROFILES = {
+    "low-latency": {"frame_ms": 20, "max_coalesce": 4, "log_interval_ms": 2000},
+    "default": {"frame_ms": 200, "max_coalesce": 1, "log_interval_ms": 2000},
+    "bulk": {"frame_ms": 4000, "max_coalesce": 1, "log_interval_ms": 20000},
+}
+
+# JSON transport audio message; base64 needs no escaping (see serialization.MessageTemplate)
+AUDIO_MESSAGE = MessageTemplate('audio', ('data', 'seq', 'timestamp'), strings=('data',))
+
+# Silence trimming applied by default: anything under -50 dBFS is dead air,
+# keeping 200ms around speech; internal pauses are left alone
+TRIM_DEFAULTS = {
+    'threshold_db': DEFAULT_TRIM_THRESHOLD_DB,
+    'hangover_ms': DEFAULT_TRIM_HANGOVER_MS,
+    'max_pause_ms': None,
+}
+
 class AudioTranslationClient:
     def __init__(self, 
                  websocket_endpoint="ws://localhost:8765",  # Local test server
                  from_lang="vi",
-                 to_langs=None):
+                 to_langs=None,
+                 binary_transport=True,
+                 negotiation_timeout=2.0,
+                 speed=PACING_REALTIME,
+                 profile="default",
+                 frame_ms=None,
+                 metrics_interval=10.0,
+                 fast_mode=False,
+                 cache=None,
+                 trim_silence=None,
+                 codec=ENCODING_PCM,
+                 flow_control=None,
+                 ack_every=1,
+                 ack_interval_ms=None):
         """
         Initialize the audio translation client.
         
@@ -38,127 +110,402 @@ class AudioTranslationClient:
             websocket_endpoint (str): WebSocket server endpoint
             from_lang (str): Source language code (e.g., 'vi' for Vietnamese)
             to_langs (list): List of target language codes (e.g., ['en', 'ja'])
+            binary_transport (bool): Offer binary audio frames during the format handshake
+            negotiation_timeout (float): Seconds to wait for a format-ack before
+                falling back to the JSON protocol
+            speed (float): Streaming speed relative to real time (1.0 = real time,
+                N = N× faster, 0 = as fast as the connection accepts)
+            profile (str): Streaming profile name from STREAM_PROFILES
+            frame_ms (int): Override the profile's frame duration in milliseconds;
+                must hold at least one sample at the target sample rate
+            metrics_interval (float): Seconds between metrics reports while
+                process_audio_file() runs, None to only report at the end
+            fast_mode (bool): Only accept input that is already PCM16 mono at the
+                target sample rate; it is memory-mapped and never resampled
+            cache (PcmCache): On-disk cache of preprocessed PCM, None to always
+                preprocess from the source file
+            trim_silence (dict): SilenceTrimmer options (threshold_db, hangover_ms,
+                max_pause_ms, ...) overriding TRIM_DEFAULTS; False to only strip
+                leading digital zeros
+            codec (str): Uplink encoding to offer (see codec.py); chunks are sent as
+                PCM unless the server accepts it in its format-ack
+            flow_control (dict): FlowController options (max_window, max_bytes,
+                queue_delay_ms, ...) bounding unacknowledged chunks; False to send
+                without waiting for acks
+            ack_every (int): Ask the server for one cumulative ack per this many chunks
+            ack_interval_ms (int): Ask the server to hold a cumulative ack at most this
+                long (see protocol.py); None for the server default
         """
+        if profile not in STREAM_PROFILES:
+            raise ValueError(f"Unknown streaming profile: {profile}")
+        if codec not in SUPPORTED_ENCODINGS:
+            raise ValueError(f"Unknown codec: {codec}")
         self.websocket_endpoint = websocket_endpoint
         self.from_lang = from_lang
         self.to_langs = to_langs or ["en", "ja"]
-        self.buffer_size = 6400  # 6400 bytes = 3200 samples (PCM16)
         self.target_sample_rate = 16000
+        self.profile = dict(STREAM_PROFILES[profile])
+        if frame_ms is not None:
+            if self.target_sample_rate * frame_ms // 1000 < 1:
+                raise ValueError(f"Frame duration must hold at least one sample at "
+                                 f"{self.target_sample_rate}Hz, got {frame_ms}ms")
+            self.profile["frame_ms"] = frame_ms
+        self.frame_ms = self.profile["frame_ms"]
+        # PCM16: 2 bytes per sample, e.g. 200ms -> 6400 bytes = 3200 samples
+        self.buffer_size = self.target_sample_rate * self.frame_ms // 1000 * 2
+        self.latency = LatencyRecorder()
+        self.metrics = MetricsRegistry()
+        self.metrics_interval = metrics_interval
+        # Per-message events are logged at most once per progress interval
+        self.sampled_log = SampledLog(logger.info, self.profile["log_interval_ms"] / 1000)
+        self.binary_transport = binary_transport
+        self.negotiation_timeout = negotiation_timeout
+        self.speed = speed
+        self.fast_mode = fast_mode
+        self.cache = cache
+        self.trim_silence = None if trim_silence is False else {**TRIM_DEFAULTS, **(trim_silence or {})}
+        self.codec = codec
+        # Encoding accepted by the server, PCM until a format-ack says otherwise
+        self.encoding = ENCODING_PCM
+        # Whether the server answers 'end' with end-ack, and whether it never
+        # answered the format at all (see accept_format_ack)
+        self.server_acks_end = True
+        self.legacy_protocol = False
+        self.flow = (None if flow_control is False
+                     else FlowController(metrics=self.metrics, **(flow_control or {})))
+        self.ack_every = ack_every
+        self.ack_interval_ms = ack_interval_ms
 
-    def preprocess_audio(self, audio_path: str) -> np.ndarray:
+    def iter_audio_chunks(self, audio_path: str):
         """
-        Tiền xử lý file audio để chuẩn bị cho việc streaming.
+        Tiền xử lý file audio theo từng block và sinh ra các chunk sẵn sàng để gửi.
+        
+        Quy trình xử lý (thực hiện tăng dần, không đọc toàn bộ file):
+        1. Đọc file audio theo block và chuyển sang float32
+        2. Chuyển đổi stereo thành mono
+        3. Resampling polyphase có trạng thái về tần số mẫu mục tiêu (16kHz)
+        4. Cắt khoảng lặng ở đầu/cuối file (và rút ngắn các khoảng dừng dài
+           nếu có max_pause_ms) theo năng lượng, xem SilenceTrimmer
+        5. Gom thành các chunk PCM16 có buffer_size bytes
         
-        Quy trình xử lý bao gồm:
-        1. Đọc file audio và chuyển đổi sang định dạng PCM16
-        2. Chuyển đổi stereo thành mono nếu cần
-        3. Resampling về tần số mẫu mục tiêu (16kHz)
-        4. Loại bỏ khoảng lặng ở đầu file
+        File đã là PCM16 mono 16kHz được memory-map và các chunk là memoryview
+        trỏ thẳng vào file, không qua bước sao chép trung gian nào. Khi có
+        cache, kết quả đã tiền xử lý trước đó được memory-map từ cache; lần
+        đầu kết quả được ghi vào cache trong lúc stream.
         
         Args:
             audio_path (str): Đường dẫn tới file audio cần xử lý
             
         Returns:
-            np.ndarray: Mảng numpy chứa dữ liệu audio đã xử lý
+            generator: Sinh ra các chunk int16 (np.ndarray hoặc memoryview),
+                mỗi chunk buffer_size // 2 mẫu
         """
         try:
+            chunk_samples = self.buffer_size // 2
+            trimmer = (SilenceTrimmer(self.target_sample_rate, **self.trim_silence)
+                       if self.trim_silence is not None else None)
+            if self.cache is not None and not self.fast_mode:
+                key = self.cache.key(audio_path, {'sample_rate': self.target_sample_rate,
+                                                  'trim_silence': self.trim_silence})
+                samples = self.cache.get(key)
+                if samples is not None:
+                    logger.info(f"Using cached PCM for {audio_path}")
+                    return (samples[i:i + chunk_samples] for i in range(0, len(samples), chunk_samples))
+                logger.info(f"Processing audio file: {audio_path} (caching result)")
+                return self.cache.store(key, iter_pcm16_chunks(
+                    audio_path, self.target_sample_rate, chunk_samples, trimmer=trimmer))
             logger.info(f"Processing audio file: {audio_path}")
-            rate, data = wavfile.read(audio_path)
-            
-            # Convert to PCM16 format if necessary
-            if data.dtype != np.int16:
-                data = (data * 32767).astype(np.int16)
-
-            # Convert stereo to mono
-            if len(data.shape) > 1 and data.shape[1] == 2:
-                logger.info("Converting stereo to mono")
-                data = data.mean(axis=1).astype(np.int16)
-
-            # Resample if necessary
-            if rate != self.target_sample_rate:
-                logger.info(f"Resampling audio from {rate}Hz to {self.target_sample_rate}Hz")
-                data = librosa.resample(data.astype(np.float32), 
-                                     orig_sr=rate, 
-                                     target_sr=self.target_sample_rate)
-                data = (data * 32767).astype(np.int16)
-
-            # Remove leading silence
-            nonzero_indices = np.where(data != 0)[0]
-            if len(nonzero_indices) > 0:
-                data = data[nonzero_indices[0]:]
-                logger.info("Removed leading silence")
-
-            return data
-            
+            return iter_pcm16_chunks(audio_path, self.target_sample_rate, chunk_samples,
+                                     require_mapped=self.fast_mode, trimmer=trimmer)
         except Exception as e:
             logger.error(f"Error preprocessing audio: {str(e)}")
             raise
 
-    async def stream_audio(self, websocket, data: np.ndarray):
+    def preprocess_audio(self, audio_path: str) -> np.ndarray:
+        """
+        Tiền xử lý toàn bộ file audio để chuẩn bị cho việc streaming.
+        
+        Ghép các chunk từ iter_audio_chunks() thành một mảng duy nhất. Chỉ nên
+        dùng khi cần toàn bộ dữ liệu trong bộ nhớ; process_audio_file() stream
+        trực tiếp từ generator.
+        
+        Args:
+            audio_path (str): Đường dẫn tới file audio cần xử lý
+            
+        Returns:
+            np.ndarray: Mảng numpy chứa dữ liệu audio đã xử lý
+        """
+        chunks = list(self.iter_audio_chunks(audio_path))
+        if not chunks:
+            return np.zeros(0, dtype=np.int16)
+        return np.concatenate(chunks)
+
+    def _iter_chunks(self, data):
+        """Chia mảng audio thành các chunk buffer_size bytes; iterable được trả về nguyên vẹn."""
+        if isinstance(data, np.ndarray):
+            step = self.buffer_size // 2
+            return (data[i:i + step] for i in range(0, len(data), step))
+        return data
+
+    def format_message(self, stream_id: int = DEFAULT_STREAM_ID) -> dict:
+        """
+        Tin nhắn format mô tả audio mà client sẽ gửi.
+
+        Args:
+            stream_id (int): Stream trên kết nối, streamId chỉ được gửi khác 0
+
+        Returns:
+            dict: Tin nhắn format
+        """
+        format_info = {
+            "type": "format",
+            "sampleRate": self.target_sample_rate,
+            "bitsPerSample": 16,
+            "channels": 1,
+            "encoding": ENCODING_PCM,
+            "frameDurationMs": self.frame_ms,
+            "fromLang": self.from_lang,
+            "toLangs": self.to_langs
+        }
+        if self.binary_transport:
+            format_info["transports"] = list(SUPPORTED_TRANSPORTS)
+        if self.codec != ENCODING_PCM:
+            format_info["encodings"] = [self.codec, ENCODING_PCM]
+        if self.ack_every > 1:
+            format_info["ackEvery"] = self.ack_every
+        if self.ack_interval_ms:
+            format_info["ackIntervalMs"] = self.ack_interval_ms
+        return tag_stream(format_info, stream_id)
+
+    @property
+    def awaits_format_ack(self) -> bool:
+        """Tin nhắn format có đề xuất gì cần server trả lời qua format-ack hay không."""
+        return (self.binary_transport or self.codec != ENCODING_PCM
+                or self.ack_every > 1 or bool(self.ack_interval_ms))
+
+    def accept_format_ack(self, response: dict) -> str:
+        """
+        Áp dụng format-ack của server: encoding (self.encoding), chính sách ack
+        và việc server có trả lời `end` bằng end-ack không (self.server_acks_end).
+        Server cũ không trả lời format (self.legacy_protocol) không ack theo
+        stream, nên flow control được tắt như với flow_control=False.
+
+        Args:
+            response (dict): Tin nhắn format-ack; {} nếu client không chờ
+                format-ack, None nếu đã chờ mà server không trả lời (server cũ:
+                JSON, PCM, ack từng chunk, không có end-ack)
+
+        Returns:
+            str: Transport được sử dụng
+        """
+        self.legacy_protocol = response is None
+        if response is None:
+            self.server_acks_end = False
+            response = {}
+        else:
+            # Servers predating end/end-ack answer without 'streams'; with no
+            # format-ack asked for, assume a current server
+            self.server_acks_end = not response or bool(response.get('streams'))
+        self.encoding = response.get('encoding', ENCODING_PCM)
+        if self.flow is not None:
+            self.flow.set_ack_policy(response.get('ackEvery', 1), response.get('ackIntervalMs', 0))
+        return response.get('transport', TRANSPORT_JSON)
+
+    async def negotiate_format(self, websocket) -> str:
+        """
+        Gửi thông tin format audio và thương lượng transport, encoding với server.
+        
+        Tin nhắn format luôn là JSON. Nếu client bật binary_transport, đề xuất
+        codec nén hoặc xin ack tích lũy, các đề xuất được gửi kèm và client chờ
+        `format-ack` trong negotiation_timeout giây. Server cũ không trả lời,
+        khi đó client dùng giao thức JSON + base64, PCM và ack từng chunk (xem
+        accept_format_ack).
+        
+        Args:
+            websocket: Kết nối WebSocket đang hoạt động
+            
+        Returns:
+            str: Transport được sử dụng (TRANSPORT_BINARY hoặc TRANSPORT_JSON)
+        """
+        await websocket.send(dumps(self.format_message()))
+        logger.info("Sent audio format information")
+
+        if not self.awaits_format_ack:
+            return self.accept_format_ack({})
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.negotiation_timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                message = await asyncio.wait_for(websocket.recv(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            try:
+                response = loads(message)
+            except (*DECODE_ERRORS, TypeError):
+                logger.warning(f"Received invalid JSON: {message}")
+                continue
+            if response.get('type') == 'format-ack':
+                transport = self.accept_format_ack(response)
+                logger.info(f"Server accepted transport: {transport}, encoding: {self.encoding}")
+                return transport
+            logger.info(f"Received: {message}")
+
+        logger.info("No format-ack from server, falling back to JSON transport and PCM")
+        return self.accept_format_ack(None)
+
+    async def stream_audio(self, websocket, data, transport: str = TRANSPORT_JSON,
+                           stream_id: int = DEFAULT_STREAM_ID, encoding: str = None):
         """
         Stream dữ liệu audio qua kết nối WebSocket.
         
-        Đầu tiên gửi thông tin về format audio (sample rate, bits per sample, etc.).
-        Sau đó chia audio thành các chunks nhỏ và gửi tuần tự với độ trễ
-        để đảm bảo server có thể xử lý kịp thời.
+        Thông tin format phải được gửi trước qua negotiate_format().
+        Audio được chia thành các chunks nhỏ và gửi tuần tự theo trục thời gian
+        của audio (StreamPacer, tốc độ self.speed). Khi sender bị chậm so với
+        lịch, tối đa max_coalesce chunk đã tới hạn được gộp vào một tin nhắn.
+        Khi bật flow control, mỗi tin nhắn chỉ được gửi khi cửa sổ các tin nhắn
+        chưa được ack còn chỗ (xem FlowController).
+        Mỗi tin nhắn được mã hóa thành một frame của encoding đã thương lượng
+        (xem codec.py), nên kích thước frame bám theo frame_ms của profile. Ở
+        chế độ binary mỗi tin nhắn là một binary frame (header + audio), ngược
+        lại là JSON + base64.
         
         Args:
             websocket: Kết nối WebSocket đang hoạt động
-            data (np.ndarray): Dữ liệu audio đã được tiền xử lý
+            data: Dữ liệu audio đã được tiền xử lý (np.ndarray) hoặc iterable các
+                chunk PCM16, ví dụ generator từ iter_audio_chunks()
+            transport (str): Transport đã thương lượng với server
+            stream_id (int): Stream của các chunk trên kết nối (xem protocol.py)
+            encoding (str): Encoding đã thương lượng, mặc định self.encoding
+            
+        Returns:
+            dict: Thống kê pacing (xem StreamPacer.stats()), kèm 'messages' (số
+                tin nhắn audio đã gửi, mỗi tin nhắn được ack một lần) và 'flow'
+                (FlowController.stats()) khi bật flow control
         """
         try:
-            # Send audio format information
-            format_info = {
-                "type": "format",
-                "sampleRate": self.target_sample_rate,
-                "bitsPerSample": 16,
-                "channels": 1,
-                "encoding": "PCM"
-            }
-            await websocket.send(json.dumps(format_info))
-            logger.info("Sent audio format information")
+            binary = transport == TRANSPORT_BINARY
+            pacer = StreamPacer(self.speed)
+            # Legacy servers don't ack per stream: waiting on their acks only stalls
+            flow = None if self.legacy_protocol else self.flow
+            if flow is not None:
+                flow.reset()
+            encoder = create_encoder(encoding or self.encoding)
+            compressed = encoder.encoding != ENCODING_PCM
+
+            max_coalesce = self.profile["max_coalesce"]
+            log_every = max(1, self.profile["log_interval_ms"] // self.frame_ms)
 
             # Stream audio chunks
             chunks_sent = 0
-            for i in range(0, len(data), self.buffer_size // 2):
-                chunk = data[i:i + self.buffer_size // 2]
-                audio_data = {
-                    "type": "audio",
-                    "data": base64.b64encode(chunk.tobytes()).decode('utf-8')
-                }
-                await websocket.send(json.dumps(audio_data))
+            chunks = iter(self._iter_chunks(data))
+            for chunk in chunks:
+                await pacer.pace(len(chunk) / self.target_sample_rate)
+                batch = [chunk]
+                while len(batch) < max_coalesce and pacer.is_due():
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    await pacer.pace(len(chunk) / self.target_sample_rate)
+                    batch.append(chunk)
+                payload = batch[0] if len(batch) == 1 else b"".join(batch)
+                pcm_bytes = memoryview(payload).nbytes
+                if compressed:
+                    started = time.perf_counter()
+                    payload = encoder.encode(payload)
+                    self.metrics.observe('encode', (time.perf_counter() - started) * 1e6)
+
+                if flow is not None:
+                    nbytes = memoryview(payload).nbytes
+                    await flow.acquire(nbytes)
+                    flow.on_send(chunks_sent, nbytes)
+
+                sent_us = now_us()
+                self.latency.on_send(chunks_sent, sent_us)
+                if binary:
+                    await websocket.send(encode_audio_frame(payload, chunks_sent, sent_us,
+                                                            stream_id=stream_id))
+                else:
+                    await websocket.send(AUDIO_MESSAGE.render(base64.b64encode(payload).decode('ascii'),
+                                                              chunks_sent, sent_us, stream_id=stream_id))
                 chunks_sent += 1
-                if chunks_sent % 10 == 0:
+                self.metrics.incr('chunks_sent')
+                self.metrics.incr('audio_bytes_sent', memoryview(payload).nbytes)
+                self.metrics.incr('pcm_bytes_sent', pcm_bytes)
+                if chunks_sent % log_every == 0:
                     logger.info(f"Sent {chunks_sent} audio chunks")
-                await asyncio.sleep(0.2)  # Control streaming rate
 
-            logger.info(f"Finished sending {chunks_sent} audio chunks")
+            stats = pacer.stats()
+            stats['messages'] = chunks_sent
+            logger.info(f"Finished sending {chunks_sent} audio chunks "
+                        f"({stats['audio_seconds']:.1f}s audio in {stats['elapsed_seconds']:.1f}s, "
+                        f"drift mean {stats['mean_drift'] * 1000:.1f}ms / max {stats['max_drift'] * 1000:.1f}ms)")
+            if flow is not None:
+                stats['flow'] = flow.stats()
+                logger.info(f"Flow control: window {stats['flow']['window']}, "
+                            f"{stats['flow']['stalls']} stalls ({stats['flow']['stall_seconds']:.2f}s)")
+            return stats
 
         except Exception as e:
             logger.error(f"Error streaming audio: {str(e)}")
             raise
 
-    async def receive_messages(self, websocket):
+    def handle_message(self, message):
         """
-        Nhận và xử lý tin nhắn từ WebSocket server.
+        Xử lý một tin nhắn từ server và cập nhật số liệu độ trễ.
         
         Xử lý 2 loại tin nhắn chính:
-        - Tin nhắn xác nhận (ack): Server báo nhận được bao nhiêu bytes
-        - Các tin nhắn khác: Có thể là kết quả dịch hoặc thông báo lỗi
+        - Tin nhắn xác nhận (ack): Server báo nhận được bao nhiêu bytes,
+          được ghép với chunk đã gửi theo seq
+        - Các tin nhắn khác: Có thể là kết quả dịch (broadcast-*) hoặc thông báo lỗi
+        
+        Args:
+            message: Tin nhắn nhận được từ WebSocket
+            
+        Returns:
+            dict: Tin nhắn đã parse, hoặc None nếu không phải JSON hợp lệ
+        """
+        try:
+            response = loads(message)
+        except (*DECODE_ERRORS, TypeError):
+            self.metrics.incr('invalid_messages')
+            self.sampled_log('invalid', "Received invalid JSON: %s", message)
+            return None
+        return self.handle_response(response)
+
+    def handle_response(self, response: dict) -> dict:
+        """Cập nhật số liệu độ trễ / bộ đếm từ một tin nhắn đã parse (xem handle_message)."""
+        msg_type = response.get('type', '')
+        if msg_type == 'ack':
+            self.latency.on_ack(response.get('seq'))
+            if self.flow is not None and not self.legacy_protocol:
+                self.flow.on_ack(response.get('seq'))
+            self.metrics.incr('acks')
+            self.metrics.incr('chunks_acked', response.get('chunks', 1))
+            self.sampled_log('ack', "Server acknowledged %s bytes", response.get('bytes'))
+        else:
+            if msg_type.startswith('broadcast-') and 'translating' not in msg_type:
+                self.latency.on_broadcast(response)
+            self.metrics.incr(msg_type or 'unknown')
+            self.sampled_log(msg_type, "Received: %s", response)
+        return response
+
+    async def receive_messages(self, websocket):
+        """
+        Nhận và xử lý tin nhắn từ WebSocket server (xem handle_message) cho tới
+        khi server trả lời 'end-ack' hoặc đóng kết nối.
         
         Args:
             websocket: Kết nối WebSocket đang hoạt động
         """
         try:
             async for message in websocket:
-                try:
-                    response = json.loads(message)
-                    if response.get('type') == 'ack':
-                        logger.info(f"Server acknowledged {response.get('bytes')} bytes")
-                    else:
-                        logger.info(f"Received: {message}")
-                except json.JSONDecodeError:
-                    logger.warning(f"Received invalid JSON: {message}")
+                response = self.handle_message(message)
+                if response is not None and response.get('type') == 'end-ack':
+                    return
                 
         except websockets.exceptions.ConnectionClosed:
             logger.warning("WebSocket connection closed")
@@ -166,45 +513,127 @@ class AudioTranslationClient:
             logger.error(f"Error receiving messages: {str(e)}")
             raise
 
-    async def process_audio_file(self, audio_path: str):
+    async def process_audio_file(self, audio_path: str, connection=None):
         """
         Xử lý và stream một file audio.
         
         Quy trình hoạt động:
-        1. Tiền xử lý file audio thông qua preprocess_audio()
-        2. Thiết lập kết nối WebSocket với server
+        1. Mở file audio thông qua iter_audio_chunks() (dữ liệu được tiền xử lý
+           dần trong lúc stream)
+        2. Thiết lập kết nối WebSocket với server và thương lượng transport
         3. Tạo và chạy song song 2 tasks:
-           - Task gửi dữ liệu audio
-           - Task nhận phản hồi từ server
+           - Task gửi dữ liệu audio, sau đó gửi 'end'
+           - Task nhận phản hồi từ server cho tới 'end-ack' (kết quả cuối của
+             file), chờ tối đa DEFAULT_END_TIMEOUT giây sau khi gửi hết audio;
+             với server cũ không có end-ack thì đóng kết nối ngay
+        4. Xuất số liệu (MetricsRegistry) mỗi metrics_interval giây và khi kết thúc
+        
+        Khi có connection, bước 2-3 được thay bằng một stream trên kết nối dùng
+        chung đó (xem connection.py) và hàm trả về khi server gửi end-ack.
         
         Args:
             audio_path (str): Đường dẫn tới file audio cần xử lý
+            connection (PersistentConnection): Kết nối dùng chung, None để mở
+                kết nối riêng cho file này
         """
+        reporter = None
         try:
-            # Preprocess audio
-            data = self.preprocess_audio(audio_path)
+            if self.metrics_interval:
+                reporter = asyncio.create_task(
+                    report_metrics(self.metrics, self.metrics_interval, logger.info, "Client metrics"))
+            if connection is not None:
+                await connection.stream_file(self, audio_path)
+                return
+
+            # Open the streaming preprocessing pipeline
+            data = self.iter_audio_chunks(audio_path)
             
             # Connect to WebSocket and stream audio
             logger.info(f"Connecting to WebSocket server at {self.websocket_endpoint}")
-            async with websockets.connect(self.websocket_endpoint) as websocket:
-                # Create tasks for sending and receiving
-                send_task = asyncio.create_task(self.stream_audio(websocket, data))
+            async with websockets.connect(self.websocket_endpoint, compression=AUDIO_COMPRESSION) as websocket:
+                transport = await self.negotiate_format(websocket)
+
+                # Receive while sending; the server answers 'end' once its last results are out
                 receive_task = asyncio.create_task(self.receive_messages(websocket))
-                
-                # Wait for both tasks to complete
-                await asyncio.gather(send_task, receive_task)
+                try:
+                    await self.stream_audio(websocket, data, transport)
+                    if self.server_acks_end:
+                        await websocket.send(END.render())
+                        try:
+                            await asyncio.wait_for(asyncio.shield(receive_task), DEFAULT_END_TIMEOUT)
+                        except asyncio.TimeoutError:
+                            logger.warning(f"No end-ack for {audio_path} after {DEFAULT_END_TIMEOUT:.0f}s")
+                finally:
+                    receive_task.cancel()
                 
         except Exception as e:
             logger.error(f"Error processing audio file: {str(e)}")
             raise
+        finally:
+            if reporter:
+                reporter.cancel()
+            logger.info(f"Client metrics: {json.dumps(self.metrics.flush())}")
 
 async def main():
     """Main entry point for the audio streaming client"""
-    # Create client instance
-    client = AudioTranslationClient()
+    parser = argparse.ArgumentParser(description="Stream audio files to the translation server")
+    parser.add_argument('audio', nargs='*', default=["noise.wav"],
+                        help='WAV files to stream; several files share one persistent connection')
+    parser.add_argument('--endpoint', default="ws://localhost:8765")
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='Files streamed at once over the shared connection (1 = back to back)')
+    parser.add_argument('--speed', type=float, default=PACING_REALTIME, help='0 = unthrottled')
+    parser.add_argument('--profile', default="default", choices=sorted(STREAM_PROFILES))
+    parser.add_argument('--fast', action='store_true',
+                        help='Input is already PCM16 mono 16kHz: stream it memory-mapped, skip resampling')
+    parser.add_argument('--cache-dir', help='Cache preprocessed PCM in this directory')
+    parser.add_argument('--cache-mb', type=float, default=DEFAULT_CACHE_BYTES / 2**20,
+                        help='Maximum size of the PCM cache (MB)')
+    parser.add_argument('--trim-db', type=float, default=DEFAULT_TRIM_THRESHOLD_DB,
+                        help='Frames quieter than this (dBFS) count as silence')
+    parser.add_argument('--hangover-ms', type=int, default=DEFAULT_TRIM_HANGOVER_MS,
+                        help='Silence kept before the first and after the last speech')
+    parser.add_argument('--max-pause-ms', type=int,
+                        help='Shorten internal pauses longer than this (default: keep them)')
+    parser.add_argument('--no-trim', action='store_true',
+                        help='Only strip leading digital zeros instead of trimming silence')
+    parser.add_argument('--codec', default=ENCODING_PCM, choices=SUPPORTED_ENCODINGS,
+                        help='Compress uplink audio if the server supports it (see codec.py)')
+    parser.add_argument('--window', type=int, default=DEFAULT_MAX_WINDOW,
+                        help='Maximum unacknowledged messages per stream')
+    parser.add_argument('--no-flow-control', action='store_true',
+                        help='Send without waiting for acks')
+    parser.add_argument('--ack-every', type=int, default=1,
+                        help='Ask for one cumulative ack per this many chunks')
+    parser.add_argument('--ack-interval-ms', type=int,
+                        help='Longest the server may hold a cumulative ack')
+    args = parser.parse_args()
+
+    cache = PcmCache(args.cache_dir, int(args.cache_mb * 2**20)) if args.cache_dir else None
+
+    def create_client(**options):
+        return AudioTranslationClient(args.endpoint, speed=args.speed, profile=args.profile,
+                                      fast_mode=args.fast, cache=cache, codec=args.codec,
+                                      ack_every=args.ack_every, ack_interval_ms=args.ack_interval_ms,
+                                      flow_control=False if args.no_flow_control else {'max_window': args.window},
+                                      trim_silence=False if args.no_trim else {
+                                          'threshold_db': args.trim_db,
+                                          'hangover_ms': args.hangover_ms,
+                                          'max_pause_ms': args.max_pause_ms,
+                                      }, **options)
     
     try:
-        await client.process_audio_file("noise.wav")
+        if len(args.audio) == 1:
+            await create_client().process_audio_file(args.audio[0])
+            return
+        async with PersistentConnection(args.endpoint, max_streams=args.concurrency) as connection:
+            results = await connection.stream_files(
+                args.audio, lambda: create_client(metrics_interval=None))
+        for path, result in zip(args.audio, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to stream {path}: {result}")
+        logger.info(f"Streamed {sum(not isinstance(r, Exception) for r in results)}/{len(results)} files, "
+                    f"connection metrics: {json.dumps(connection.metrics.snapshot())}")
     except Exception as e:
         logger.error(f"Application error: {str(e)}")
         raise
@@ -0,0 +1,413 @@
+"""
+Latency Metrics
+
+Module này đo độ trễ end-to-end của luồng audio:
+- LatencyHistogram: histogram log-linear kiểu HDR (sai số tương đối < 1%),
+  gộp được giữa nhiều phiên / process, trả về p50/p95/p99
+- LatencyRecorder: ghi thời điểm gửi của từng chunk theo sequence number và
+  ghép các ack / broadcast trả về với chunk tương ứng
+- Xuất kết quả theo phiên và ngôn ngữ đích ra JSON hoặc CSV
+- MetricsRegistry / report_metrics: counter và histogram trong bộ nhớ cập nhật
+  trên hot path, được một task nền xuất định kỳ thay cho log từng tin nhắn
+- SampledLog: log theo mẫu (tối đa một dòng mỗi khoảng thời gian cho mỗi
+  key), chỉ format chuỗi khi dòng log thực sự được ghi
+
+Mọi giá trị được ghi nhận bằng micro giây và báo cáo bằng mili giây.
+
+Cách sử dụng:
+    recorder = LatencyRecorder()
+    recorder.on_send(seq, now_us())
+    ...
+    recorder.on_ack(response.get('seq'))
+    write_latency_json("latency.json", {"session-0": recorder.histograms})
+
+    metrics = MetricsRegistry()
+    metrics.incr('chunks_received')
+    task = asyncio.create_task(report_metrics(metrics, 10.0, logger.info))
+"""
+
+import asyncio
+import csv
+import json
+import time
+from collections import OrderedDict, deque
+
+from protocol import now_us
+
+# Language fields seen on translation broadcasts, in lookup order
+LANGUAGE_FIELDS = ('language', 'lang', 'to_lang', 'target_lang')
+
+
+class LatencyHistogram:
+    """
+    Histogram log-linear cho giá trị nguyên không âm (micro giây).
+
+    Giá trị nhỏ hơn 2^sub_bucket_bits được lưu chính xác; giá trị lớn hơn được
+    gom vào các bucket có độ rộng tương đối 2^-(sub_bucket_bits - 1).
+    """
+
+    def __init__(self, sub_bucket_bits: int = 8):
+        """
+        Args:
+            sub_bucket_bits (int): Số bit độ chính xác của mỗi bucket
+        """
+        self.sub_bucket_bits = sub_bucket_bits
+        self._half = 1 << (sub_bucket_bits - 1)
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value: int) -> int:
+        shift = value.bit_length() - self.sub_bucket_bits
+        if shift <= 0:
+            return value
+        return (1 << self.sub_bucket_bits) + (shift - 1) * self._half + ((value >> shift) - self._half)
+
+    def _upper(self, index: int) -> int:
+        """Giá trị lớn nhất thuộc bucket index."""
+        full = 1 << self.sub_bucket_bits
+        if index < full:
+            return index
+        shift = (index - full) // self._half + 1
+        mantissa = (index - full) % self._half + self._half
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, value_us: int):
+        """
+        Ghi nhận một giá trị độ trễ.
+
+        Args:
+            value_us (int): Độ trễ tính bằng micro giây (giá trị âm được coi là 0)
+        """
+        value = max(0, int(value_us))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "LatencyHistogram"):
+        """
+        Cộng dồn một histogram khác (cùng sub_bucket_bits) vào histogram này.
+
+        Raises:
+            ValueError: Khi hai histogram có độ chính xác khác nhau
+        """
+        if other.sub_bucket_bits != self.sub_bucket_bits:
+            raise ValueError("Cannot merge histograms with different precision")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def percentile(self, q: float) -> int:
+        """
+        Giá trị tại phân vị q (0-100), tính bằng micro giây.
+
+        Returns:
+            int: Cận trên của bucket chứa phân vị (không vượt quá max), 0 nếu rỗng
+        """
+        if not self.count:
+            return 0
+        rank = max(1, -(-self.count * q // 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._upper(index), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        """Tóm tắt histogram (mili giây): count, min, mean, p50, p95, p99, max."""
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'min_ms': self.min / 1000,
+            'mean_ms': self.total / self.count / 1000,
+            'p50_ms': self.percentile(50) / 1000,
+            'p95_ms': self.percentile(95) / 1000,
+            'p99_ms': self.percentile(99) / 1000,
+            'max_ms': self.max / 1000,
+        }
+
+
+def message_language(message: dict, default: str = None) -> str:
+    """Ngôn ngữ đích của một broadcast, hoặc default nếu tin nhắn không khai báo."""
+    for field in LANGUAGE_FIELDS:
+        if message.get(field):
+            return message[field]
+    return default
+
+
+class LatencyRecorder:
+    """
+    Ghép thời điểm gửi chunk với ack và broadcast của một phiên stream.
+
+    Các histogram được đặt tên theo loại sự kiện:
+    - 'ack': chunk được gửi → server ack
+    - 'broadcast:<lang>': chunk được gửi → broadcast bản dịch nhận được
+    """
+
+    def __init__(self, max_tracked: int = 100000):
+        """
+        Args:
+            max_tracked (int): Số chunk tối đa được giữ thời điểm gửi để ghép;
+                cũng là giới hạn số chunk chờ ack, chunk cũ hơn bị bỏ nếu peer
+                không bao giờ ack
+        """
+        self.max_tracked = max_tracked
+        self.histograms = {}
+        self._sent = OrderedDict()
+        self._unacked = deque(maxlen=max_tracked)
+        self.sent = 0
+        self.acked = 0
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        """Lấy (hoặc tạo) histogram theo tên."""
+        if name not in self.histograms:
+            self.histograms[name] = LatencyHistogram()
+        return self.histograms[name]
+
+    def on_send(self, seq: int, timestamp_us: int):
+        """Ghi nhận chunk seq được gửi tại timestamp_us."""
+        self._sent[seq] = timestamp_us
+        self._unacked.append(seq)
+        self.sent += 1
+        if len(self._sent) > self.max_tracked:
+            self._sent.popitem(last=False)
+
+    def on_ack(self, seq: int = None, received_us: int = None):
+        """
+        Ghép một ack với chunk tương ứng.
+
+        Ack được coi là tích lũy: mọi chunk có seq nhỏ hơn cũng được tính là
+        đã ack, nhưng độ trễ chỉ được ghi cho chunk seq.
+
+        Args:
+            seq (int): Sequence number trong ack; None với server cũ, khi đó ack
+                được ghép với chunk cũ nhất chưa được ack (ack đến theo thứ tự)
+            received_us (int): Thời điểm nhận ack, mặc định là hiện tại
+        """
+        received_us = now_us() if received_us is None else received_us
+        if seq is None:
+            if not self._unacked:
+                return
+            seq = self._unacked.popleft()
+            self.acked += 1
+        else:
+            acked = 0
+            while self._unacked and self._unacked[0] <= seq:
+                self._unacked.popleft()
+                acked += 1
+            self.acked += max(acked, 1)
+        sent_us = self._sent.get(seq)
+        if sent_us is not None:
+            self.histogram('ack').record(received_us - sent_us)
+
+    def on_broadcast(self, message: dict, received_us: int = None):
+        """
+        Ghép một broadcast bản dịch với chunk audio đã gửi.
+
+        Nếu broadcast mang `seq` (chunk cuối cùng của đoạn được dịch) thì dùng
+        chunk đó; ngược lại dùng chunk gửi gần nhất, tức độ trễ tính từ lúc
+        audio cuối cùng rời client (cận dưới của độ trễ speech-to-translation).
+
+        Args:
+            message (dict): Tin nhắn broadcast đã parse
+            received_us (int): Thời điểm nhận, mặc định là hiện tại
+        """
+        received_us = now_us() if received_us is None else received_us
+        seq = message.get('seq')
+        if seq is not None:
+            sent_us = self._sent.get(seq)
+        else:
+            sent_us = next(reversed(self._sent.values()), None)
+        if sent_us is None:
+            return
+        language = message_language(message, 'unknown')
+        self.histogram(f"broadcast:{language}").record(received_us - sent_us)
+
+    def summary(self) -> dict:
+        """Tóm tắt mọi histogram của phiên (xem LatencyHistogram.to_dict)."""
+        return {name: hist.to_dict() for name, hist in sorted(self.histograms.items())}
+
+
+class MetricsRegistry:
+    """
+    Counter, gauge và histogram trong bộ nhớ, đủ rẻ để cập nhật cho mỗi tin nhắn.
+
+    Counter tích lũy từ lúc tạo, gauge giữ giá trị được đặt gần nhất; flush()
+    trả về snapshot kèm tốc độ (mỗi giây) của các counter kể từ lần flush trước.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        """
+        Args:
+            clock (callable): Đồng hồ monotonic trả về giây
+        """
+        self._clock = clock
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._last_flush = clock()
+        self._last_counters = {}
+
+    def incr(self, name: str, value: int = 1):
+        """Cộng value vào counter name."""
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name: str, value):
+        """Đặt giá trị hiện tại của gauge name."""
+        self.gauges[name] = value
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        """Lấy (hoặc tạo) histogram theo tên."""
+        if name not in self.histograms:
+            self.histograms[name] = LatencyHistogram()
+        return self.histograms[name]
+
+    def observe(self, name: str, value_us: int):
+        """Ghi một giá trị (micro giây) vào histogram name."""
+        self.histogram(name).record(value_us)
+
+    def snapshot(self) -> dict:
+        """Counter, gauge và tóm tắt histogram hiện tại (xem LatencyHistogram.to_dict)."""
+        return {
+            'counters': dict(self.counters),
+            'gauges': dict(self.gauges),
+            'histograms': {name: hist.to_dict() for name, hist in sorted(self.histograms.items())},
+        }
+
+    def flush(self) -> dict:
+        """
+        Snapshot kèm tốc độ của counter từ lần flush trước.
+
+        Returns:
+            dict: snapshot() cùng 'interval_seconds' và 'rates' (giá trị mỗi giây)
+        """
+        now = self._clock()
+        interval = now - self._last_flush
+        snapshot = self.snapshot()
+        snapshot['interval_seconds'] = interval
+        snapshot['rates'] = {
+            name: (value - self._last_counters.get(name, 0)) / interval if interval > 0 else 0.0
+            for name, value in self.counters.items()
+        }
+        self._last_flush = now
+        self._last_counters = dict(self.counters)
+        return snapshot
+
+
+async def report_metrics(registry: MetricsRegistry, interval: float, emit, label: str = "Metrics"):
+    """
+    Task nền xuất registry.flush() mỗi interval giây cho tới khi bị hủy.
+
+    Args:
+        registry (MetricsRegistry): Nguồn số liệu
+        interval (float): Chu kỳ xuất (giây)
+        emit (callable): Nhận một dòng văn bản, ví dụ logger.info hoặc print
+        label (str): Tiền tố của dòng xuất
+    """
+    while True:
+        await asyncio.sleep(interval)
+        emit(f"{label}: {json.dumps(registry.flush())}")
+
+
+class SampledLog:
+    """
+    Log theo mẫu: mỗi key ghi tối đa một dòng mỗi interval giây.
+
+    Các lần gọi bị bỏ qua chỉ tăng một counter; chuỗi được format theo kiểu %
+    chỉ khi dòng được ghi, và dòng kế tiếp báo số lần đã bị bỏ qua.
+    """
+
+    def __init__(self, emit, interval: float = 1.0, clock=time.monotonic):
+        """
+        Args:
+            emit (callable): Nhận một dòng văn bản, ví dụ logger.info hoặc print
+            interval (float): Khoảng cách tối thiểu (giây) giữa hai dòng cùng key
+            clock (callable): Đồng hồ monotonic trả về giây
+        """
+        self.emit = emit
+        self.interval = interval
+        self._clock = clock
+        self._next = {}
+        self._suppressed = {}
+
+    def __call__(self, key: str, message: str, *args) -> bool:
+        """
+        Ghi message % args nếu key đã tới lượt, ngược lại bỏ qua.
+
+        Returns:
+            bool: Dòng có được ghi hay không
+        """
+        now = self._clock()
+        if now < self._next.get(key, 0.0):
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return False
+        self._next[key] = now + self.interval
+        text = message % args if args else message
+        suppressed = self._suppressed.pop(key, 0)
+        self.emit(f"{text} (+{suppressed} similar)" if suppressed else text)
+        return True
+
+
+def merge_histograms(histogram_sets) -> dict:
+    """
+    Gộp nhiều bộ histogram (dict tên → LatencyHistogram) theo tên.
+
+    Returns:
+        dict: Tên → LatencyHistogram đã gộp
+    """
+    merged = {}
+    for histograms in histogram_sets:
+        for name, hist in histograms.items():
+            if name not in merged:
+                merged[name] = LatencyHistogram(hist.sub_bucket_bits)
+            merged[name].merge(hist)
+    return merged
+
+
+def write_latency_json(path: str, sessions: dict):
+    """
+    Ghi tóm tắt độ trễ ra file JSON.
+
+    Args:
+        path (str): File đầu ra
+        sessions (dict): Tên phiên → dict tên histogram → LatencyHistogram;
+            phần 'all' gộp mọi phiên được thêm tự động
+    """
+    report = {
+        'sessions': {session: {name: hist.to_dict() for name, hist in sorted(histograms.items())}
+                     for session, histograms in sessions.items()},
+        'all': {name: hist.to_dict()
+                for name, hist in sorted(merge_histograms(sessions.values()).items())},
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+
+def write_latency_csv(path: str, sessions: dict):
+    """
+    Ghi tóm tắt độ trễ ra file CSV, mỗi dòng một (phiên, histogram).
+
+    Args:
+        path (str): File đầu ra
+        sessions (dict): Như write_latency_json; dòng có session 'all' là tổng gộp
+    """
+    columns = ['count', 'min_ms', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']
+    rows = list(sessions.items()) + [('all', merge_histograms(sessions.values()))]
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['session', 'metric'] + columns)
+        for session, histograms in rows:
+            for name, hist in sorted(histograms.items()):
+                summary = hist.to_dict()
+                writer.writerow([session, name] + [summary.get(column, '') for column in columns])
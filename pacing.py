@@ -0,0 +1,119 @@
+"""
+Audio Stream Pacing
+
+Module này điều khiển tốc độ gửi audio theo trục thời gian của chính audio,
+dựa trên đồng hồ monotonic thay vì sleep cố định sau mỗi chunk. Thời điểm gửi
+của mỗi chunk được tính tuyệt đối từ lúc bắt đầu stream nên thời gian gửi và
+jitter của event loop không bị cộng dồn.
+
+Các chế độ:
+- speed = 1.0: thời gian thực
+- speed = N: nhanh gấp N lần thời gian thực
+- speed = 0 (PACING_UNTHROTTLED): gửi nhanh nhất có thể, chỉ bị giới hạn bởi
+  backpressure của kết nối (websocket.send chờ khi buffer ghi đầy)
+
+Cách sử dụng:
+    pacer = StreamPacer(speed=1.0)
+    for chunk in chunks:
+        await pacer.pace(len(chunk) / sample_rate)
+        await websocket.send(...)
+    logger.info(pacer.stats())
+"""
+
+import asyncio
+import math
+import time
+
+PACING_REALTIME = 1.0
+PACING_UNTHROTTLED = 0.0
+
+
+class StreamPacer:
+    """
+    Bộ lập lịch gửi chunk theo trục thời gian audio.
+
+    Mỗi lần gọi pace() chờ tới thời điểm start + audio_time / speed, sau đó ghi
+    nhận độ trễ (drift) giữa thời điểm thực tế và thời điểm dự kiến.
+    """
+
+    def __init__(self, speed: float = PACING_REALTIME, clock=time.monotonic):
+        """
+        Args:
+            speed (float): Hệ số tốc độ so với thời gian thực, 0 để không giới hạn
+            clock (callable): Đồng hồ monotonic trả về giây
+
+        Raises:
+            ValueError: Khi speed âm
+        """
+        if speed < 0:
+            raise ValueError(f"Pacing speed must be >= 0, got {speed}")
+        self.speed = speed
+        self._clock = clock
+        self._start = None
+        self.audio_time = 0.0
+        self.chunks = 0
+        self.last_drift = 0.0
+        self.max_drift = 0.0
+        self._drift_sum = 0.0
+
+    @property
+    def unthrottled(self) -> bool:
+        """Pacer có đang ở chế độ gửi nhanh nhất có thể hay không."""
+        return self.speed == 0 or math.isinf(self.speed)
+
+    def is_due(self) -> bool:
+        """
+        Chunk kế tiếp đã tới (hoặc quá) thời điểm gửi hay chưa.
+
+        Dùng để gộp các chunk đã tới hạn vào một lần gửi khi sender bị chậm.
+        """
+        if self._start is None or self.unthrottled:
+            return True
+        return self._clock() >= self._start + self.audio_time / self.speed
+
+    async def pace(self, duration: float):
+        """
+        Chờ tới thời điểm gửi chunk kế tiếp.
+
+        Args:
+            duration (float): Độ dài (giây) của chunk sắp được gửi
+        """
+        now = self._clock()
+        if self._start is None:
+            self._start = now
+
+        if self.unthrottled:
+            # Still yield so receive tasks keep running between sends
+            await asyncio.sleep(0)
+        else:
+            target = self._start + self.audio_time / self.speed
+            if target > now:
+                await asyncio.sleep(target - now)
+                now = self._clock()
+            drift = now - target
+            self.last_drift = drift
+            self.max_drift = max(self.max_drift, drift)
+            self._drift_sum += drift
+
+        self.audio_time += duration
+        self.chunks += 1
+
+    def stats(self) -> dict:
+        """
+        Thống kê pacing của stream.
+
+        Returns:
+            dict: Số chunk, thời lượng audio, thời gian thực tế, tốc độ hiệu dụng
+                và drift (trung bình, lớn nhất, cuối cùng) tính bằng giây
+        """
+        elapsed = self._clock() - self._start if self._start is not None else 0.0
+        paced = self.chunks if not self.unthrottled else 0
+        return {
+            'chunks': self.chunks,
+            'audio_seconds': self.audio_time,
+            'elapsed_seconds': elapsed,
+            'effective_speed': self.audio_time / elapsed if elapsed > 0 else 0.0,
+            'mean_drift': self._drift_sum / paced if paced else 0.0,
+            'max_drift': self.max_drift,
+            'last_drift': self.last_drift,
+        }
@@ -0,0 +1,179 @@
+"""
+Preprocessed PCM Cache
+
+Module này lưu kết quả tiền xử lý audio (PCM16 mono) xuống đĩa để các lần
+chạy sau stream ngay mà không phải đọc, resample và cắt khoảng lặng lại:
+- Khóa cache theo nội dung: SHA-256 của file nguồn cùng tần số mục tiêu, các
+  tham số tiền xử lý và PIPELINE_VERSION; đổi tham số tạo khóa mới nên entry
+  cũ tự động không còn được dùng và bị đẩy ra theo LRU
+- Hash của file nguồn được ghi nhớ theo (đường dẫn, kích thước, mtime) nên
+  lần chạy lặp lại không phải đọc lại toàn bộ file để hash
+- Dữ liệu lưu dạng PCM16 thô, được memory-map khi đọc (không sao chép)
+- Tổng dung lượng giới hạn bởi max_bytes, entry ít được dùng gần đây nhất bị
+  xóa trước (thời điểm dùng được lưu bằng mtime của file entry)
+
+Cách sử dụng:
+    cache = PcmCache("~/.cache/audio-pcm", max_bytes=2 * 1024**3)
+    key = cache.key("tour.wav", {"sample_rate": 16000})
+    samples = cache.get(key)
+    if samples is None:
+        chunks = cache.store(key, iter_pcm16_chunks("tour.wav", 16000, 3200))
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import tempfile
+
+from audio_pipeline import PIPELINE_VERSION
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_BYTES = 2 * 1024 ** 3
+HASH_BLOCK_BYTES = 1024 * 1024
+ENTRY_SUFFIX = ".pcm"
+HASH_INDEX = "hashes.json"
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 của nội dung file, đọc theo block."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PcmCache:
+    """Cache PCM16 trên đĩa, khóa theo nội dung file nguồn và tham số tiền xử lý."""
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_CACHE_BYTES):
+        """
+        Args:
+            directory (str): Thư mục chứa cache (được tạo nếu chưa có)
+            max_bytes (int): Tổng dung lượng tối đa của các entry
+        """
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self._hashes = None
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def _load_hashes(self) -> dict:
+        if self._hashes is None:
+            try:
+                with open(os.path.join(self.directory, HASH_INDEX), 'r', encoding='utf-8') as f:
+                    self._hashes = json.load(f)
+            except (OSError, ValueError):
+                self._hashes = {}
+        return self._hashes
+
+    def _write_atomic(self, name: str, data: bytes):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, os.path.join(self.directory, name))
+
+    def source_hash(self, path: str) -> str:
+        """
+        Hash nội dung của file nguồn, ghi nhớ theo (đường dẫn, kích thước, mtime).
+
+        Returns:
+            str: SHA-256 dạng hex
+        """
+        stat = os.stat(path)
+        prefix = f"{os.path.abspath(path)}|"
+        memo_key = f"{prefix}{stat.st_size}|{stat.st_mtime_ns}"
+        hashes = self._load_hashes()
+        if memo_key not in hashes:
+            # Forget hashes of earlier versions of the same file
+            for stale in [k for k in hashes if k.startswith(prefix)]:
+                del hashes[stale]
+            hashes[memo_key] = file_sha256(path)
+            self._write_atomic(HASH_INDEX, json.dumps(hashes).encode('utf-8'))
+        return hashes[memo_key]
+
+    def key(self, path: str, params: dict) -> str:
+        """
+        Khóa cache của kết quả tiền xử lý path với params.
+
+        Args:
+            path (str): File audio nguồn
+            params (dict): Tần số mục tiêu và mọi tham số ảnh hưởng tới kết quả
+
+        Returns:
+            str: Khóa dạng hex
+        """
+        description = json.dumps({'source': self.source_hash(path), 'pipeline': PIPELINE_VERSION,
+                                  'params': params}, sort_keys=True)
+        return hashlib.sha256(description.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        """
+        Memory-map entry key và đánh dấu là vừa được dùng.
+
+        Returns:
+            memoryview: View định dạng 'h' trên các mẫu, hoặc None nếu chưa có
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                samples = (memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)).cast('h')
+                           if size else memoryview(b'').cast('h'))
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return samples
+
+    def store(self, key: str, chunks):
+        """
+        Ghi các chunk PCM16 vào cache trong lúc chuyển tiếp chúng cho người gọi.
+
+        Entry chỉ xuất hiện khi toàn bộ chunk đã được tiêu thụ; nếu việc tiêu
+        thụ dừng giữa chừng thì phần đã ghi bị bỏ.
+
+        Args:
+            key (str): Khóa từ key()
+            chunks (iterable): Các chunk int16 (np.ndarray hoặc memoryview)
+
+        Returns:
+            generator: Sinh lại đúng các chunk đầu vào
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-', suffix=ENTRY_SUFFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            os.replace(tmp, self._entry_path(key))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.evict()
+
+    def evict(self):
+        """Xóa các entry dùng lâu nhất cho tới khi tổng dung lượng <= max_bytes."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(ENTRY_SUFFIX) and not entry.name.startswith('.'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                logger.info(f"Evicted cached PCM {os.path.basename(path)} ({size} bytes)")
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,353 @@
+"""
+Server-side Audio Processing
+
+Module này mô phỏng phần xử lý audio của server dịch thật để server cục bộ
+(server.py) tạo ra chi phí buffer và CPU thực tế khi load test:
+- RingBuffer: buffer vòng PCM16 cho mỗi kết nối
+- EnergyVad: stage phân đoạn tiếng nói dựa trên năng lượng (VAD)
+- StreamProcessor: giải mã chunk theo format đã thương lượng, ghi vào ring
+  buffer, chạy stage xử lý và trả về các đoạn (segment) đã hoàn tất
+- SyntheticDelay: độ trễ tổng hợp mô phỏng chi phí ASR/MT
+
+Stage xử lý có thể thay thế (pluggable): stage_factory(sample_rate) trả về một
+đối tượng có process(samples, position) và flush(position), cả hai trả về danh
+sách (start, end) theo vị trí mẫu tuyệt đối của các đoạn đã kết thúc.
+
+Phần tốn CPU của mỗi chunk (giải mã, downmix, năng lượng từng frame) nằm trong
+hàm thuần analyze_chunk() để có thể chạy trong process pool; stage chỉ giữ
+phần state machine nhẹ trên event loop (xem StreamProcessor.job/apply).
+"""
+
+import asyncio
+import time
+from collections import deque
+
+import numpy as np
+
+from codec import ENCODING_PCM, SUPPORTED_ENCODINGS, decode
+
+
+def decode_pcm16(payload, channels: int = 1, encoding: str = ENCODING_PCM) -> np.ndarray:
+    """Giải mã chunk (PCM16 little-endian hoặc encoding đã thương lượng) và downmix về mono."""
+    samples = decode(encoding, payload)
+    if channels > 1:
+        usable = len(samples) - len(samples) % channels
+        samples = samples[:usable].reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return samples
+
+
+def frame_energies(samples: np.ndarray, frame_len: int) -> np.ndarray:
+    """Năng lượng (dBFS) của từng frame đầy đủ trong samples."""
+    usable = len(samples) - len(samples) % frame_len
+    frames = samples[:usable].reshape(-1, frame_len).astype(np.float32)
+    return 10 * np.log10(np.mean(frames * frames, axis=1) / (32768.0 ** 2) + 1e-12)
+
+
+def analyze_chunk(payload, channels: int, pending: np.ndarray, frame_len: int,
+                  encoding: str = ENCODING_PCM):
+    """
+    Phần tốn CPU của một chunk, không phụ thuộc state nên chạy được ở process khác.
+
+    Args:
+        payload: Dữ liệu của chunk
+        channels (int): Số kênh
+        pending (np.ndarray): Các mẫu chưa đủ một frame còn lại từ chunk trước
+        frame_len (int): Số mẫu mỗi frame phân tích
+        encoding (str): Encoding của chunk (xem codec.py)
+
+    Returns:
+        tuple: (mẫu mono của chunk, năng lượng các frame của pending + chunk)
+    """
+    samples = decode_pcm16(payload, channels, encoding)
+    data = np.concatenate((pending, samples)) if len(pending) else samples
+    return samples, frame_energies(data, frame_len)
+
+
+def busy_wait(seconds: float):
+    """Chiếm CPU trong seconds giây (mô phỏng chi phí tính toán)."""
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class RingBuffer:
+    """Buffer vòng PCM16, định vị theo vị trí mẫu tuyệt đối kể từ đầu stream."""
+
+    def __init__(self, capacity: int):
+        """
+        Args:
+            capacity (int): Số mẫu tối đa được giữ lại
+        """
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=np.int16)
+        self.written = 0
+
+    def write(self, samples: np.ndarray):
+        """Ghi thêm mẫu vào cuối buffer, ghi đè dữ liệu cũ nhất khi đầy."""
+        n = len(samples)
+        if n >= self.capacity:
+            self._data[:] = samples[-self.capacity:]
+            self.written += n
+            # Realign so index == position % capacity still holds
+            self._data = np.roll(self._data, self.written % self.capacity)
+            return
+        start = self.written % self.capacity
+        first = min(n, self.capacity - start)
+        self._data[start:start + first] = samples[:first]
+        self._data[:n - first] = samples[first:]
+        self.written += n
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        """
+        Đọc các mẫu trong khoảng [start, end) theo vị trí tuyệt đối.
+
+        Phần đã bị ghi đè được bỏ qua (kết quả bắt đầu từ mẫu cũ nhất còn giữ).
+
+        Returns:
+            np.ndarray: Bản sao các mẫu int16
+        """
+        start = max(start, self.written - self.capacity, 0)
+        end = min(end, self.written)
+        if end <= start:
+            return np.zeros(0, dtype=np.int16)
+        indices = np.arange(start, end) % self.capacity
+        return self._data[indices]
+
+
+class EnergyVad:
+    """
+    Phân đoạn tiếng nói dựa trên năng lượng từng frame.
+
+    Một đoạn bắt đầu khi năng lượng frame vượt threshold_db, kết thúc khi có
+    hangover_ms liên tiếp dưới ngưỡng hoặc khi đoạn dài tới max_segment_ms.
+    Đoạn ngắn hơn min_speech_ms bị bỏ qua.
+    """
+
+    def __init__(self, sample_rate: int, frame_ms: int = 20, threshold_db: float = -45.0,
+                 min_speech_ms: int = 100, hangover_ms: int = 300, max_segment_ms: int = 10000):
+        """
+        Args:
+            sample_rate (int): Tần số mẫu
+            frame_ms (int): Độ dài frame phân tích
+            threshold_db (float): Ngưỡng năng lượng (dBFS)
+            min_speech_ms (int): Độ dài tối thiểu của một đoạn
+            hangover_ms (int): Khoảng lặng để kết thúc đoạn
+            max_segment_ms (int): Độ dài tối đa của một đoạn
+        """
+        self.frame_len = sample_rate * frame_ms // 1000
+        self.threshold_db = threshold_db
+        self.min_speech = sample_rate * min_speech_ms // 1000
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.max_segment = sample_rate * max_segment_ms // 1000
+        self._pending = np.zeros(0, dtype=np.int16)
+        self._pending_start = 0
+        self._segment_start = None
+        self._last_voiced_end = 0
+        self._silent_frames = 0
+
+    def _close(self, end: int, segments: list):
+        if end - self._segment_start >= self.min_speech:
+            segments.append((self._segment_start, end))
+        self._segment_start = None
+        self._silent_frames = 0
+
+    @property
+    def pending(self) -> np.ndarray:
+        """Các mẫu chưa đủ một frame, cần ghép vào đầu chunk kế tiếp."""
+        return self._pending
+
+    def process(self, samples: np.ndarray, position: int, energies: np.ndarray = None) -> list:
+        """
+        Xử lý các mẫu mới, bắt đầu tại vị trí tuyệt đối position.
+
+        Args:
+            samples (np.ndarray): Các mẫu mới
+            position (int): Vị trí tuyệt đối của mẫu đầu tiên
+            energies (np.ndarray): Năng lượng frame đã tính sẵn bởi analyze_chunk()
+                với pending hiện tại; tính tại chỗ nếu None
+
+        Returns:
+            list: Các đoạn (start, end) đã kết thúc
+        """
+        if not len(self._pending):
+            self._pending_start = position
+        data = np.concatenate((self._pending, samples)) if len(self._pending) else samples
+        usable = len(data) - len(data) % self.frame_len
+        energy_db = frame_energies(data, self.frame_len) if energies is None else energies
+
+        segments = []
+        base = self._pending_start
+        for i, voiced in enumerate(energy_db > self.threshold_db):
+            frame_start = base + i * self.frame_len
+            frame_end = frame_start + self.frame_len
+            if voiced:
+                if self._segment_start is None:
+                    self._segment_start = frame_start
+                self._last_voiced_end = frame_end
+                self._silent_frames = 0
+            elif self._segment_start is not None:
+                self._silent_frames += 1
+                if self._silent_frames >= self.hangover_frames:
+                    self._close(self._last_voiced_end, segments)
+            if self._segment_start is not None and frame_end - self._segment_start >= self.max_segment:
+                self._close(frame_end, segments)
+
+        self._pending = data[usable:].copy()
+        self._pending_start = base + usable
+        return segments
+
+    def flush(self, position: int) -> list:
+        """Kết thúc đoạn đang mở ở cuối stream."""
+        segments = []
+        if self._segment_start is not None:
+            self._close(self._last_voiced_end, segments)
+        return segments
+
+
+class StreamProcessor:
+    """
+    Xử lý audio của một kết nối theo format đã thương lượng.
+
+    Mỗi đoạn trả về gồm vị trí (ms), audio của đoạn (đọc từ ring buffer) và
+    seq / timestamp của chunk chứa điểm kết thúc đoạn, để client đo độ trễ.
+    """
+
+    def __init__(self, format_message: dict, stage_factory=EnergyVad, ring_seconds: float = 30.0):
+        """
+        Args:
+            format_message (dict): Tin nhắn format của client
+            stage_factory (callable): Tạo stage xử lý từ sample rate
+            ring_seconds (float): Dung lượng ring buffer (giây audio)
+
+        Raises:
+            ValueError: Khi format không phải PCM 16-bit hoặc encoding không được hỗ trợ
+        """
+        if format_message.get('bitsPerSample', 16) != 16:
+            raise ValueError(f"Unsupported bitsPerSample: {format_message.get('bitsPerSample')}")
+        self.encoding = format_message.get('encoding', ENCODING_PCM)
+        if self.encoding not in SUPPORTED_ENCODINGS:
+            raise ValueError(f"Unsupported encoding: {self.encoding}")
+        self.sample_rate = format_message.get('sampleRate', 16000)
+        self.channels = format_message.get('channels', 1)
+        self.ring = RingBuffer(int(self.sample_rate * ring_seconds))
+        self.stage = stage_factory(self.sample_rate)
+        self._chunks = deque()
+
+    def feed(self, payload, seq: int = None, timestamp: int = None) -> list:
+        """
+        Giải mã một chunk theo encoding của stream và chạy stage xử lý.
+
+        Args:
+            payload: Dữ liệu của chunk (bytes hoặc memoryview)
+            seq (int): Sequence number của chunk
+            timestamp (int): Thời điểm client gửi chunk (micro giây)
+
+        Returns:
+            list: Các đoạn đã hoàn tất (xem _segment)
+        """
+        return self.apply(decode_pcm16(payload, self.channels, self.encoding), None, seq, timestamp)
+
+    def job(self, payload):
+        """
+        Tham số cho analyze_chunk() để tính phần tốn CPU của chunk ở nơi khác.
+
+        Các chunk của một kết nối phải được job/apply tuần tự, vì job phụ thuộc
+        vào state của stage sau chunk trước.
+
+        Returns:
+            tuple: Tham số cho analyze_chunk, hoặc None nếu stage không hỗ trợ
+                năng lượng tính sẵn (khi đó dùng feed())
+        """
+        if not hasattr(self.stage, 'pending'):
+            return None
+        return bytes(payload), self.channels, self.stage.pending, self.stage.frame_len, self.encoding
+
+    def apply(self, samples: np.ndarray, energies, seq: int = None, timestamp: int = None) -> list:
+        """
+        Ghi các mẫu đã giải mã vào ring buffer và chạy stage.
+
+        Args:
+            samples (np.ndarray): Mẫu mono của chunk
+            energies (np.ndarray): Kết quả năng lượng từ analyze_chunk(), hoặc None
+            seq (int): Sequence number của chunk
+            timestamp (int): Thời điểm client gửi chunk (micro giây)
+
+        Returns:
+            list: Các đoạn đã hoàn tất
+        """
+        position = self.ring.written
+        self.ring.write(samples)
+        self._chunks.append((self.ring.written, seq, timestamp))
+        # Chunks whose audio has left the ring buffer can no longer end a segment;
+        # without this a long silence-only stream would grow the deque forever
+        oldest = self.ring.written - self.ring.capacity
+        while len(self._chunks) > 1 and self._chunks[0][0] <= oldest:
+            self._chunks.popleft()
+        if energies is None:
+            ranges = self.stage.process(samples, position)
+        else:
+            ranges = self.stage.process(samples, position, energies)
+        return [self._segment(start, end) for start, end in ranges]
+
+    def flush(self) -> list:
+        """Kết thúc các đoạn còn mở khi stream dừng."""
+        return [self._segment(start, end) for start, end in self.stage.flush(self.ring.written)]
+
+    def _segment(self, start: int, end: int) -> dict:
+        # Chunks ending before this segment can no longer be referenced
+        while len(self._chunks) > 1 and self._chunks[0][0] < end:
+            self._chunks.popleft()
+        _, seq, timestamp = self._chunks[0]
+        return {
+            'startMs': start * 1000 // self.sample_rate,
+            'endMs': end * 1000 // self.sample_rate,
+            'audio': self.ring.read(start, end),
+            'seq': seq,
+            'timestamp': timestamp,
+        }
+
+
+class SyntheticDelay:
+    """
+    Độ trễ tổng hợp mô phỏng chi phí ASR/MT.
+
+    Chi phí ASR = asr_delay_ms + asr_rtf * độ dài đoạn; chi phí MT = mt_delay_ms
+    cho mỗi ngôn ngữ đích. Với busy=True độ trễ được mô phỏng bằng vòng lặp
+    chiếm CPU thay vì sleep, để thấy tác động lên event loop; nếu có executor
+    thì vòng lặp chạy trong executor đó.
+    """
+
+    def __init__(self, asr_delay_ms: float = 0.0, asr_rtf: float = 0.0,
+                 mt_delay_ms: float = 0.0, busy: bool = False, executor=None):
+        """
+        Args:
+            asr_delay_ms (float): Chi phí ASR cố định mỗi đoạn
+            asr_rtf (float): Chi phí ASR theo tỉ lệ thời lượng đoạn (real-time factor)
+            mt_delay_ms (float): Chi phí MT mỗi ngôn ngữ đích
+            busy (bool): Chiếm CPU thay vì sleep
+            executor: Executor chạy phần chiếm CPU, None để chạy trên event loop
+        """
+        self.asr_delay_ms = asr_delay_ms
+        self.asr_rtf = asr_rtf
+        self.mt_delay_ms = mt_delay_ms
+        self.busy = busy
+        self.executor = executor
+
+    async def _wait(self, seconds: float):
+        if seconds <= 0:
+            return
+        if self.busy and self.executor is not None:
+            await asyncio.get_running_loop().run_in_executor(self.executor, busy_wait, seconds)
+        elif self.busy:
+            busy_wait(seconds)
+        else:
+            await asyncio.sleep(seconds)
+
+    async def asr(self, segment: dict):
+        """Chờ chi phí ASR của một đoạn."""
+        duration_ms = segment['endMs'] - segment['startMs']
+        await self._wait((self.asr_delay_ms + self.asr_rtf * duration_ms) / 1000)
+
+    async def mt(self, language: str):
+        """Chờ chi phí MT cho một ngôn ngữ đích."""
+        await self._wait(self.mt_delay_ms / 1000)
@@ -0,0 +1,171 @@
+"""
+Audio Streaming Wire Protocol
+
+Module này định nghĩa giao thức truyền audio dùng chung giữa client (main.py)
+và server (server.py).
+
+Handshake luôn là JSON: client gửi tin nhắn `format` kèm danh sách transport
+mà nó hỗ trợ, server trả lời `format-ack` với transport được chọn. Peer cũ
+không biết trường `transports` sẽ không trả lời, khi đó client quay về giao
+thức JSON + base64 như trước. Encoding của audio (PCM hoặc codec nén, xem
+codec.py) được thương lượng cùng lúc qua trường `encodings` / `encoding`.
+
+Ở chế độ binary, mỗi chunk audio là một WebSocket binary frame gồm header cố
+định 16 bytes (big-endian) theo sau là dữ liệu audio (PCM thô hoặc frame
+của codec đã thương lượng):
+
+    version (u8) | flags (u8) | stream_id (u16) | seq (u32) | timestamp_us (u64)
+
+Một kết nối có thể mang nhiều stream audio (nối tiếp hoặc xen kẽ). Mỗi stream
+có ID riêng trong trường `streamId` của các tin nhắn JSON (format, audio, end
+và các phản hồi tương ứng) và trong header của binary frame. Stream 0 là
+stream mặc định của kết nối: client cũ không gửi `streamId` (và gửi 0 ở vị trí
+stream_id, trước đây là trường dự phòng), server không thêm `streamId` vào
+phản hồi cho stream 0. Client gửi `end` khi hết audio của một stream; server
+trả lời `end-ack` sau khi đã gửi mọi kết quả của stream đó. Server hỗ trợ
+streamId và end/end-ack đánh dấu `streams: true` trong `format-ack`; với peer
+khác, client chỉ chạy lần lượt từng stream trên stream 0.
+
+Mặc định server gửi một `ack` cho mỗi chunk. Client có thể xin ack tích lũy
+bằng trường `ackEvery` (K chunk) và/hoặc `ackIntervalMs` (T ms; chỉ có T thì
+ack chỉ theo thời gian) trong tin nhắn format: server gửi một ack cho mỗi K
+chunk, hoặc T ms sau chunk đầu tiên chưa được ack, và trước `end-ack`. Ack tích lũy có `seq` của chunk mới nhất, số
+chunk (`chunks`), bytes và audioMs của các chunk đó, cùng `totalBytes` của cả
+stream; nó xác nhận mọi chunk có seq nhỏ hơn hoặc bằng. Giá trị server dùng
+được trả lại trong `format-ack` (`ackEvery` chỉ khi client xin ack theo số
+chunk); peer cũ bỏ qua các trường này và ack từng chunk như trước.
+"""
+
+import struct
+import time
+
+PROTOCOL_VERSION = 1
+
+TRANSPORT_BINARY = "binary"
+TRANSPORT_JSON = "json"
+SUPPORTED_TRANSPORTS = (TRANSPORT_BINARY, TRANSPORT_JSON)
+
+AUDIO_HEADER = struct.Struct("!BBHIQ")
+AUDIO_HEADER_SIZE = AUDIO_HEADER.size
+
+DEFAULT_STREAM_ID = 0
+MAX_STREAM_ID = 0xFFFF
+
+# Cumulative acks: at most this many chunks or milliseconds per ack; a stream
+# asking for ackEvery > 1 without a timer gets DEFAULT_ACK_INTERVAL_MS so the
+# tail of a batch is never left waiting
+MAX_ACK_EVERY = 256
+MAX_ACK_INTERVAL_MS = 2000
+DEFAULT_ACK_INTERVAL_MS = 200
+
+# compression= for every connection that carries audio: PCM (raw or base64)
+# barely deflates, so permessage-deflate would only cost CPU on both ends
+AUDIO_COMPRESSION = None
+
+
+class ProtocolError(ValueError):
+    """Frame nhận được không đúng định dạng giao thức."""
+
+
+def now_us() -> int:
+    """Thời điểm hiện tại (wall clock) tính bằng micro giây."""
+    return time.time_ns() // 1000
+
+
+def choose_transport(format_message: dict) -> str:
+    """
+    Chọn transport cho một kết nối dựa trên tin nhắn `format` của client.
+
+    Args:
+        format_message (dict): Tin nhắn format đã được parse
+
+    Returns:
+        str: TRANSPORT_BINARY nếu client đề nghị, ngược lại TRANSPORT_JSON
+    """
+    offered = format_message.get("transports") or []
+    if TRANSPORT_BINARY in offered:
+        return TRANSPORT_BINARY
+    return TRANSPORT_JSON
+
+
+def ack_policy(format_message: dict) -> tuple:
+    """
+    Chính sách ack mà server dùng cho một stream theo tin nhắn `format`.
+
+    Args:
+        format_message (dict): Tin nhắn format đã được parse
+
+    Returns:
+        tuple: (ack_every, ack_interval_ms); (1, 0) là ack từng chunk
+    """
+    interval_ms = format_message.get("ackIntervalMs", 0)
+    interval_ms = (min(max(interval_ms, 0), MAX_ACK_INTERVAL_MS)
+                   if isinstance(interval_ms, (int, float)) else 0)
+    # A timer alone means acks are driven by time, not by chunk count
+    every = format_message.get("ackEvery", MAX_ACK_EVERY if interval_ms else 1)
+    every = min(max(every, 1), MAX_ACK_EVERY) if isinstance(every, int) else 1
+    if every > 1 and not interval_ms:
+        interval_ms = DEFAULT_ACK_INTERVAL_MS
+    return every, interval_ms
+
+
+def stream_id_of(message: dict) -> int:
+    """
+    Stream ID của một tin nhắn JSON (DEFAULT_STREAM_ID nếu không có).
+
+    Raises:
+        ProtocolError: Khi streamId không phải số nguyên trong khoảng u16
+    """
+    stream_id = message.get("streamId", DEFAULT_STREAM_ID)
+    if not isinstance(stream_id, int) or not 0 <= stream_id <= MAX_STREAM_ID:
+        raise ProtocolError(f"Invalid streamId: {stream_id!r}")
+    return stream_id
+
+
+def tag_stream(message: dict, stream_id: int) -> dict:
+    """Thêm streamId vào tin nhắn, trừ stream mặc định (giữ nguyên tin nhắn cho peer cũ)."""
+    if stream_id != DEFAULT_STREAM_ID:
+        message["streamId"] = stream_id
+    return message
+
+
+def encode_audio_frame(payload, seq: int, timestamp_us: int = None, flags: int = 0,
+                       stream_id: int = DEFAULT_STREAM_ID) -> bytes:
+    """
+    Đóng gói một chunk PCM thành binary frame.
+
+    Args:
+        payload: Dữ liệu audio (bytes, bytearray, memoryview hoặc numpy array)
+        seq (int): Số thứ tự chunk trong stream
+        timestamp_us (int): Thời điểm gửi (micro giây), mặc định là hiện tại
+        flags (int): Cờ dự phòng cho các phần mở rộng
+        stream_id (int): Stream của chunk trên kết nối
+
+    Returns:
+        bytes: Header + payload
+    """
+    if timestamp_us is None:
+        timestamp_us = now_us()
+    header = AUDIO_HEADER.pack(PROTOCOL_VERSION, flags, stream_id, seq & 0xFFFFFFFF, timestamp_us)
+    return header + memoryview(payload).cast("B")
+
+
+def decode_audio_frame(frame):
+    """
+    Tách header và payload từ một binary frame.
+
+    Args:
+        frame: Binary frame nhận được từ WebSocket
+
+    Returns:
+        tuple: (seq, timestamp_us, flags, payload, stream_id) với payload là memoryview
+
+    Raises:
+        ProtocolError: Khi frame quá ngắn hoặc sai version
+    """
+    if len(frame) < AUDIO_HEADER_SIZE:
+        raise ProtocolError(f"Audio frame too short: {len(frame)} bytes")
+    version, flags, stream_id, seq, timestamp_us = AUDIO_HEADER.unpack_from(frame)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported audio frame version: {version}")
+    return seq, timestamp_us, flags, memoryview(frame)[AUDIO_HEADER_SIZE:], stream_id
@@ -0,0 +1,309 @@
+"""
+Concurrent Audio Replay Engine
+
+Module này chạy nhiều phiên stream audio song song trên một event loop để
+load test backend dịch, dựa trên AudioTranslationClient:
+- Đọc manifest gồm các phiên (file, from_lang, to_langs, endpoint, codec,
+  count)
+- Giới hạn số phiên chạy đồng thời và khởi động lệch nhau (staggered start)
+- Tiền xử lý mỗi file audio một lần và dùng chung cho các phiên cùng file;
+  với --cache-dir kết quả được giữ trên đĩa cho các lần replay sau
+- Thống kê độ trễ và thông lượng của từng phiên, xuất histogram độ trễ
+  (ack, broadcast theo ngôn ngữ đích) ra JSON/CSV
+- Mỗi phiên giới hạn số chunk chưa được ack (flow control, xem
+  flow_control.py); với --speed 0 các phiên gửi nhanh nhất mà server vẫn
+  theo kịp thay vì dồn audio vào hàng đợi
+
+Manifest là file JSON chứa danh sách các entry, ví dụ:
+    [
+        {"file": "noise.wav", "from_lang": "vi", "to_langs": ["en"], "count": 50},
+        {"file": "tour.wav", "endpoint": "ws://localhost:8765", "codec": "IMA-ADPCM"}
+    ]
+
+Cách sử dụng:
+    python replay.py manifest.json --concurrency 200 --stagger 0.05 --output stats.json \
+        --latency-json latency.json --latency-csv latency.csv --cache-dir ~/.cache/audio-pcm
+    python replay.py manifest.json --speed 0 --window 16
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import websockets
+
+from codec import ENCODING_PCM
+from flow_control import DEFAULT_MAX_WINDOW
+from main import STREAM_PROFILES, AudioTranslationClient
+from metrics import write_latency_csv, write_latency_json
+from pacing import PACING_REALTIME
+from pcm_cache import DEFAULT_CACHE_BYTES, PcmCache
+from protocol import AUDIO_COMPRESSION
+
+logger = logging.getLogger(__name__)
+
+
+def load_manifest(manifest_path: str) -> list:
+    """
+    Đọc manifest và mở rộng các entry có `count` thành nhiều phiên.
+
+    Args:
+        manifest_path (str): Đường dẫn tới file manifest JSON
+
+    Returns:
+        list: Danh sách entry, mỗi entry ứng với một phiên
+
+    Raises:
+        ValueError: Khi manifest không phải danh sách hoặc entry thiếu `file`
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError("Manifest must be a JSON list of session entries")
+
+    sessions = []
+    for entry in entries:
+        if 'file' not in entry:
+            raise ValueError(f"Manifest entry without 'file': {entry}")
+        sessions.extend(dict(entry) for _ in range(entry.get('count', 1)))
+    return sessions
+
+
+class ReplayEngine:
+    """
+    Chạy song song nhiều phiên AudioTranslationClient.
+
+    Audio đã tiền xử lý được cache theo (file, sample rate, kích thước chunk)
+    và dùng chung giữa các phiên; mỗi file chỉ được tiền xử lý một lần kể cả
+    khi nhiều phiên yêu cầu cùng lúc.
+    """
+
+    def __init__(self,
+                 entries,
+                 websocket_endpoint="ws://localhost:8765",
+                 concurrency=100,
+                 stagger=0.0,
+                 speed=PACING_REALTIME,
+                 profile="default",
+                 drain_timeout=5.0,
+                 cache=None,
+                 flow_control=None,
+                 ack_every=1,
+                 ack_interval_ms=None):
+        """
+        Args:
+            entries (list): Danh sách entry từ load_manifest()
+            websocket_endpoint (str): Endpoint mặc định cho entry không khai báo
+            concurrency (int): Số phiên chạy đồng thời tối đa
+            stagger (float): Khoảng cách (giây) giữa thời điểm bắt đầu của các phiên
+            speed (float): Tốc độ stream (xem AudioTranslationClient)
+            profile (str): Streaming profile cho mọi phiên
+            drain_timeout (float): Thời gian chờ ack còn thiếu sau khi gửi xong
+            cache (PcmCache): Cache PCM trên đĩa dùng chung cho mọi phiên
+            flow_control (dict): Tham số FlowController của mỗi phiên, False để
+                gửi không chờ ack (xem AudioTranslationClient)
+            ack_every (int): Số chunk mỗi ack tích lũy mà các phiên xin server
+            ack_interval_ms (int): Thời gian tối đa server giữ một ack tích lũy
+        """
+        self.entries = entries
+        self.websocket_endpoint = websocket_endpoint
+        self.concurrency = concurrency
+        self.stagger = stagger
+        self.speed = speed
+        self.profile = profile
+        self.drain_timeout = drain_timeout
+        self.cache = cache
+        self.flow_control = flow_control
+        self.ack_every = ack_every
+        self.ack_interval_ms = ack_interval_ms
+        self._audio = {}
+        self.latency = {}
+
+    def _create_client(self, entry) -> AudioTranslationClient:
+        return AudioTranslationClient(
+            websocket_endpoint=entry.get('endpoint', self.websocket_endpoint),
+            from_lang=entry.get('from_lang', 'vi'),
+            to_langs=entry.get('to_langs'),
+            codec=entry.get('codec', ENCODING_PCM),
+            speed=self.speed,
+            profile=self.profile,
+            cache=self.cache,
+            flow_control=self.flow_control,
+            ack_every=self.ack_every,
+            ack_interval_ms=self.ack_interval_ms)
+
+    async def _load_chunks(self, client, audio_path: str) -> list:
+        """Tiền xử lý file trong thread pool, dùng chung kết quả giữa các phiên."""
+        key = (audio_path, client.target_sample_rate, client.buffer_size)
+        if key not in self._audio:
+            loop = asyncio.get_running_loop()
+            self._audio[key] = loop.run_in_executor(
+                None, lambda: list(client.iter_audio_chunks(audio_path)))
+        return await self._audio[key]
+
+    async def _receive_acks(self, client, websocket, stats):
+        async for message in websocket:
+            response = client.handle_message(message)
+            if response and response.get('type') == 'ack':
+                if stats['acks'] == 0:
+                    stats['first_ack_latency'] = time.perf_counter() - stats['_stream_start']
+                # A cumulative ack covers several messages
+                stats['acks'] += response.get('chunks', 1)
+
+    async def run_session(self, index: int, entry: dict) -> dict:
+        """
+        Chạy một phiên: tiền xử lý (dùng chung), kết nối, stream và chờ ack.
+
+        Args:
+            index (int): Số thứ tự phiên
+            entry (dict): Entry của manifest
+
+        Returns:
+            dict: Thống kê của phiên
+        """
+        client = self._create_client(entry)
+        self.latency[f"session-{index}"] = client.latency.histograms
+        stats = {
+            'session': index,
+            'file': entry['file'],
+            'endpoint': client.websocket_endpoint,
+            'acks': 0,
+            'error': None,
+        }
+        try:
+            chunks = await self._load_chunks(client, entry['file'])
+
+            connect_start = time.perf_counter()
+            async with websockets.connect(client.websocket_endpoint, compression=AUDIO_COMPRESSION) as websocket:
+                stats['connect_time'] = time.perf_counter() - connect_start
+                stats['transport'] = await client.negotiate_format(websocket)
+
+                stats['_stream_start'] = time.perf_counter()
+                receive_task = asyncio.create_task(self._receive_acks(client, websocket, stats))
+                pacing = await client.stream_audio(websocket, chunks, stats['transport'])
+                stats['send_time'] = time.perf_counter() - stats['_stream_start']
+
+                # Give the server a bounded window to acknowledge the tail;
+                # acks count messages, which may each carry several coalesced chunks
+                deadline = time.perf_counter() + self.drain_timeout
+                while stats['acks'] < pacing['messages'] and time.perf_counter() < deadline \
+                        and not receive_task.done():
+                    await asyncio.sleep(0.01)
+                receive_task.cancel()
+
+            total_time = time.perf_counter() - stats['_stream_start']
+            stats.update({
+                'chunks': pacing['chunks'],
+                'audio_seconds': pacing['audio_seconds'],
+                'total_time': total_time,
+                'throughput': pacing['audio_seconds'] / total_time if total_time > 0 else 0.0,
+                'max_drift': pacing['max_drift'],
+                'stall_seconds': pacing['flow']['stall_seconds'] if 'flow' in pacing else None,
+                'latency': client.latency.summary(),
+            })
+        except Exception as e:
+            logger.error(f"Session {index} failed: {str(e)}")
+            stats['error'] = str(e)
+        stats.pop('_stream_start', None)
+        return stats
+
+    async def run(self) -> list:
+        """
+        Chạy tất cả các phiên với giới hạn đồng thời và khởi động lệch nhau.
+
+        Returns:
+            list: Thống kê của từng phiên theo thứ tự manifest
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def staggered(index, entry):
+            await asyncio.sleep(index * self.stagger)
+            async with semaphore:
+                return await self.run_session(index, entry)
+
+        return await asyncio.gather(*(staggered(i, entry) for i, entry in enumerate(self.entries)))
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def summarize(results: list) -> dict:
+    """
+    Tổng hợp thống kê của toàn bộ lần chạy.
+
+    Args:
+        results (list): Kết quả từ ReplayEngine.run()
+
+    Returns:
+        dict: Số phiên thành công/thất bại và p50/p95/max của các chỉ số chính
+    """
+    ok = [r for r in results if r['error'] is None]
+    summary = {'sessions': len(results), 'succeeded': len(ok), 'failed': len(results) - len(ok)}
+    for key in ('connect_time', 'first_ack_latency', 'throughput', 'max_drift', 'stall_seconds'):
+        values = [r[key] for r in ok if r.get(key) is not None]
+        summary[key] = {
+            'p50': _percentile(values, 50),
+            'p95': _percentile(values, 95),
+            'max': max(values) if values else None,
+        }
+    return summary
+
+
+async def main():
+    """Entry point: đọc manifest, chạy replay và in/ghi thống kê"""
+    parser = argparse.ArgumentParser(description="Concurrent audio replay for load testing")
+    parser.add_argument('manifest', help='File JSON chứa danh sách phiên')
+    parser.add_argument('--endpoint', default="ws://localhost:8765", help='Endpoint mặc định')
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--stagger', type=float, default=0.0, help='Giây giữa các lần khởi động phiên')
+    parser.add_argument('--speed', type=float, default=PACING_REALTIME, help='0 = không giới hạn')
+    parser.add_argument('--profile', default="default", choices=sorted(STREAM_PROFILES))
+    parser.add_argument('--output', help='Ghi thống kê từng phiên ra file JSON')
+    parser.add_argument('--latency-json', help='Ghi histogram độ trễ theo phiên/ngôn ngữ ra JSON')
+    parser.add_argument('--latency-csv', help='Ghi histogram độ trễ theo phiên/ngôn ngữ ra CSV')
+    parser.add_argument('--verbose', action='store_true', help='Giữ log chi tiết của từng phiên')
+    parser.add_argument('--cache-dir', help='Thư mục cache PCM đã tiền xử lý')
+    parser.add_argument('--cache-mb', type=float, default=DEFAULT_CACHE_BYTES / 2**20,
+                        help='Dung lượng tối đa của cache PCM (MB)')
+    parser.add_argument('--window', type=int, default=DEFAULT_MAX_WINDOW,
+                        help='Số chunk chưa được ack tối đa mỗi phiên')
+    parser.add_argument('--no-flow-control', action='store_true', help='Gửi không chờ ack')
+    parser.add_argument('--ack-every', type=int, default=1, help='Xin một ack tích lũy cho mỗi N chunk')
+    parser.add_argument('--ack-interval-ms', type=int, help='Thời gian tối đa server giữ một ack tích lũy')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger('main').setLevel(logging.WARNING)
+
+    engine = ReplayEngine(load_manifest(args.manifest),
+                          websocket_endpoint=args.endpoint,
+                          concurrency=args.concurrency,
+                          stagger=args.stagger,
+                          speed=args.speed,
+                          profile=args.profile,
+                          cache=PcmCache(args.cache_dir, int(args.cache_mb * 2**20))
+                          if args.cache_dir else None,
+                          flow_control=False if args.no_flow_control else {'max_window': args.window},
+                          ack_every=args.ack_every,
+                          ack_interval_ms=args.ack_interval_ms)
+    results = await engine.run()
+    summary = summarize(results)
+    logger.info(f"Replay summary: {json.dumps(summary, indent=2)}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'sessions': results}, f, indent=2)
+    if args.latency_json:
+        write_latency_json(args.latency_json, engine.latency)
+    if args.latency_csv:
+        write_latency_csv(args.latency_csv, engine.latency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
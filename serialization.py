@@ -0,0 +1,115 @@
+"""
+JSON Serialization
+
+Module này gom việc serialize / parse JSON của các tin nhắn điều khiển, ack
+và broadcast (main.py, server.py, connection.py, broadcast.py,
+client_site_ws.py) về một chỗ để dùng backend nhanh nhất hiện có:
+- orjson hoặc msgspec nếu được cài (không bắt buộc), ngược lại json của
+  stdlib; AUDIO_JSON_BACKEND=stdlib|orjson|msgspec ép chọn một backend
+- Mọi backend cho ra cùng một chuỗi JSON gọn (không khoảng trắng, giữ nguyên
+  ký tự non-ASCII), nên peer không phân biệt được backend của nhau
+- dumps() trả về str để gửi WebSocket text frame, dumpb() trả về bytes UTF-8
+  để nén (broadcast) mà không qua str trung gian
+- loads() nhận cả str và bytes; frame bytes (ví dụ broadcast vừa giải nén)
+  được parse trực tiếp
+- MessageTemplate: phần cố định của một loại tin nhắn (type, status, ...)
+  được mã hóa sẵn một lần, mỗi lần gửi chỉ ghép thêm các trường thay đổi
+
+Cách sử dụng:
+    from serialization import DECODE_ERRORS, MessageTemplate, dumps, loads
+    ACK = MessageTemplate('ack', ('bytes', 'audioMs', 'seq'), status='received')
+    await websocket.send(ACK.render(6400, 200, 12, stream_id=3))
+    try:
+        message = loads(frame)
+    except DECODE_ERRORS:
+        ...
+"""
+
+import json
+import os
+
+from protocol import DEFAULT_STREAM_ID
+
+BACKEND_STDLIB = "stdlib"
+BACKEND_ORJSON = "orjson"
+BACKEND_MSGSPEC = "msgspec"
+BACKENDS = (BACKEND_ORJSON, BACKEND_MSGSPEC, BACKEND_STDLIB)
+
+
+def _load_backend(preferred: str = None):
+    """(tên, dumps -> str, dumpb -> bytes, loads, lỗi parse) của backend đầu tiên import được."""
+    for name in ([preferred] if preferred else BACKENDS):
+        if name == BACKEND_ORJSON:
+            try:
+                import orjson
+            except ImportError:
+                continue
+            return (name, lambda obj: orjson.dumps(obj).decode('utf-8'), orjson.dumps, orjson.loads,
+                    (orjson.JSONDecodeError,))
+        if name == BACKEND_MSGSPEC:
+            try:
+                import msgspec
+            except ImportError:
+                continue
+            encoder = msgspec.json.Encoder()
+            decoder = msgspec.json.Decoder()
+            return (name, lambda obj: encoder.encode(obj).decode('utf-8'), encoder.encode, decoder.decode,
+                    (msgspec.DecodeError,))
+        if name == BACKEND_STDLIB:
+            encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+            return name, encode, lambda obj: encode(obj).encode('utf-8'), json.loads, ()
+    raise ValueError(f"JSON backend not available: {preferred}")
+
+
+BACKEND, dumps, dumpb, loads, _backend_errors = _load_backend(os.environ.get('AUDIO_JSON_BACKEND'))
+
+# What loads() raises on malformed text or bytes, whatever the backend
+# (non-text input such as None is a TypeError with the stdlib backend)
+DECODE_ERRORS = (json.JSONDecodeError, UnicodeDecodeError) + _backend_errors
+
+
+class MessageTemplate:
+    """
+    Một loại tin nhắn JSON: các trường cố định được mã hóa sẵn một lần.
+
+    render(*values, stream_id=...) cho ra đúng chuỗi của dumps(tag_stream(
+    {'type': ..., **constant, **dict(zip(fields, values))}, stream_id)) bằng
+    cách ghép chuỗi đã mã hóa sẵn với các giá trị, không dựng dict; với mọi
+    backend cách này không chậm hơn dumps() của dict tương ứng, và nhanh hơn
+    nhiều với trường chuỗi dài như base64 (không phải quét để escape).
+    """
+
+    def __init__(self, msg_type: str, fields: tuple = (), strings: tuple = (), **constant):
+        """
+        Args:
+            msg_type (str): Giá trị trường `type`
+            fields (tuple): Tên các trường thay đổi theo thứ tự trong tin nhắn;
+                giá trị là số nguyên (int, không phải bool hay float - giá trị
+                lấy từ tin nhắn của peer phải được kiểm tra trước), trừ các
+                trường trong strings
+            strings (tuple): Các trường trong fields có giá trị là chuỗi ASCII
+                không cần escape (ví dụ base64), được chèn nguyên văn
+            **constant: Các trường có giá trị cố định
+        """
+        self.fields = tuple(fields)
+        self.constant = {'type': msg_type, **constant}
+        # '{"type":"ack","status":"received"' without the closing brace
+        prefix = dumps(self.constant)[:-1]
+        body = ''.join(f',{dumps(name)}:' + ('"%s"' if name in strings else '%d') for name in self.fields)
+        self._format = prefix + body + '}'
+        self._tagged = prefix + body + ',"streamId":%d}'
+
+    def render(self, *values, stream_id: int = DEFAULT_STREAM_ID) -> str:
+        """
+        Serialize một tin nhắn của template.
+
+        Args:
+            *values: Giá trị của các trường thay đổi, theo thứ tự fields
+            stream_id (int): Stream của tin nhắn, streamId chỉ được thêm khác 0
+
+        Returns:
+            str: Tin nhắn JSON
+        """
+        if stream_id != DEFAULT_STREAM_ID:
+            return self._tagged % (*values, stream_id)
+        return self._format % values
@@ -5,72 +5,581 @@ Module này triển khai một WebSocket server để nhận và xử lý dữ l
 Server có khả năng:
 - Xử lý nhiều kết nối client cùng lúc
 - Nhận thông tin về format audio
-- Nhận và xử lý từng chunk audio
+- Nhận và xử lý từng chunk audio (binary frame hoặc JSON + base64, xem protocol.py)
 - Gửi phản hồi xác nhận (acknowledgment) cho client
+- Giải mã audio vào ring buffer của từng kết nối, phân đoạn bằng VAD và trả
+  về kết quả dịch mô phỏng sau độ trễ ASR/MT tổng hợp (xem processing.py)
+- Chạy phần xử lý tốn CPU của mỗi chunk trong thread/process pool qua một hàng
+  đợi giới hạn cho mỗi kết nối; khi hàng đợi đầy server ngừng đọc websocket
+  (backpressure) thay vì buffer vô hạn, đồng thời báo độ sâu hàng đợi và thời
+  gian xử lý định kỳ
+- Cập nhật counter/histogram trong bộ nhớ cho mỗi tin nhắn (MetricsRegistry)
+  và chỉ log theo mẫu; số liệu được xuất định kỳ thay cho log từng chunk
+- Chạy nhiều worker process cùng lắng nghe một port qua SO_REUSEPORT (kernel
+  chia kết nối cho các process), tắt êm khi nhận SIGINT/SIGTERM và tổng hợp
+  bộ đếm của mọi worker về process cha
+- Phát broadcast của một phiên tới mọi listener kết nối qua route
+  input-stream-translation/{SESSION_ID}/{USERNAME} (xem broadcast.py)
+- Không nén kết nối audio bằng permessage-deflate; broadcast được nén sẵn ở
+  tầng ứng dụng hoặc bằng deflate theo profile (--broadcast-compression,
+  --deflate, xem broadcast.py)
+- Nhận nhiều stream audio trên cùng một kết nối, phân biệt theo streamId; mỗi
+  stream có format, VAD và ngôn ngữ đích riêng, kết thúc bằng end / end-ack
+- Gộp ack: client có thể xin một ack tích lũy cho mỗi K chunk hoặc mỗi T ms
+  (ackEvery / ackIntervalMs trong format, xem protocol.py) thay vì một ack
+  cho mỗi chunk
+- Nhận audio nén (µ-law, IMA-ADPCM) khi client đề xuất trong format; encoding
+  được chọn trả về trong format-ack và giải mã trước VAD (xem codec.py)
 
 Cách sử dụng:
-    server = AudioServer()
+    server = AudioServer(delay=SyntheticDelay(asr_delay_ms=300, mt_delay_ms=100))
     await server.start()
+    python server.py --asr-delay-ms 300 --asr-rtf 0.1 --mt-delay-ms 100
+    python server.py --executor process --workers 4 --queue-size 32 --busy-delay
+    python server.py --processes 8 --stats-interval 5
+    python server.py --broadcast-compression none --deflate stateless
 """
 
+import argparse
 import asyncio
+import base64
+import binascii
+import functools
+import time
 import websockets
 import json
 import logging
+import multiprocessing
+import os
+import queue
+import signal
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from broadcast import (COMPRESSION_MODES, COMPRESSION_NONE, COMPRESSION_ZLIB, DEFAULT_SUBSCRIBER_QUEUE,
+                       DEFLATE_OFF, DEFLATE_PROFILES, SLOW_POLICIES, SLOW_POLICY_DROP,
+                       BroadcastHub, deflate_extensions, parse_session_path)
+from codec import ENCODING_PCM, choose_encoding, pcm_size
+from metrics import MetricsRegistry, SampledLog, merge_histograms
+from processing import EnergyVad, StreamProcessor, SyntheticDelay, analyze_chunk
+from protocol import (TRANSPORT_BINARY, TRANSPORT_JSON, ProtocolError,
+                      ack_policy, choose_transport, decode_audio_frame, stream_id_of, tag_stream)
+from serialization import DECODE_ERRORS, MessageTemplate, dumps, loads
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Per-message events (chunks, connects, bad frames) are logged at most once
+# per this interval for each kind; counters carry the full numbers.
+LOG_INTERVAL_MS = 2000
+# Counters always present in counters(), even before the first event
+SERVER_COUNTERS = ('connections_total', 'streams_total', 'streams_ended', 'messages_received',
+                   'chunks_received', 'audio_bytes_received', 'chunks_processed', 'chunk_errors',
+                   'invalid_messages', 'backpressure_waits', 'acks_sent')
+
+# Per-chunk messages, pre-encoded (see serialization.MessageTemplate)
+ACK = MessageTemplate('ack', ('bytes', 'audioMs', 'seq'), status='received')
+CUMULATIVE_ACK = MessageTemplate('ack', ('bytes', 'audioMs', 'seq', 'chunks', 'totalBytes'), status='received')
+END_ACK = MessageTemplate('end-ack')
+
+# Where per-chunk CPU work runs: on the event loop, in a thread pool (state stays
+# in-process) or in a process pool (only the stateless analysis is shipped out).
+EXECUTOR_INLINE = "inline"
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+EXECUTOR_MODES = (EXECUTOR_INLINE, EXECUTOR_THREAD, EXECUTOR_PROCESS)
+
+# Chunks buffered per connection before the reader stops pulling frames
+DEFAULT_QUEUE_SIZE = 64
+
+# Seconds a worker process gets to close its connections before being killed
+SHUTDOWN_TIMEOUT = 10.0
+# Counters combined with max() rather than summed across worker processes
+MAX_COUNTERS = ('queue_depth_peak', 'queue_depth_max')
+
+
+def audio_bytes_per_ms(format_message: dict) -> float:
+    """Số bytes audio tương ứng với 1ms theo tin nhắn format của client."""
+    return (format_message.get('sampleRate', 16000)
+            * format_message.get('bitsPerSample', 16) // 8
+            * format_message.get('channels', 1)) / 1000
+
+
+class AudioStream:
+    """
+    Một stream audio trên kết nối: format, transport đã thương lượng, processor
+    và ngôn ngữ đích của nó.
+
+    Stream cũng gộp ack theo chính sách đã thương lượng (ack_policy): các
+    chunk chưa được ack được cộng dồn cho tới khi đủ ack_every chunk hoặc
+    tới hạn ack_timer.
+    """
+
+    def __init__(self, stream_id: int, format_message: dict = None, processor: StreamProcessor = None,
+                 transport: str = TRANSPORT_JSON):
+        format_message = format_message or {}
+        self.id = stream_id
+        self.processor = processor
+        self.transport = transport
+        self.encoding = format_message.get('encoding', ENCODING_PCM)
+        self.bytes_per_ms = audio_bytes_per_ms(format_message)
+        self.languages = (format_message.get('toLangs')
+                          or [format_message.get('fromLang', 'unknown')])
+        self.ack_every, self.ack_interval_ms = ack_policy(format_message)
+        self.ack_timer = None
+        self.total_bytes = 0
+        # [last seq, chunks, bytes, PCM bytes] not acknowledged yet
+        self._unacked = None
+
+    @property
+    def cumulative_acks(self) -> bool:
+        """Stream có dùng ack tích lũy hay ack từng chunk."""
+        return self.ack_every > 1 or bool(self.ack_interval_ms)
+
+    def on_chunk(self, seq, nbytes: int, payload) -> str:
+        """
+        Ghi nhận một chunk vừa nhận.
+
+        Args:
+            seq (int): Sequence number của chunk, None nếu client không gửi
+            nbytes (int): Số bytes báo lại trong ack
+            payload: Dữ liệu audio của chunk (để tính audioMs)
+
+        Returns:
+            str: Ack (JSON) cần gửi ngay, hoặc None nếu ack được gộp với chunk sau
+        """
+        self.total_bytes += nbytes
+        if self._unacked is None:
+            self._unacked = [seq, 0, 0, 0]
+        unacked = self._unacked
+        unacked[0] = seq
+        unacked[1] += 1
+        unacked[2] += nbytes
+        unacked[3] += pcm_size(self.encoding, payload)
+        return self.take_ack() if unacked[1] >= self.ack_every else None
+
+    def take_ack(self) -> str:
+        """
+        Ack cho mọi chunk chưa được ack, hủy ack_timer nếu có.
+
+        Returns:
+            str: Tin nhắn ack (JSON) đã gắn streamId, None nếu không còn chunk chưa ack
+        """
+        self.close()
+        if self._unacked is None:
+            return None
+        seq, chunks, nbytes, pcm_bytes = self._unacked
+        self._unacked = None
+        audio_ms = round(pcm_bytes / self.bytes_per_ms)
+        if type(seq) is not int:
+            # seq comes straight from client JSON: a missing, string or float seq
+            # is echoed as is by dumps() rather than forced through the %d templates
+            response = {'type': 'ack', 'status': 'received', 'bytes': nbytes, 'audioMs': audio_ms}
+            if seq is not None:
+                response['seq'] = seq
+            if self.cumulative_acks:
+                response['chunks'] = chunks
+                response['totalBytes'] = self.total_bytes
+            return dumps(self.tag(response))
+        if self.cumulative_acks:
+            return CUMULATIVE_ACK.render(nbytes, audio_ms, seq, chunks, self.total_bytes, stream_id=self.id)
+        return ACK.render(nbytes, audio_ms, seq, stream_id=self.id)
+
+    def close(self):
+        """Hủy ack_timer đang chờ."""
+        if self.ack_timer is not None:
+            self.ack_timer.cancel()
+            self.ack_timer = None
+
+    def tag(self, message: dict) -> dict:
+        """Gắn streamId của stream vào tin nhắn trả về client."""
+        return tag_stream(message, self.id)
+
 class AudioServer:
     """
     WebSocket server để xử lý stream audio.
     
     Server này lắng nghe các kết nối WebSocket và xử lý hai loại tin nhắn chính:
     1. Format messages: Chứa thông tin về định dạng audio (sample rate, channels, etc.)
-    2. Audio chunks: Chứa dữ liệu audio được mã hóa base64
+    2. Audio chunks: Binary frame (header + PCM thô) nếu client đã thương lượng
+       transport binary, ngược lại là JSON chứa dữ liệu audio mã hóa base64
+
+    Audio của mỗi kết nối được đưa vào một hàng đợi giới hạn và xử lý tuần tự
+    bởi process_chunks() qua StreamProcessor của stream chứa chunk; mỗi đoạn
+    tiếng nói hoàn tất được xử lý tuần tự bởi một task riêng của kết nối, mô
+    phỏng ASR rồi MT cho từng ngôn ngữ đích và gửi lại 'broadcast-translation'.
+    Một kết nối có thể mang nhiều stream (xem protocol.py): mỗi tin nhắn
+    'format' có streamId mới mở một stream, 'end' đóng stream đó.
+
+    Kết nối qua route input-stream-translation/{SESSION_ID}/{USERNAME} thuộc về
+    phiên đó: nó nhận (dưới dạng JSON nén) mọi broadcast của phiên cho tới khi
+    gửi tin nhắn 'format', lúc đó nó trở thành người nói và broadcast của nó
+    được phát tới các listener còn lại của phiên qua BroadcastHub.
     """
+    def __init__(self, stage_factory=EnergyVad, ring_seconds=30.0, delay=None,
+                 executor=EXECUTOR_INLINE, workers=None, queue_size=DEFAULT_QUEUE_SIZE, hub=None,
+                 deflate=DEFLATE_OFF):
+        """
+        Args:
+            stage_factory (callable): Tạo stage xử lý audio từ sample rate
+            ring_seconds (float): Dung lượng ring buffer mỗi kết nối (giây audio)
+            delay (SyntheticDelay): Độ trễ ASR/MT tổng hợp, mặc định không trễ
+            executor (str): Nơi chạy phần xử lý chunk, một trong EXECUTOR_MODES
+            workers (int): Số worker của pool, mặc định theo số CPU
+            queue_size (int): Số chunk tối đa chờ xử lý mỗi kết nối
+            hub (BroadcastHub): Registry listener theo phiên, mặc định tạo mới
+            deflate (str): Profile permessage-deflate (DEFLATE_PROFILES) cho các
+                client yêu cầu nó; client audio không yêu cầu (AUDIO_COMPRESSION)
+
+        Raises:
+            ValueError: Khi executor hoặc deflate không hợp lệ
+        """
+        if executor not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown executor mode: {executor}")
+        self.extensions = deflate_extensions(deflate)
+        self.deflate = deflate
+        self.stage_factory = stage_factory
+        self.ring_seconds = ring_seconds
+        self.delay = delay or SyntheticDelay()
+        self.executor = executor
+        self.queue_size = queue_size
+        self.hub = hub or BroadcastHub()
+        self.pool = None
+        if executor == EXECUTOR_THREAD:
+            self.pool = ThreadPoolExecutor(max_workers=workers)
+        elif executor == EXECUTOR_PROCESS:
+            self.pool = ProcessPoolExecutor(max_workers=workers)
+        if self.pool is not None and self.delay.executor is None:
+            self.delay.executor = self.pool
+        self._chunk_queues = set()
+        # Timer-driven ack sends in progress (kept referenced until done)
+        self._ack_sends = set()
+        self.queue_depth_max = 0
+        self.metrics = MetricsRegistry()
+        self.sampled_log = SampledLog(logger.info, LOG_INTERVAL_MS / 1000)
+        self.sampled_error = SampledLog(logger.error, LOG_INTERVAL_MS / 1000)
+
+    def counters(self) -> dict:
+        """
+        Bộ đếm của server: kết nối, tin nhắn, chunk đã xử lý và hàng đợi.
+
+        Returns:
+            dict: Số kết nối hiện tại/tổng, số tin nhắn nhận được, tổng/max độ sâu
+                hàng đợi và số lần reader phải chờ vì hàng đợi đầy
+        """
+        depths = [chunks.qsize() for chunks in self._chunk_queues]
+        counters = {name: self.metrics.counters.get(name, 0) for name in SERVER_COUNTERS}
+        counters.update({
+            'connections': len(depths),
+            'queue_depth': sum(depths),
+            'queue_depth_peak': max(depths, default=0),
+            'queue_depth_max': self.queue_depth_max,
+            **self.hub.counters(),
+        })
+        return counters
+
+    def histograms(self) -> dict:
+        """Histogram thời gian chờ trong hàng đợi ('queue_wait') và xử lý chunk ('processing')."""
+        return dict(self.metrics.histograms)
+
+    def stats(self) -> dict:
+        """
+        Thống kê hàng đợi và thời gian xử lý chunk của toàn server.
+
+        Returns:
+            dict: counters() cùng tóm tắt histogram thời gian chờ / xử lý (mili giây)
+        """
+        stats = self.counters()
+        stats.update({name: hist.to_dict() for name, hist in self.histograms().items()})
+        return stats
+
+    async def _run_chunk(self, processor, payload, seq, timestamp) -> list:
+        """Chạy StreamProcessor cho một chunk theo chế độ executor."""
+        if self.executor == EXECUTOR_INLINE:
+            return processor.feed(payload, seq, timestamp)
+        loop = asyncio.get_running_loop()
+        job = processor.job(payload) if self.executor == EXECUTOR_PROCESS else None
+        if job is None:
+            # Thread mode, or a stage that cannot take precomputed energies
+            return await loop.run_in_executor(
+                self.pool if self.executor == EXECUTOR_THREAD else None,
+                processor.feed, payload, seq, timestamp)
+        samples, energies = await loop.run_in_executor(self.pool, analyze_chunk, *job)
+        return processor.apply(samples, energies, seq, timestamp)
+
+    async def enqueue_chunk(self, chunks, stream, payload, seq, timestamp):
+        """
+        Đưa một chunk của stream vào hàng đợi của kết nối.
+
+        Khi hàng đợi đầy, chờ tới khi có chỗ; trong lúc đó reader của kết nối
+        không đọc thêm frame nên TCP đẩy backpressure ngược về client. payload
+        None đánh dấu hết stream.
+        """
+        item = (stream, payload, seq, timestamp, time.perf_counter())
+        if chunks.full():
+            self.metrics.incr('backpressure_waits')
+            await chunks.put(item)
+        else:
+            chunks.put_nowait(item)
+        self.queue_depth_max = max(self.queue_depth_max, chunks.qsize())
+
+    async def process_chunks(self, chunks, segments):
+        """
+        Xử lý tuần tự các chunk audio của một kết nối.
+
+        Khi gặp dấu hết stream, các đoạn còn mở của stream được kết thúc và
+        dấu hết stream được chuyển tiếp cho process_segments().
+
+        Args:
+            chunks (asyncio.Queue): Hàng đợi (stream, payload, seq, timestamp, enqueued)
+            segments (asyncio.Queue): Hàng đợi (stream, segment) cho process_segments()
+        """
+        while True:
+            stream, payload, seq, timestamp, enqueued = await chunks.get()
+            if payload is None:
+                if stream.processor:
+                    for segment in stream.processor.flush():
+                        segments.put_nowait((stream, segment))
+                segments.put_nowait((stream, None))
+                continue
+            started = time.perf_counter()
+            self.metrics.observe('queue_wait', (started - enqueued) * 1e6)
+            try:
+                for segment in await self._run_chunk(stream.processor, payload, seq, timestamp):
+                    segments.put_nowait((stream, segment))
+            except Exception as e:
+                self.metrics.incr('chunk_errors')
+                self.sampled_error('chunk', "Error processing chunk %s: %s", seq, e)
+            self.metrics.observe('processing', (time.perf_counter() - started) * 1e6)
+            self.metrics.incr('chunks_processed')
+
+    async def process_segments(self, websocket, segments, session_id=None):
+        """
+        Xử lý tuần tự các đoạn tiếng nói của một kết nối.
+        
+        Args:
+            websocket: Đối tượng WebSocket của kết nối client
+            segments (asyncio.Queue): Hàng đợi (stream, segment) từ process_chunks();
+                segment None nghĩa là stream đã hết, trả lời 'end-ack'
+            session_id (str): Phiên nhận broadcast qua hub, None nếu không có
+        """
+        try:
+            while True:
+                stream, segment = await segments.get()
+                if segment is None:
+                    self.metrics.incr('streams_ended')
+                    await websocket.send(END_ACK.render(stream_id=stream.id))
+                    continue
+                await self.delay.asr(segment)
+                for language in stream.languages:
+                    await self.delay.mt(language)
+                    message = {
+                        'type': 'broadcast-translation',
+                        'language': language,
+                        'seq': segment['seq'],
+                        'timestamp': segment['timestamp'],
+                        'startMs': segment['startMs'],
+                        'endMs': segment['endMs'],
+                        'text': f"[{language}] {segment['startMs']}-{segment['endMs']}ms"
+                    }
+                    stream.tag(message)
+                    if session_id is not None:
+                        self.hub.publish(session_id, message)
+                    await websocket.send(dumps(message))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def send_ack(self, websocket, ack: str):
+        """Gửi một ack (từng chunk hoặc tích lũy, đã serialize) cho client."""
+        self.metrics.incr('acks_sent')
+        await websocket.send(ack)
+
+    async def acknowledge(self, websocket, stream: AudioStream, seq, nbytes: int, payload):
+        """
+        Ghi nhận một chunk của stream và gửi ack theo chính sách của stream.
+
+        Ack từng chunk được gửi ngay; ack tích lũy được gửi khi đủ ack_every
+        chunk, hoặc bởi timer ack_interval_ms sau chunk đầu tiên chưa được ack.
+        """
+        ack = stream.on_chunk(seq, nbytes, payload)
+        if ack is not None:
+            await self.send_ack(websocket, ack)
+        elif stream.ack_timer is None and stream.ack_interval_ms:
+            stream.ack_timer = asyncio.get_running_loop().call_later(
+                stream.ack_interval_ms / 1000, self._ack_due, websocket, stream)
+
+    def _ack_due(self, websocket, stream: AudioStream):
+        stream.ack_timer = None
+        ack = stream.take_ack()
+        if ack is not None:
+            task = asyncio.ensure_future(self._send_ack_quietly(websocket, ack))
+            self._ack_sends.add(task)
+            task.add_done_callback(self._ack_sends.discard)
+
+    async def _send_ack_quietly(self, websocket, ack: str):
+        try:
+            await self.send_ack(websocket, ack)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
     async def handle_connection(self, websocket):
         """
         Xử lý một kết nối WebSocket từ client.
         
         Phương thức này:
         - Nhận và phân tích các tin nhắn JSON từ client
-        - Xử lý tin nhắn dựa trên loại ('format' hoặc 'audio')
-        - Gửi phản hồi xác nhận cho mỗi chunk audio nhận được
+        - Xử lý tin nhắn dựa trên loại ('format', 'audio' hoặc 'end'), trả lời
+          'format-ack' với transport được chọn; mỗi streamId là một stream
+          riêng, 'end' được trả lời 'end-ack' sau kết quả cuối của stream
+        - Nhận binary frame audio của các stream đã thương lượng transport binary
+        - Gửi phản hồi xác nhận cho mỗi chunk audio nhận được (hoặc ack tích
+          lũy cho nhiều chunk nếu stream đã thương lượng), kèm thời lượng
+          audio (audioMs) tính theo format đã khai báo
+        - Đếm tin nhắn/chunk vào MetricsRegistry, chỉ log chunk theo mẫu
+        - Đưa audio vào hàng đợi của process_chunks() (chờ khi hàng đợi đầy),
+          các đoạn hoàn tất được chuyển cho process_segments()
+        - Đăng ký kết nối theo route phiên vào BroadcastHub
         
         Args:
             websocket: Đối tượng WebSocket của kết nối client
         """
-        logger.info("Client connected")
+        request = getattr(websocket, 'request', None)
+        session = parse_session_path(request.path if request else getattr(websocket, 'path', ''))
+        session_id = session[0] if session else None
+        subscriber = self.hub.subscribe(*session, websocket) if session else None
+        self.sampled_log('connect', "Client connected (session: %s)", session_id)
+        # Streams by ID; chunks of a stream that sent no format are acked but not processed
+        streams = {}
+        segments = asyncio.Queue()
+        chunks = asyncio.Queue(maxsize=self.queue_size)
+        self._chunk_queues.add(chunks)
+        chunk_worker = asyncio.create_task(self.process_chunks(chunks, segments))
+        worker = None
+        self.metrics.incr('connections_total')
         try:
             async for message in websocket:
+                self.metrics.incr('messages_received')
+                if isinstance(message, bytes):
+                    try:
+                        seq, timestamp, _, payload, stream_id = decode_audio_frame(message)
+                    except ProtocolError as e:
+                        self.metrics.incr('invalid_messages')
+                        self.sampled_error('frame', "Invalid audio frame: %s", e)
+                        continue
+                    # Transport is negotiated per stream: other streams may still be on JSON
+                    stream = streams.get(stream_id)
+                    if stream is None or stream.transport != TRANSPORT_BINARY:
+                        self.metrics.incr('invalid_messages')
+                        self.sampled_error('binary', "Binary frame received before binary transport was "
+                                                     "negotiated for stream %s", stream_id)
+                        continue
+                    if stream.processor:
+                        await self.enqueue_chunk(chunks, stream, bytes(payload), seq, timestamp)
+                    self.metrics.incr('chunks_received')
+                    self.metrics.incr('audio_bytes_received', len(payload))
+                    self.sampled_log('chunk', "Received audio frame %s/%s: %d bytes", stream_id, seq, len(payload))
+                    await self.acknowledge(websocket, stream, seq, len(payload), payload)
+                    continue
+
                 try:
-                    data = json.loads(message)
+                    data = loads(message)
                     msg_type = data.get('type', '')
+                    stream_id = stream_id_of(data)
                     
                     if msg_type == 'format':
-                        logger.info(f"Received audio format: {data}")
+                        self.sampled_log('format', "Received audio format: %s", data)
+                        data = dict(data, encoding=choose_encoding(data))
+                        try:
+                            processor = StreamProcessor(data, self.stage_factory, self.ring_seconds)
+                        except ValueError as e:
+                            logger.error(f"Audio processing disabled: {str(e)}")
+                            processor = None
+                        # A repeated format for the same stream ID restarts that stream
+                        if stream_id in streams:
+                            streams[stream_id].close()
+                        stream = streams[stream_id] = AudioStream(stream_id, data, processor,
+                                                                  choose_transport(data))
+                        self.metrics.incr('streams_total')
+                        if subscriber:
+                            # Speakers get their own results directly, not via the hub
+                            self.hub.unsubscribe(subscriber)
+                            subscriber = None
+                        if worker is None:
+                            worker = asyncio.create_task(
+                                self.process_segments(websocket, segments, session_id))
+                        response = {
+                            'type': 'format-ack',
+                            'transport': stream.transport,
+                            'encoding': data['encoding'],
+                            'streams': True
+                        }
+                        if stream.cumulative_acks:
+                            # Timer-only acks have no chunk count to report: echoing the
+                            # MAX_ACK_EVERY cap would pin the client's flow window at its maximum
+                            if 'ackEvery' in data:
+                                response['ackEvery'] = stream.ack_every
+                            response['ackIntervalMs'] = stream.ack_interval_ms
+                        await websocket.send(dumps(stream.tag(response)))
                     elif msg_type == 'audio':
                         # Log only the length of the audio data to avoid console spam
                         audio_length = len(data.get('data', ''))
-                        logger.info(f"Received audio chunk: {audio_length} bytes")
+                        stream = streams.get(stream_id) or AudioStream(stream_id)
+                        raw = base64.b64decode(data.get('data', ''))
+                        if stream.processor:
+                            await self.enqueue_chunk(chunks, stream, raw,
+                                                     data.get('seq'), data.get('timestamp'))
+                        self.metrics.incr('chunks_received')
+                        self.metrics.incr('audio_bytes_received', len(raw))
+                        self.sampled_log('chunk', "Received audio chunk %s/%s: %d bytes",
+                                         stream_id, data.get('seq'), audio_length)
                         
-                        # Echo back a simple acknowledgment
-                        response = {
-                            'type': 'ack',
-                            'status': 'received',
-                            'bytes': audio_length
-                        }
-                        await websocket.send(json.dumps(response))
-                except json.JSONDecodeError:
-                    logger.error("Invalid JSON received")
+                        # Echo back a simple (or cumulative) acknowledgment
+                        await self.acknowledge(websocket, stream, data.get('seq'), audio_length, raw)
+                    elif msg_type == 'end':
+                        stream = streams.pop(stream_id, None) or AudioStream(stream_id)
+                        ack = stream.take_ack()
+                        if ack is not None:
+                            await self.send_ack(websocket, ack)
+                        if worker is None:
+                            worker = asyncio.create_task(
+                                self.process_segments(websocket, segments, session_id))
+                        # Queued behind the stream's chunks, answered once its results are out
+                        await self.enqueue_chunk(chunks, stream, None, None, None)
+                except DECODE_ERRORS:
+                    self.metrics.incr('invalid_messages')
+                    self.sampled_error('json', "Invalid JSON received")
+                except binascii.Error as e:
+                    self.metrics.incr('invalid_messages')
+                    self.sampled_error('base64', "Invalid audio data: %s", e)
+                except ProtocolError as e:
+                    self.metrics.incr('invalid_messages')
+                    self.sampled_error('stream', "Invalid message: %s", e)
                 
         except websockets.exceptions.ConnectionClosed:
-            logger.info("Client disconnected")
+            self.sampled_log('disconnect', "Client disconnected")
         except Exception as e:
             logger.error(f"Error handling connection: {str(e)}")
+        finally:
+            if subscriber:
+                self.hub.unsubscribe(subscriber)
+            for stream in streams.values():
+                stream.close()
+            chunk_worker.cancel()
+            self._chunk_queues.discard(chunks)
+            if worker:
+                worker.cancel()
 
-    async def start(self, host='localhost', port=8765):
+    async def report_stats(self, interval: float):
+        """Log stats() cùng tốc độ của các counter mỗi interval giây khi có kết nối."""
+        while True:
+            await asyncio.sleep(interval)
+            rates = self.metrics.flush()['rates']
+            if self._chunk_queues:
+                stats = self.stats()
+                stats['rates'] = rates
+                logger.info(f"Server stats: {json.dumps(stats)}")
+
+    async def start(self, host='localhost', port=8765, stats_interval=None,
+                    reuse_port=False, stop=None):
         """
         Khởi động WebSocket server.
         
@@ -82,18 +591,225 @@ class AudioServer:
         Args:
             host (str): Địa chỉ host để lắng nghe (mặc định: 'localhost')
             port (int): Port để lắng nghe (mặc định: 8765)
+            stats_interval (float): Chu kỳ (giây) log thống kê xử lý, None để tắt
+            reuse_port (bool): Bật SO_REUSEPORT để nhiều process cùng nghe port
+            stop (asyncio.Event): Khi được set, ngừng nhận kết nối và đóng êm các
+                kết nối hiện có; None để chạy vô thời hạn
         """
-        async with websockets.serve(self.handle_connection, host, port):
-            logger.info(f"Audio server running on ws://{host}:{port}")
-            await asyncio.Future()  # run forever
+        reporter = asyncio.create_task(self.report_stats(stats_interval)) if stats_interval else None
+        try:
+            async with websockets.serve(self.handle_connection, host, port, reuse_port=reuse_port,
+                                        compression=None, extensions=self.extensions):
+                logger.info(f"Audio server running on ws://{host}:{port} "
+                            f"(executor: {self.executor}, deflate: {self.deflate})")
+                if stop is None:
+                    await asyncio.Future()  # run forever
+                else:
+                    await stop.wait()
+                    logger.info("Shutting down, closing connections")
+        finally:
+            if reporter:
+                reporter.cancel()
+            if self.pool is not None:
+                self.pool.shutdown(wait=False, cancel_futures=True)
 
-async def main():
+def aggregate_worker_stats(snapshots: dict) -> dict:
+    """
+    Tổng hợp thống kê của nhiều worker process.
+
+    Args:
+        snapshots (dict): Worker index → (counters, histograms) mới nhất của worker
+
+    Returns:
+        dict: Bộ đếm cộng dồn (MAX_COUNTERS lấy max), histogram gộp và bộ đếm
+            của từng worker
+    """
+    totals = {}
+    for counters, _ in snapshots.values():
+        for key, value in counters.items():
+            totals[key] = max(totals.get(key, 0), value) if key in MAX_COUNTERS else totals.get(key, 0) + value
+    merged = merge_histograms(histograms for _, histograms in snapshots.values())
+    totals.update({name: hist.to_dict() for name, hist in sorted(merged.items())})
+    totals['workers'] = {index: counters for index, (counters, _) in sorted(snapshots.items())}
+    return totals
+
+
+def run_worker(index, host, port, server_options, stats_queue, stats_interval):
+    """
+    Entry point của một worker process: chạy AudioServer với SO_REUSEPORT.
+
+    Worker dừng êm khi nhận SIGTERM/SIGINT và gửi (index, counters, histograms)
+    về process cha mỗi stats_interval giây và một lần cuối khi thoát.
+
+    Args:
+        index (int): Số thứ tự worker
+        host (str): Địa chỉ lắng nghe
+        port (int): Port dùng chung giữa các worker
+        server_options (dict): Tham số cho AudioServer
+        stats_queue (multiprocessing.Queue): Kênh gửi thống kê về process cha
+        stats_interval (float): Chu kỳ gửi thống kê (giây)
+    """
+    server = AudioServer(**server_options)
+
+    def publish():
+        stats_queue.put((index, server.counters(), server.histograms()))
+
+    async def serve():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop.set)
+
+        async def publish_periodically():
+            while True:
+                await asyncio.sleep(stats_interval)
+                publish()
+
+        publisher = asyncio.create_task(publish_periodically())
+        try:
+            await server.start(host, port, reuse_port=True, stop=stop)
+        finally:
+            publisher.cancel()
+
+    logger.info(f"Worker {index} started (pid {os.getpid()})")
+    try:
+        asyncio.run(serve())
+    finally:
+        publish()
+        logger.info(f"Worker {index} stopped")
+
+
+def run_workers(processes, host='localhost', port=8765, server_options=None,
+                stats_interval=10.0, shutdown_timeout=SHUTDOWN_TIMEOUT) -> dict:
+    """
+    Chạy processes worker cùng lắng nghe một port và chờ tới khi bị dừng.
+
+    Process cha chỉ giám sát: log thống kê tổng hợp định kỳ, chuyển
+    SIGINT/SIGTERM thành yêu cầu dừng cho các worker, chờ chúng đóng kết nối
+    trong shutdown_timeout giây rồi kill các worker còn lại.
+
+    Args:
+        processes (int): Số worker process
+        host (str): Địa chỉ lắng nghe
+        port (int): Port dùng chung
+        server_options (dict): Tham số cho AudioServer của mỗi worker
+        stats_interval (float): Chu kỳ (giây) gửi và log thống kê
+        shutdown_timeout (float): Thời gian chờ worker tắt êm
+
+    Returns:
+        dict: Thống kê tổng hợp cuối cùng (xem aggregate_worker_stats)
+    """
+    stats_queue = multiprocessing.Queue()
+    workers = [multiprocessing.Process(
+        target=run_worker, args=(i, host, port, server_options or {}, stats_queue, stats_interval),
+        name=f"audio-server-{i}") for i in range(processes)]
+    for worker in workers:
+        worker.start()
+
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    previous = {signum: signal.signal(signum, request_stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+    snapshots = {}
+    next_report = time.monotonic() + stats_interval
+    logger.info(f"Started {processes} workers on ws://{host}:{port}")
+    try:
+        while not stopping and any(worker.is_alive() for worker in workers):
+            try:
+                index, counters, histograms = stats_queue.get(timeout=0.5)
+                snapshots[index] = (counters, histograms)
+            except queue.Empty:
+                pass
+            if snapshots and time.monotonic() >= next_report:
+                next_report += stats_interval
+                logger.info(f"Server stats: {json.dumps(aggregate_worker_stats(snapshots))}")
+
+        for worker in workers:
+            if worker.is_alive():
+                os.kill(worker.pid, signal.SIGTERM)
+        deadline = time.monotonic() + shutdown_timeout
+        # Keep draining while waiting so worker queue feeders never block on exit
+        while any(worker.is_alive() for worker in workers) and time.monotonic() < deadline:
+            try:
+                index, counters, histograms = stats_queue.get(timeout=0.1)
+                snapshots[index] = (counters, histograms)
+            except queue.Empty:
+                pass
+        for worker in workers:
+            if worker.is_alive():
+                logger.warning(f"Worker {worker.name} did not stop in time, killing it")
+                worker.kill()
+            worker.join()
+        while True:
+            try:
+                index, counters, histograms = stats_queue.get_nowait()
+            except queue.Empty:
+                break
+            snapshots[index] = (counters, histograms)
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+
+    stats = aggregate_worker_stats(snapshots)
+    logger.info(f"Final server stats: {json.dumps(stats)}")
+    return stats
+
+
+def main():
     """
     Hàm main để khởi tạo và chạy server.
-    Tạo một instance của AudioServer và khởi động nó với cấu hình mặc định.
+    Tạo một instance của AudioServer với cấu hình xử lý từ dòng lệnh và khởi động nó,
+    hoặc chạy nhiều worker process qua run_workers() với --processes.
     """
-    server = AudioServer()
-    await server.start()
+    parser = argparse.ArgumentParser(description="Local audio ingest server")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--vad-threshold-db', type=float, default=-45.0, help='Ngưỡng năng lượng VAD (dBFS)')
+    parser.add_argument('--asr-delay-ms', type=float, default=0.0, help='Chi phí ASR cố định mỗi đoạn')
+    parser.add_argument('--asr-rtf', type=float, default=0.0, help='Chi phí ASR theo thời lượng đoạn')
+    parser.add_argument('--mt-delay-ms', type=float, default=0.0, help='Chi phí MT mỗi ngôn ngữ đích')
+    parser.add_argument('--busy-delay', action='store_true', help='Mô phỏng chi phí bằng CPU thay vì sleep')
+    parser.add_argument('--executor', default=EXECUTOR_INLINE, choices=EXECUTOR_MODES,
+                        help='Nơi chạy phần xử lý chunk tốn CPU')
+    parser.add_argument('--workers', type=int, help='Số worker của thread/process pool')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help='Số chunk chờ xử lý tối đa mỗi kết nối trước khi ngừng đọc')
+    parser.add_argument('--stats-interval', type=float, default=10.0,
+                        help='Chu kỳ log thống kê hàng đợi/xử lý (giây), 0 để tắt')
+    parser.add_argument('--subscriber-queue', type=int, default=DEFAULT_SUBSCRIBER_QUEUE,
+                        help='Số broadcast chờ gửi tối đa mỗi listener')
+    parser.add_argument('--slow-policy', default=SLOW_POLICY_DROP, choices=SLOW_POLICIES,
+                        help='Xử lý listener chậm khi hàng đợi đầy: bỏ frame cũ hoặc ngắt kết nối')
+    parser.add_argument('--broadcast-compression', default=COMPRESSION_ZLIB, choices=COMPRESSION_MODES,
+                        help='Nén broadcast một lần ở tầng ứng dụng, hoặc none để gửi JSON text')
+    parser.add_argument('--deflate', default=DEFLATE_OFF, choices=sorted(DEFLATE_PROFILES),
+                        help='Profile permessage-deflate cho client yêu cầu nén (nên dùng với '
+                             '--broadcast-compression none)')
+    parser.add_argument('--processes', type=int, default=1,
+                        help=f'Số worker process dùng chung port (0 = số core, hiện tại {os.cpu_count()})')
+    args = parser.parse_args()
+    if args.deflate != DEFLATE_OFF and args.broadcast_compression != COMPRESSION_NONE:
+        logger.warning("Broadcasts are already compressed, permessage-deflate will only add CPU")
+
+    server_options = {
+        'stage_factory': functools.partial(EnergyVad, threshold_db=args.vad_threshold_db),
+        'delay': SyntheticDelay(args.asr_delay_ms, args.asr_rtf, args.mt_delay_ms, args.busy_delay),
+        'executor': args.executor,
+        'workers': args.workers,
+        'queue_size': args.queue_size,
+        'hub': BroadcastHub(args.subscriber_queue, args.slow_policy, args.broadcast_compression),
+        'deflate': args.deflate,
+    }
+    processes = args.processes or os.cpu_count()
+    if processes > 1:
+        run_workers(processes, args.host, args.port, server_options,
+                    stats_interval=args.stats_interval or 10.0)
+    else:
+        asyncio.run(AudioServer(**server_options).start(
+            args.host, args.port, stats_interval=args.stats_interval or None))
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    main()
\ No newline at end of file